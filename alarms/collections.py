@@ -1,12 +1,18 @@
 import datetime
+import functools
 import time
 import abc
 import asyncio
 import logging
 import re
+import threading
 from alarms.models import Alarm, IASValue, Value, OperationalMode, Validity
 from alarms.connectors import CdbConnector, TicketConnector, PanelsConnector
-from ias_webserver.settings import NOTIFICATIONS_RATE, BROADCAST_RATE_FACTOR
+from alarms.index import TicketIndex
+from alarms.journal import TicketJournal
+from alarms.scheduler import ShelveScheduler
+from ias_webserver.settings import NOTIFICATIONS_RATE, BROADCAST_RATE_FACTOR, TICKET_STATISTICS_ROLLUP_INTERVAL
+from utils.executors import run_in_db_executor
 
 logger = logging.getLogger(__name__)
 
@@ -26,9 +32,22 @@ class AlarmCollection:
     values_collection = None
     """ Dictionary to store other type of values, indexed by core_id """
 
+    templates_collection = None
+    """
+    Dictionary to store the templated alarms, indexed by the id of the templated IASIO.
+    The Alarms of the instances are only created when they are referenced, until then they are represented by
+    the range of instances of the template, the IASIO data and the state shared by all of them
+    """
+
     alarms_views_dict = None
     """ Dictionary to store the related view names by alarm, indexed by core_id """
 
+    cdb_iasios = None
+    """ Dictionary to store the IASIOs used to create the alarms, indexed by id, used to reload the CDB """
+
+    panels_alarm_ids = None
+    """ Set of the ids of the alarms used in the AlarmConfigs of the Panels app """
+
     observers = []
     """ List to store references to the observers subscribed to changes in the collection """
 
@@ -38,11 +57,23 @@ class AlarmCollection:
     broadcast_task = None
     """ Reference to the Task that sends all alarms periodically """
 
+    statistics_task = None
+    """ Reference to the Task that rolls up the statistics of the tickets periodically """
+
     alarm_changes = []
     """ List of IDs of Alarms that have changed and must be notified """
 
     init_state = 'pending'
-    """ Status of initialization, cand be either 'pending', 'in-progress' or 'done' """
+    """ Status of initialization, cand be either 'pending', 'in_progress' or 'done' """
+
+    init_progress = 0
+    """ Percentage of the alarms processed during the initialization """
+
+    init_future = None
+    """ Reference to the Future of the initialization running in an executor """
+
+    init_lock = threading.RLock()
+    """ Lock used to avoid concurrent initializations from different threads """
 
     value_options = Value.get_choices_by_name()
     """ Dictionary to transform Alarm Value from string to the corresponding numbers """
@@ -74,7 +105,8 @@ class AlarmCollection:
             return
         ids_to_notify = set(self.alarm_changes)
         self.alarm_changes = []
-        alarms = [self.get(id).to_dict() for id in ids_to_notify]
+        alarms = [self.get(id) for id in ids_to_notify]
+        alarms = [alarm.to_dict() for alarm in alarms if alarm is not None]
         payload = {
             'alarms': alarms,
             'counters': Alarm.objects.counter_by_view
@@ -86,10 +118,13 @@ class AlarmCollection:
     @classmethod
     async def broadcast_observers(self):
         """ Notify to all observers the alarms list with its current status """
+        if self.init_state != 'done':
+            return
         queryset = AlarmCollection.update_all_alarms_validity()
         alarms = []
         for item in list(queryset.values()):
             alarms.append(item.to_dict())
+        alarms += self._get_template_instances_as_dicts()
         payload = {
             'alarms': alarms,
             'counters': Alarm.objects.counter_by_view
@@ -125,6 +160,19 @@ class AlarmCollection:
             await self.broadcast_observers()
             await asyncio.sleep(rate)
 
+    @classmethod
+    async def periodic_statistics_coroutine(self):
+        """
+        Coroutine that rolls up the statistics of the tickets in the database executor periodically
+        The rate is defined in the variable ias_webserver.settings.TICKET_STATISTICS_ROLLUP_INTERVAL
+        """
+        while True:
+            await asyncio.sleep(TICKET_STATISTICS_ROLLUP_INTERVAL)
+            try:
+                await run_in_db_executor(TicketConnector.rollup_ticket_statistics, self.alarms_views_dict or {})
+            except Exception:
+                logger.exception('The statistics of the tickets could not be rolled up')
+
     @classmethod
     async def start_periodic_tasks(self):
         """
@@ -147,6 +195,12 @@ class AlarmCollection:
         else:
             logger.debug('Periodic broadcast already started')
 
+        if self.statistics_task is None or self.statistics_task.done() or self.statistics_task.cancelled():
+            logger.info('Starting periodic rollup of the ticket statistics')
+            self.statistics_task = asyncio.ensure_future(self.periodic_statistics_coroutine())
+        else:
+            logger.debug('Periodic rollup of the ticket statistics already started')
+
     @classmethod
     def record_alarm_changes(self, alarms):
         """
@@ -163,8 +217,31 @@ class AlarmCollection:
 
     @classmethod
     async def start_initialization(self):
-        """ Starts the initialization of the AlarmCollection. It is an async m ethod that can be awaited """
-        self.initialize()
+        """
+        Starts the initialization of the AlarmCollection in an executor, in order to avoid blocking the event loop,
+        and waits until it is finished. If the initialization was already started it only waits for it to finish.
+        It is an async method that can be awaited
+        """
+        ShelveScheduler.start(self.unshelve_expired)
+        if self.init_state == 'done':
+            return
+        if self.init_future is None or self.init_future.done():
+            loop = asyncio.get_event_loop()
+            self.init_future = loop.run_in_executor(None, self.initialize)
+        await asyncio.shield(self.init_future)
+
+    @classmethod
+    def get_init_status(self):
+        """
+        Returns the status of the initialization of the AlarmCollection
+
+        Returns:
+            dict: A dictionary with the 'state' and the 'progress' (percentage) of the initialization
+        """
+        return {
+            'state': self.init_state,
+            'progress': self.init_progress
+        }
 
     # Sync, non-notified methods:
     @classmethod
@@ -175,6 +252,8 @@ class AlarmCollection:
         If not, it initializes Alarms based on the alarm_ids used in AlarmConfig objects of the Panels app,
         getting their description and documentation urls from the CDB.
 
+        It can be called from different threads, only one initialization is performed at a time.
+
         Args:
             iasios (list): An optional list of iasio objects
 
@@ -182,57 +261,359 @@ class AlarmCollection:
             dict: A dictionary of Alarm objects
         """
         start = time.time()
-        logger.info('Initializing Collection')
-        if self.init_state == 'pending':
-            self.init_state = 'in_progress'
-            self.singleton_collection = {}
-            self.parents_collection = {}
-            self.values_collection = {}
-            self.alarms_views_dict = PanelsConnector.get_alarms_views_dict_of_alarm_configs()
-            alarms_to_search = PanelsConnector.get_alarm_ids_of_alarm_configs()
-            if iasios is None:
-                iasios = CdbConnector.get_iasios(type='ALARM')
-
-                for iasio in iasios:
-                    if iasio['iasType'].upper() == 'ALARM':
-                        alarm = self._create_alarm_from_cdb_iasio(iasio)
-                        self.add(alarm)
-
-                for alarm_id in alarms_to_search:
-                    if self.get(alarm_id) is None:
-                        alarm = self._create_alarm_from_cdb_iasio({'id': alarm_id})
-                        self.add(alarm)
-                        logger.warning(
-                            alarm_id
-                            + ' was not found in the CDB, initializing with '
-                            + 'empty description and url '
-                        )
-                logger.info('The collection was initialized based on configuration')
-            else:
-                for iasio in iasios:
-                    alarm = self._create_alarm_from_cdb_iasio(iasio)
-                    self.add(alarm)
-                logger.info('The collection was initialized in testing mode')
-            self.init_state = 'done'
-        logger.info('Collection initialization finished in %d seconds', time.time() - start)
+        with self.init_lock:
+            if self.init_state == 'pending':
+                logger.info('Initializing Collection')
+                self.init_state = 'in_progress'
+                self.init_progress = 0
+                try:
+                    self._initialize(iasios)
+                except Exception:
+                    logger.exception('Collection initialization failed')
+                    self.init_state = 'pending'
+                    raise
+                self.init_state = 'done'
+                self.init_progress = 100
+                logger.info('Collection initialization finished in %d seconds', time.time() - start)
         return self.singleton_collection
 
+    @classmethod
+    def _initialize(self, iasios=None):
+        """
+        Auxiliary method that builds the collection during the initialization.
+        The dictionaries are filled in a builder, a subclass of the collection with its own dictionaries,
+        and they are swapped onto the collection in one step at the end, so the readers running in the event loop
+        never see a collection that is partially built.
+        Go to :func:`~collections.AlarmCollection.initialize` to see the initialization specification.
+
+        Args:
+            iasios (list): An optional list of iasio objects
+        """
+        builder = type('AlarmCollectionBuilder', (self,), {
+            'singleton_collection': {},
+            'parents_collection': {},
+            'values_collection': {},
+            'templates_collection': {},
+            'cdb_iasios': {},
+            'alarms_views_dict': {},
+            'panels_alarm_ids': set(),
+            'alarm_changes': [],
+        })
+        builder._build(iasios)
+        with self.init_lock:
+            (
+                self.singleton_collection, self.parents_collection, self.values_collection,
+                self.templates_collection, self.cdb_iasios, self.alarms_views_dict, self.panels_alarm_ids,
+            ) = (
+                builder.singleton_collection, builder.parents_collection, builder.values_collection,
+                builder.templates_collection, builder.cdb_iasios, builder.alarms_views_dict, builder.panels_alarm_ids,
+            )
+            self.alarm_changes += builder.alarm_changes
+
+    @classmethod
+    def _build(self, iasios=None):
+        """
+        Auxiliary method that fills the dictionaries of the builder of the collection during the initialization.
+        Go to :func:`~collections.AlarmCollection.initialize` to see the initialization specification.
+
+        Args:
+            iasios (list): An optional list of iasio objects
+        """
+        self.alarms_views_dict = PanelsConnector.get_alarms_views_dict_of_alarm_configs()
+        alarms_to_search = PanelsConnector.get_alarm_ids_of_alarm_configs()
+        self.panels_alarm_ids = set(alarms_to_search)
+        # The tickets left in the journal by a previous execution must be written before reading the ack states
+        TicketJournal.recover()
+        TicketIndex.invalidate()
+        unack_alarm_ids = set()
+        shelved_alarm_ids = set()
+        shelve_deadlines = {}
+        if iasios is None or len(iasios) > 0:
+            # Retrieve the ack and shelve states of all the alarms at once, only if there are alarms to add
+            TicketIndex.load()
+            unack_alarm_ids = TicketConnector.get_unack_alarm_ids()
+            shelved_alarm_ids = TicketConnector.get_shelved_alarm_ids()
+            shelve_deadlines = TicketConnector.get_shelve_deadlines()
+        ShelveScheduler.load(shelve_deadlines)
+        if iasios is None:
+            iasios = CdbConnector.get_iasios(type='ALARM', expand=False) or []
+            total = len(iasios) + len(alarms_to_search)
+
+            for i, iasio in enumerate(iasios):
+                if iasio['iasType'].upper() == 'ALARM':
+                    self._add_initial_iasio(iasio, unack_alarm_ids, shelved_alarm_ids)
+                self._update_init_progress(i + 1, total)
+            # The instances of templated alarms with tickets or shelve registries may not have the default state
+            self._add_initial_template_instances(
+                unack_alarm_ids | shelved_alarm_ids, unack_alarm_ids, shelved_alarm_ids
+            )
+
+            for i, alarm_id in enumerate(alarms_to_search):
+                # The instances of templated alarms used in the panels are created with their views
+                self._add_initial_template_instances([alarm_id], unack_alarm_ids, shelved_alarm_ids)
+                if self.get(alarm_id) is None:
+                    alarm = self._create_alarm_from_cdb_iasio({'id': alarm_id})
+                    self._add_initial_alarm(alarm, unack_alarm_ids, shelved_alarm_ids)
+                    logger.warning(
+                        alarm_id
+                        + ' was not found in the CDB, initializing with '
+                        + 'empty description and url '
+                    )
+                self._update_init_progress(len(iasios) + i + 1, total)
+            logger.info('The collection was initialized based on configuration')
+        else:
+            for i, iasio in enumerate(iasios):
+                self._add_initial_iasio(iasio, unack_alarm_ids, shelved_alarm_ids)
+                self._update_init_progress(i + 1, len(iasios))
+            # The instances of templated alarms with tickets or shelve registries may not have the default state
+            self._add_initial_template_instances(
+                unack_alarm_ids | shelved_alarm_ids, unack_alarm_ids, shelved_alarm_ids
+            )
+            logger.info('The collection was initialized in testing mode')
+
+    @classmethod
+    def _update_init_progress(self, added, total):
+        """
+        Updates the progress of the initialization, logging it every 10 percent
+
+        Args:
+            added (int): number of processed alarms
+            total (int): total number of alarms to process
+        """
+        progress = int(100 * added / total) if total > 0 else 100
+        if progress // 10 > AlarmCollection.init_progress // 10:
+            logger.info('Collection initialization progress: %d%%', progress)
+        AlarmCollection.init_progress = progress
+
     @classmethod
     def reset(self, iasios=None):
         """
         Resets the AlarmCollection dictionary initializing it again.
         Go to :func:`~collections.AlarmCollection.initialize` to see the initialization specification.
 
+        The previous collection is kept until the new one is swapped at the end of the initialization.
+
         Args:
             iasios (list): A list of iasio objects
         """
-        self.singleton_collection = None
-        self.parents_collection = None
-        self.values_collection = None
         self.init_state = 'pending'
+        self.init_future = None
         self.initialize(iasios)
         logger.debug('the alarm collection was reset')
 
+    @classmethod
+    async def reload_cdb(self):
+        """
+        Reads the alarms of the CDB in an executor, in order to avoid blocking the event loop,
+        and reloads the AlarmCollection with them.
+        Go to :func:`~collections.AlarmCollection.reload` to see the reload specification.
+        The changes are sent to the observers at once, with a broadcast if some alarms were removed
+
+        Returns:
+            dict: A dictionary with the lists of ids of the 'added', 'updated' and 'removed' IASIOs
+        """
+        if self.init_state != 'done':
+            await self.start_initialization()
+            return {'added': [], 'updated': [], 'removed': []}
+        loop = asyncio.get_event_loop()
+        iasios = await loop.run_in_executor(
+            None, functools.partial(CdbConnector.get_iasios, type='ALARM', expand=False)
+        )
+        changes = self.reload(iasios or [])
+        if changes['removed']:
+            await self.broadcast_observers()
+        else:
+            await self.notify_observers()
+        return changes
+
+    @classmethod
+    def reload(self, iasios=None):
+        """
+        Reloads the alarms of the AlarmCollection from the CDB without resetting it.
+        Only the differences with the IASIOs used previously are applied: new alarms are added,
+        the alarms removed from the CDB are retired (unless they are used in the Panels app),
+        and the description, url, sound and can_shelve of the modified alarms are updated in place.
+        The values, ack and shelve states and the counters by view of the alarms are preserved,
+        and the added and updated alarms are recorded to be notified in a single batch.
+        If the collection is not initialized it is initialized instead.
+
+        Args:
+            iasios (list): An optional list of iasio objects, with the templated iasios as ranges.
+                If not given they are read from the CDB
+
+        Returns:
+            dict: A dictionary with the lists of ids of the 'added', 'updated' and 'removed' IASIOs
+        """
+        changes = {'added': [], 'updated': [], 'removed': []}
+        with self.init_lock:
+            if self.init_state != 'done':
+                self.initialize(iasios)
+                return changes
+            if iasios is None:
+                iasios = CdbConnector.get_iasios(type='ALARM', expand=False) or []
+            new_iasios = {iasio['id']: iasio for iasio in iasios if iasio['iasType'].upper() == 'ALARM'}
+            old_iasios = self.cdb_iasios
+            changed_alarms = []
+            for (iasio_id, old_iasio) in old_iasios.items():
+                if iasio_id not in new_iasios:
+                    changes['removed'].append(iasio_id)
+                    changed_alarms += self._retire_iasio(old_iasio)
+            added_templates = False
+            for (iasio_id, iasio) in new_iasios.items():
+                old_iasio = old_iasios.get(iasio_id)
+                if old_iasio is iasio or old_iasio == iasio:
+                    continue
+                if old_iasio is None:
+                    changes['added'].append(iasio_id)
+                else:
+                    changes['updated'].append(iasio_id)
+                if old_iasio is not None and ('templateRange' in old_iasio) != ('templateRange' in iasio):
+                    changed_alarms += self._retire_iasio(old_iasio)
+                    old_iasio = None
+                if 'templateRange' in iasio:
+                    changed_alarms += self._reload_templated_iasio(iasio, old_iasio)
+                    added_templates = added_templates or old_iasio is None
+                else:
+                    changed_alarms += self._reload_iasio(iasio)
+            if added_templates:
+                # The instances of new templated alarms may have tickets or shelve registries from previous CDBs
+                unack_alarm_ids = TicketConnector.get_unack_alarm_ids()
+                shelved_alarm_ids = TicketConnector.get_shelved_alarm_ids()
+                self._add_initial_template_instances(
+                    unack_alarm_ids | shelved_alarm_ids, unack_alarm_ids, shelved_alarm_ids
+                )
+            self.cdb_iasios = new_iasios
+            self.record_alarm_changes([alarm for alarm in changed_alarms if alarm.core_id in self.singleton_collection])
+        logger.info(
+            'The collection was reloaded: %d IASIOs added, %d updated and %d removed',
+            len(changes['added']), len(changes['updated']), len(changes['removed'])
+        )
+        return changes
+
+    @classmethod
+    def _reload_iasio(self, iasio):
+        """
+        Auxiliary method used to add or update the Alarm of a new or modified IASIO when the CDB is reloaded
+
+        Args:
+            iasio (dict): A dictionary with the IASIO info
+
+        Returns:
+            list: A list with the Alarm if it was added or changed, empty if not
+        """
+        alarm = self.singleton_collection.get(iasio['id'])
+        if alarm is None:
+            alarm = self._create_alarm_from_cdb_iasio(iasio)
+            self.add(alarm)
+            return [alarm]
+        return [alarm] if self._update_alarm_metadata(alarm, iasio) else []
+
+    @classmethod
+    def _reload_templated_iasio(self, iasio, old_iasio):
+        """
+        Auxiliary method used to add or update a templated IASIO when the CDB is reloaded.
+        The created instances that are out of the new range of instances are retired,
+        and the rest are updated in place
+
+        Args:
+            iasio (dict): A dictionary with the IASIO info
+            old_iasio (dict): A dictionary with the previous IASIO info, or None if it is new
+
+        Returns:
+            list: A list with the Alarms of the instances that changed
+        """
+        changed_alarms = []
+        old_template = self.templates_collection.get(iasio['id'])
+        self._add_initial_iasio(iasio, set(), set())
+        template = self.templates_collection[iasio['id']]
+        if old_template is not None:
+            core_ids = [iasio['id'] + ' instance ' + str(i) for i in old_template['range']]
+        else:
+            # Only the alarms used in the panels may exist before the template is added
+            core_ids = [core_id for core_id in self.panels_alarm_ids if core_id in self.singleton_collection]
+        for core_id in core_ids:
+            alarm = self.singleton_collection.get(core_id)
+            if alarm is None:
+                continue
+            if self._get_template_of_instance(core_id) is template:
+                if self._update_alarm_metadata(alarm, dict(iasio, id=core_id)):
+                    changed_alarms.append(alarm)
+            elif old_template is not None:
+                changed_alarms += self._retire_alarm(core_id)
+        return changed_alarms
+
+    @classmethod
+    def _retire_iasio(self, iasio):
+        """
+        Auxiliary method used to retire the Alarms of an IASIO removed from the CDB.
+        If the IASIO is templated the Alarms of all its created instances are retired
+
+        Args:
+            iasio (dict): A dictionary with the IASIO info
+
+        Returns:
+            list: A list with the Alarms that were kept because they are used in the Panels app, and changed
+        """
+        if 'templateRange' not in iasio:
+            return self._retire_alarm(iasio['id'])
+        template = self.templates_collection.pop(iasio['id'], None)
+        changed_alarms = []
+        if template is not None:
+            for i in template['range']:
+                core_id = iasio['id'] + ' instance ' + str(i)
+                if core_id in self.singleton_collection:
+                    changed_alarms += self._retire_alarm(core_id)
+        return changed_alarms
+
+    @classmethod
+    def _retire_alarm(self, core_id):
+        """
+        Auxiliary method used to retire an Alarm whose IASIO was removed from the CDB.
+        If the Alarm is used in the Panels app it is kept with empty description and url, as in the initialization
+
+        Args:
+            core_id (string): the core_id of the Alarm
+
+        Returns:
+            list: A list with the Alarm if it was kept and changed, empty if not
+        """
+        alarm = self.singleton_collection.get(core_id)
+        if alarm is None:
+            return []
+        if core_id in self.panels_alarm_ids:
+            return [alarm] if self._update_alarm_metadata(alarm, {'id': core_id}) else []
+        del self.singleton_collection[core_id]
+        # The retired alarm is removed from the dependencies of its parents and from the parents of its dependencies
+        for parent_id in self.parents_collection.pop(core_id, set()):
+            parent = self.singleton_collection.get(parent_id)
+            if parent is not None and core_id in parent.dependencies:
+                parent.dependencies = [dependency for dependency in parent.dependencies if dependency != core_id]
+        for dependency_id in alarm.dependencies:
+            self.parents_collection.get(dependency_id, set()).discard(core_id)
+        Alarm.objects.update_counter_by_view_if_alarm_is_removed(alarm)
+        logger.debug('The alarm %s was retired from the collection', core_id)
+        return []
+
+    @classmethod
+    def _update_alarm_metadata(self, alarm, iasio):
+        """
+        Auxiliary method used to update the description, url, sound and can_shelve of an Alarm from an IASIO
+
+        Args:
+            alarm (Alarm): the Alarm to update
+            iasio (dict): A dictionary with the IASIO info
+
+        Returns:
+            boolean: True if the Alarm changed, False if not
+        """
+        new_alarm = self._create_alarm_from_cdb_iasio(iasio)
+        changed = False
+        for field in ['description', 'url', 'sound', 'can_shelve']:
+            if getattr(alarm, field) != getattr(new_alarm, field):
+                setattr(alarm, field, getattr(new_alarm, field))
+                changed = True
+        return changed
+
     @classmethod
     def _create_alarm_from_cdb_iasio(self, iasio):
         """
@@ -246,12 +627,6 @@ class AlarmCollection:
         """
         logger.debug('creating an alarm based on iasio with id %s', iasio['id'])
         current_time = int(round(time.time() * 1000))
-        if 'shortDesc' not in iasio:
-            iasio['shortDesc'] = ""
-        if 'docUrl' not in iasio:
-            iasio['docUrl'] = ""
-        if 'sound' not in iasio:
-            iasio['sound'] = ""
         if 'canShelve' not in iasio:
             can_shelve = False
         else:
@@ -266,9 +641,9 @@ class AlarmCollection:
             core_timestamp=current_time,
             core_id=alarm_id,
             running_id='({}:IASIO)'.format(alarm_id),
-            description=iasio['shortDesc'],
-            url=iasio['docUrl'],
-            sound=iasio['sound'],
+            description=iasio.get('shortDesc', ''),
+            url=iasio.get('docUrl', ''),
+            sound=iasio.get('sound', ''),
             can_shelve=can_shelve,
             views=views
         )
@@ -278,7 +653,8 @@ class AlarmCollection:
     def get(self, core_id):
         """
         Returns the Alarm object in the AlarmCollection dictionary with that core_id value.
-        It also initializes the Collection if it has been not initialized before.
+        It does not initialize the Collection, in order to avoid blocking the event loop;
+        if it was not initialized yet it returns None.
 
         Args:
             core_id (string): the core_id of the Alarm to get
@@ -286,12 +662,12 @@ class AlarmCollection:
         Returns:
             dict: A dictionary of Alarm objects
         """
-        if self.init_state == 'pending':
-            self.initialize()
+        if self.singleton_collection is None:
+            return None
         try:
             return self.singleton_collection[core_id]
         except KeyError:
-            return None
+            return self._create_template_instance(core_id)
 
     @classmethod
     def get_dependencies_recursively(self, core_id):
@@ -330,7 +706,9 @@ class AlarmCollection:
     @classmethod
     def get_all_as_dict(self):
         """
-        Returns all the Alarms as a dictionary indexed by core_id
+        Returns all the Alarms as a dictionary indexed by core_id.
+        The instances of the templated alarms that were not referenced yet are included as views of their
+        templates, without storing them in the collection
 
         Returns:
             dict: A dictionary of Alarms indexed by core_id
@@ -338,15 +716,20 @@ class AlarmCollection:
         if self.init_state == 'pending':
             logger.debug('Initializing the collection because it was empty')
             self.initialize()
-        return self.singleton_collection
+        alarms = dict(self.singleton_collection)
+        for alarm in self._iter_template_instances():
+            alarms[alarm.core_id] = alarm
+        return alarms
 
     @classmethod
     def get_all_as_list(self):
-        """Returns all the Alarms as a list"""
-        return list(self.singleton_collection.values())
+        """Returns all the Alarms as a list, including the views of the template instances not referenced yet"""
+        return list(self.singleton_collection.values()) + list(self._iter_template_instances())
 
     @classmethod
     async def receive_iasios(self, iasios):
+        # The acknowledgement and shelve states of the new alarms are checked in the index, loaded out of the loop
+        await TicketIndex.load_if_needed_in_db_executor()
         tickets_to_create = []
         tickets_to_clear = []
         for iasio in iasios:
@@ -360,33 +743,40 @@ class AlarmCollection:
                 status = AlarmCollection.add_or_update_value(iasio)
                 logger.debug('New value IASIO received by consumer: %s', str(iasio))
 
+        # The tickets are written behind by the journal, which may wait if too many tickets are pending
         if len(tickets_to_create) > 0:
             logger.debug('Creating tickets: %s', len(tickets_to_create))
-            asyncio.ensure_future(self.create_tickets(tickets_to_create))
+            await TicketJournal.create_tickets(tickets_to_create)
         if len(tickets_to_clear) > 0:
             logger.debug('Clearing tickets: %s', len(tickets_to_clear))
-            asyncio.ensure_future(self.clear_tickets(tickets_to_clear))
+            await TicketJournal.clear_tickets(tickets_to_clear)
 
     @classmethod
-    def add(self, alarm):
+    def add(self, alarm, ack=None, shelved=None):
         """
         Adds the alarm to the AlarmCollection dictionary
 
         Args:
             alarm (Alarm): the Alarm object to add
+            ack (boolean): optional acknowledgement state of the alarm if it is CLEARED,
+                if not given it is checked against the Tickets app
+            shelved (boolean): optional shelve state of the alarm,
+                if not given it is checked against the Tickets app
 
         Returns:
             tickets_to_create: a list of IDS to create tickets
         """
         tickets_to_create = []
         if alarm.value == Value.CLEARED.value:
-            alarm.ack = TicketConnector.check_acknowledgement(
-                alarm.core_id
-            )
+            if ack is None:
+                ack = TicketConnector.check_acknowledgement(alarm.core_id)
+            alarm.ack = ack
         else:
             self._unacknowledge(alarm)
             tickets_to_create.append(alarm.core_id)
-        alarm.shelved = TicketConnector.check_shelve(alarm.core_id)
+        if shelved is None:
+            shelved = TicketConnector.check_shelve(alarm.core_id)
+        alarm.shelved = shelved
         self.singleton_collection[alarm.core_id] = alarm
         alarm.stored = True
         self._update_parents_collection(alarm)
@@ -395,6 +785,190 @@ class AlarmCollection:
         logger.debug('The alarm %s was added to the collection', alarm.core_id)
         return tickets_to_create
 
+    @classmethod
+    def _add_initial_alarm(self, alarm, unack_alarm_ids, shelved_alarm_ids):
+        """
+        Auxiliary method used to add an Alarm during the initialization, using the ack and shelve states
+        previously retrieved in bulk from the Tickets app instead of querying them for each Alarm
+
+        Args:
+            alarm (Alarm): the Alarm object to add
+            unack_alarm_ids (set): IDs of the Alarms with pending acknowledgements
+            shelved_alarm_ids (set): IDs of the Alarms that are shelved
+
+        Returns:
+            tickets_to_create: a list of IDS to create tickets
+        """
+        return self.add(
+            alarm,
+            ack=alarm.core_id not in unack_alarm_ids,
+            shelved=alarm.core_id in shelved_alarm_ids
+        )
+
+    @classmethod
+    def _add_initial_iasio(self, iasio, unack_alarm_ids, shelved_alarm_ids):
+        """
+        Auxiliary method used to add an IASIO during the initialization.
+        If the IASIO is templated (it has a 'templateRange') it is added to the templates collection,
+        without creating the Alarms of its instances
+
+        Args:
+            iasio (dict): A dictionary with the IASIO info
+            unack_alarm_ids (set): IDs of the Alarms with pending acknowledgements
+            shelved_alarm_ids (set): IDs of the Alarms that are shelved
+        """
+        self.cdb_iasios[iasio['id']] = iasio
+        if 'templateRange' not in iasio:
+            alarm = self._create_alarm_from_cdb_iasio(iasio)
+            self._add_initial_alarm(alarm, unack_alarm_ids, shelved_alarm_ids)
+            return
+        (minimum, maximum) = iasio['templateRange']
+        prototype = self._create_alarm_from_cdb_iasio(iasio)
+        prototype.ack = True
+        self.templates_collection[iasio['id']] = {
+            'iasio': iasio,
+            'range': range(minimum, maximum + 1),
+            'prototype': prototype.to_dict(),
+        }
+
+    @classmethod
+    def _add_initial_template_instances(self, alarm_ids, unack_alarm_ids, shelved_alarm_ids):
+        """
+        Auxiliary method used to create during the initialization the Alarms of the instances of templated alarms
+        that are referenced by the Tickets app or by the Panels app, which may not have the default state
+
+        Args:
+            alarm_ids (iterable): IDs of the referenced Alarms, the ones that are not template instances are ignored
+            unack_alarm_ids (set): IDs of the Alarms with pending acknowledgements
+            shelved_alarm_ids (set): IDs of the Alarms that are shelved
+        """
+        if not self.templates_collection:
+            return
+        for alarm_id in alarm_ids:
+            if alarm_id in self.singleton_collection:
+                continue
+            template = self._get_template_of_instance(alarm_id)
+            if template is None:
+                continue
+            alarm = self._create_alarm_from_template(alarm_id, template)
+            self._add_initial_alarm(alarm, unack_alarm_ids, shelved_alarm_ids)
+
+    @classmethod
+    def _get_template_of_instance(self, core_id):
+        """
+        Returns the templated alarm of an instance
+
+        Args:
+            core_id (string): the core_id of the instance, in the form '<templated IASIO id> instance <number>'
+
+        Returns:
+            dict: the templated alarm from the templates collection, or None if core_id is not one of its instances
+        """
+        if not self.templates_collection or ' instance ' not in core_id:
+            return None
+        (templated_id, _, number) = core_id.rpartition(' instance ')
+        template = self.templates_collection.get(templated_id)
+        if template is None or not number.isdigit() or str(int(number)) != number \
+                or int(number) not in template['range']:
+            return None
+        return template
+
+    @classmethod
+    def _create_alarm_from_template(self, core_id, template):
+        """
+        Auxiliary method used to create the Alarm of an instance of a templated alarm,
+        with the state shared by all the instances that were not referenced yet
+
+        Args:
+            core_id (string): the core_id of the instance
+            template (dict): the templated alarm from the templates collection
+
+        Returns:
+            alarm: an Alarm object
+        """
+        iasio = dict(template['iasio'], id=core_id)
+        alarm = self._create_alarm_from_cdb_iasio(iasio)
+        alarm.core_timestamp = template['prototype']['core_timestamp']
+        return alarm
+
+    @classmethod
+    def _create_template_instance(self, core_id):
+        """
+        Creates and stores the Alarm of an instance of a templated alarm the first time it is referenced.
+        The instances that were not referenced after the initialization are not acknowledged nor shelved,
+        therefore they are stored as acknowledged and not shelved, and no changes are recorded
+
+        Args:
+            core_id (string): the core_id of the instance
+
+        Returns:
+            alarm: the Alarm object, or None if core_id is not an instance of a templated alarm
+        """
+        template = self._get_template_of_instance(core_id)
+        if template is None:
+            return None
+        alarm = self._create_alarm_from_template(core_id, template)
+        alarm.ack = True
+        alarm.shelved = False
+        alarm.stored = True
+        self.singleton_collection[core_id] = alarm
+        logger.debug('The alarm of the template instance %s was created', core_id)
+        return alarm
+
+    @classmethod
+    def _iter_template_instances(self):
+        """
+        Generates the Alarms of the instances of templated alarms that were not referenced yet,
+        merging the prototype of each template with the id of the instance. The Alarms are not stored
+
+        Yields:
+            Alarm: the Alarm of each instance, acknowledged and not shelved
+        """
+        if not self.templates_collection:
+            return
+        for (templated_id, template) in self.templates_collection.items():
+            for i in template['range']:
+                core_id = templated_id + ' instance ' + str(i)
+                if core_id not in self.singleton_collection:
+                    alarm = self._create_alarm_from_template(core_id, template)
+                    alarm.ack = True
+                    alarm.shelved = False
+                    yield alarm
+
+    @classmethod
+    def _get_template_instances_as_dicts(self):
+        """
+        Returns the instances of templated alarms that were not referenced yet, as dictionaries
+        with the same format of :func:`alarms.models.Alarm.to_dict`
+
+        Returns:
+            list: A list of dictionaries
+        """
+        alarms = []
+        if not self.templates_collection:
+            return alarms
+        for (templated_id, template) in self.templates_collection.items():
+            for i in template['range']:
+                core_id = templated_id + ' instance ' + str(i)
+                if core_id not in self.singleton_collection:
+                    alarms.append(dict(
+                        template['prototype'], core_id=core_id, running_id='({}:IASIO)'.format(core_id)
+                    ))
+        return alarms
+
+    @classmethod
+    def _get_or_fail(self, core_id):
+        """
+        Returns the Alarm with that core_id, creating it if it is an instance of a templated alarm
+
+        Raises:
+            KeyError: if there is no Alarm with that core_id
+        """
+        alarm = self.get(core_id)
+        if alarm is None:
+            raise KeyError(core_id)
+        return alarm
+
     @classmethod
     def add_or_update_alarm(self, iasio):
         """
@@ -427,7 +1001,7 @@ class AlarmCollection:
         if 'depsFullRunningIds' in iasio.keys():
             for dep_full_rid in iasio['depsFullRunningIds']:
                 dep_id = AlarmCollection._get_core_id_from(dep_full_rid)
-                if dep_id in self.singleton_collection.keys():
+                if self.get(dep_id) is not None:
                     dependencies.append(dep_id)
         params = {
             'value': AlarmCollection.value_options[iasio['value']],
@@ -585,6 +1159,8 @@ class AlarmCollection:
         """
         if type(core_ids) is not list:
             core_ids = [core_ids]
+        # The pending tickets must be written before they are acknowledged
+        await TicketJournal.flush()
 
         alarms = []
         alarms_ids = []
@@ -608,7 +1184,7 @@ class AlarmCollection:
         Returns:
             int: 1 if it was shelved, 0 if not, -1 if shelving is not allowed
         """
-        alarm = self.singleton_collection[core_id]
+        alarm = self._get_or_fail(core_id)
         status = alarm.shelve()
         if status == 1:
             self.record_alarm_changes(alarm)
@@ -629,10 +1205,11 @@ class AlarmCollection:
         """
         if type(core_ids) is not list:
             core_ids = [core_ids]
+        ShelveScheduler.cancel(core_ids)
 
         alarms = []
         for core_id in core_ids:
-            alarm = self.singleton_collection[core_id]
+            alarm = self._get_or_fail(core_id)
             if alarm.unshelve():
                 alarms.append(alarm)
 
@@ -644,6 +1221,26 @@ class AlarmCollection:
             logger.debug('any of the alarm in %s was unshelved', core_ids)
             return False
 
+    @classmethod
+    async def unshelve_expired(self, core_ids):
+        """
+        Unshelves the Alarms whose shelve timeouts were reached, called by the ShelveScheduler at their deadlines.
+        The expired ShelveRegistries are unshelved in the database executor, in order to avoid blocking the event loop
+
+        Args:
+            core_ids (list): list of core_ids of the Alarms whose deadlines were reached
+
+        Returns:
+            list: the core_ids of the Alarms whose registries were unshelved
+        """
+        expired_ids = await run_in_db_executor(TicketConnector.unshelve_expired)
+        logger.debug('The deadlines of %s were reached, the registries of %s were unshelved', core_ids, expired_ids)
+        # The alarms removed from the CDB while they were shelved are not in the collection anymore
+        alarm_ids = [core_id for core_id in expired_ids if self.get(core_id) is not None]
+        if alarm_ids:
+            await self.unshelve(alarm_ids)
+        return expired_ids
+
     @classmethod
     def _add_parent(self, alarm_id, parent_id):
         """ Add a parent to the list of parents of the alarm
@@ -663,8 +1260,8 @@ class AlarmCollection:
     def _check_dependencies_ack(self, alarm):
         """ Checks wether all the children Alarms of a given Alarm are acknowledged or not """
         for core_id in alarm.dependencies:
-            dependency = self.singleton_collection[core_id]
-            if not dependency.ack:
+            dependency = self.singleton_collection.get(core_id)
+            if dependency is not None and not dependency.ack:
                 logger.debug(
                     'NOT all the dependencies of alarm %s were acknowledged',
                     alarm.core_id)
@@ -676,20 +1273,23 @@ class AlarmCollection:
         """
         Clear the open tickets for a list of specified Alarm IDs
 
+        The tickets are cleared in the database executor, in order to avoid blocking the event loop
+
         Args:
             alarm_ids (string[]): List of Core ID of the Alarms associated to the Tickets to clear
         """
-        return TicketConnector.clear_tickets(alarm_ids)
+        return await run_in_db_executor(TicketConnector.clear_tickets, alarm_ids)
 
     @classmethod
     async def create_tickets(self, alarm_ids):
         """
-        Creates a ticket for a list of specified Alarm IDs
+        Creates a ticket for a list of specified Alarm IDs.
+        The tickets are created in the database executor, in order to avoid blocking the event loop
 
         Args:
             alarm_ids (string[]): List of Core ID of the Alarms to create tickets
         """
-        return TicketConnector.create_tickets(alarm_ids)
+        return await run_in_db_executor(TicketConnector.create_tickets, alarm_ids)
 
     @classmethod
     def _get_parents(self, alarm_id):
@@ -1,11 +1,19 @@
 import logging
+from django.db import transaction
+from django.utils import timezone
 from cdb.readers import CdbReader
+from alarms.index import TicketIndex
 from tickets.models import Ticket, TicketStatus
 from tickets.models import ShelveRegistry, ShelveRegistryStatus
+from tickets.signals import tickets_created, tickets_cleared
+from tickets.statistics import TicketStatistics
 from panels.interfaces import IPanels
 
 logger = logging.getLogger(__name__)
 
+CLEAR_TICKETS_BATCH_SIZE = 500
+""" Maximum number of Alarm IDs cleared by each update, to keep the queries under the limits of the databases """
+
 
 class CdbConnector():
     """ This class defines methods to communicate the Alarm app with the CDB app
@@ -18,9 +26,16 @@ class CdbConnector():
     """ Validity threshold in milliseconds defines to be used to calculate the validity of alarms """
 
     @classmethod
-    def get_iasios(self, type=None):
-        """ Return a list of iasios filtered by type formatted as dict """
-        return CdbReader.read_alarm_iasios()
+    def get_iasios(self, type=None, expand=True):
+        """
+        Return a list of iasios filtered by type formatted as dict.
+        If expand is False the templated iasios are returned once, with their range of instances
+        in the 'templateRange' field, instead of one iasio for each instance
+        """
+        if not CdbReader.cache.entries:
+            # Nothing read from the CDB files yet, use the compiled CDB if it is up to date
+            return CdbReader.read_compiled_alarm_iasios(expand)
+        return CdbReader.read_alarm_iasios(expand)
 
     @classmethod
     def initialize_ias(self, pk=0):
@@ -43,68 +58,182 @@ class TicketConnector():
     This class defines methods to communicate the Alarm app with the Ticket app
     """
 
-    unack_statuses = [
-        int(TicketStatus.get_choices_by_name()['UNACK']),
-        int(TicketStatus.get_choices_by_name()['CLEARED_UNACK'])
-    ]
+    unack_status = int(TicketStatus.get_choices_by_name()['UNACK'])
+    """ Status of the open tickets """
+
+    cleared_unack_status = int(TicketStatus.get_choices_by_name()['CLEARED_UNACK'])
+    """ Status of the tickets cleared before being acknowledged """
+
+    unack_statuses = [unack_status, cleared_unack_status]
+    """ Statuses of the tickets pending acknowledgement """
 
     @classmethod
     def create_tickets(self, alarm_ids):
         """
         Create a list of ticket for a given list of Alarm IDs
 
+        The tickets are inserted in bulk, in a single transaction
+
         Args:
             alarm_ids (string[]): List of ID of Alarms to create tickets
         """
-        for id in alarm_ids:
-            Ticket.objects.create(alarm_id=id)
+        try:
+            with transaction.atomic():
+                tickets = Ticket.objects.bulk_create([Ticket(alarm_id=id) for id in alarm_ids])
+                tickets_created.send(
+                    sender=Ticket, tickets=[(ticket.alarm_id, ticket.status, ticket.created_at) for ticket in tickets]
+                )
+        except Exception:
+            TicketIndex.invalidate()
+            raise
 
     @classmethod
-    def clear_tickets(self, alarm_ids):
+    def clear_tickets(self, alarm_ids, cleared_at=None):
         """
-        Closes a list of ticket for a given list of Alarm IDs
+        Closes a list of ticket for a given list of Alarm IDs.
+        The UNACK tickets of the Alarms are changed to CLEARED_UNACK with set-based updates in a single transaction,
+        one for each batch of CLEAR_TICKETS_BATCH_SIZE Alarm IDs.
+        The updates are always applied, because the :class:`~alarms.index.TicketIndex` may not include the tickets
+        written by other processes
 
         Args:
             alarm_ids (string[]): List of IDs of the Alarms associated to the tickets
+            cleared_at (datetime): optional time of the clearing, by default the current time
+        """
+        alarm_ids = list(set(alarm_ids))
+        if not alarm_ids:
+            return
+        cleared_at = cleared_at or timezone.now()
+        count = 0
+        try:
+            with transaction.atomic():
+                for i in range(0, len(alarm_ids), CLEAR_TICKETS_BATCH_SIZE):
+                    count += Ticket.objects.filter(
+                        alarm_id__in=alarm_ids[i:i + CLEAR_TICKETS_BATCH_SIZE],
+                        status=self.unack_status
+                    ).update(status=self.cleared_unack_status, cleared_at=cleared_at)
+                tickets_cleared.send(sender=Ticket, alarm_ids=alarm_ids)
+        except Exception:
+            TicketIndex.invalidate()
+            raise
+        logger.debug('%d ack tickets related to %d alarms were closed', count, len(alarm_ids))
+
+    @classmethod
+    def write_tickets(self, cleared_alarm_ids, tickets):
+        """
+        Writes the ticket changes coalesced by the tickets journal in a single transaction.
+        The open tickets of the Alarms are cleared first and then the new tickets are inserted in bulk
+
+        Args:
+            cleared_alarm_ids (dict): lists of IDs of the Alarms whose open tickets must be cleared,
+                indexed by the time of the clearing
+            tickets (list): list of dicts with the 'alarm_id', the 'created_at' time and the 'cleared_at' time
+                (None if it is still open) of each ticket to create
         """
-        for id in alarm_ids:
-            queryset = Ticket.objects.filter(alarm_id=id)
-            queryset = queryset.filter(status=int(TicketStatus.get_choices_by_name()['UNACK']))
-            for ticket in queryset:
-                ticket.clear()
-            logger.debug('%d ack tickets related to alarm %s were closed', len(queryset), id)
+        try:
+            with transaction.atomic():
+                for cleared_at, alarm_ids in cleared_alarm_ids.items():
+                    self.clear_tickets(alarm_ids, cleared_at=cleared_at)
+                created_tickets = Ticket.objects.bulk_create([
+                    Ticket(
+                        alarm_id=ticket['alarm_id'],
+                        created_at=ticket['created_at'],
+                        cleared_at=ticket['cleared_at'],
+                        status=self.unack_status if ticket['cleared_at'] is None else self.cleared_unack_status,
+                    )
+                    for ticket in tickets
+                ])
+                tickets_created.send(
+                    sender=Ticket,
+                    tickets=[(ticket.alarm_id, ticket.status, ticket.created_at) for ticket in created_tickets]
+                )
+        except Exception:
+            TicketIndex.invalidate()
+            raise
 
     @classmethod
     def check_acknowledgement(self, alarm_id):
         """
-        Check if the alarm has pending acknowledgements.
+        Check if the alarm has pending acknowledgements, in the :class:`~alarms.index.TicketIndex`.
 
         Args:
             alarm_id (string): ID of the Alarm
         Returns:
             (bolean): true if the alarm is acknowledged otherwise false
         """
-        ticket = Ticket.objects.filter(
-            alarm_id=alarm_id,
-            status__in=self.unack_statuses
-        ).first()
-        return False if ticket else True
+        return TicketIndex.is_acknowledged(alarm_id)
 
     @classmethod
     def check_shelve(self, alarm_id):
         """
-        Check if the alarm is shelved.
+        Check if the alarm is shelved, in the :class:`~alarms.index.TicketIndex`.
 
         Args:
             alarm_id (string): ID of the Alarm
         Returns:
             (bolean): true if the alarm is shelved otherwise false
         """
-        registry = ShelveRegistry.objects.filter(
-            alarm_id=alarm_id,
+        return TicketIndex.is_shelved(alarm_id)
+
+    @classmethod
+    def get_unack_alarm_ids(self):
+        """
+        Returns the IDs of all the alarms with pending acknowledgements, from the :class:`~alarms.index.TicketIndex`.
+        Intended to be used for bulk initialization instead of :func:`check_acknowledgement`
+
+        Returns:
+            (set): set of IDs of the Alarms with tickets in status UNACK or CLEARED_UNACK
+        """
+        return TicketIndex.get_unack_alarm_ids()
+
+    @classmethod
+    def get_shelved_alarm_ids(self):
+        """
+        Returns the IDs of all the alarms that are shelved, from the :class:`~alarms.index.TicketIndex`.
+        Intended to be used for bulk initialization instead of :func:`check_shelve`
+
+        Returns:
+            (set): set of IDs of the Alarms with ShelveRegistries in status SHELVED
+        """
+        return TicketIndex.get_shelved_alarm_ids()
+
+    @classmethod
+    def get_shelve_deadlines(self):
+        """
+        Returns the expiration times of the shelves of all the alarms that are shelved, in a single query.
+        Intended to be used to rebuild the scheduler of the shelve expirations at startup
+
+        Returns:
+            (dict): dictionary with the expiration time of the ShelveRegistry in status SHELVED of each Alarm,
+            indexed by Alarm ID
+        """
+        queryset = ShelveRegistry.objects.filter(
             status=int(ShelveRegistryStatus.get_choices_by_name()['SHELVED'])
-        ).first()
-        return True if registry else False
+        ).values_list('alarm_id', 'expires_at')
+        return dict(queryset)
+
+    @classmethod
+    def rollup_ticket_statistics(self, alarms_views_dict):
+        """
+        Computes the statistics of the tickets and persists their rollups
+
+        Args:
+            alarms_views_dict (dict): the lists of names of the views, indexed by alarm id
+
+        Returns:
+            (dict): the statistics of the tickets
+        """
+        return TicketStatistics.rollup(alarms_views_dict)
+
+    @classmethod
+    def unshelve_expired(self):
+        """
+        Unshelves the ShelveRegistries whose timeouts were reached
+
+        Returns:
+            (list): list of IDs of the Alarms of the unshelved registries
+        """
+        return ShelveRegistry.objects.unshelve_expired()
 
 
 class PanelsConnector():
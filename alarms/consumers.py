@@ -13,15 +13,10 @@ class CoreConsumer(AsyncJsonWebsocketConsumer):
     """ Consumer for messages from the core system """
 
     async def connect(self):
-        """ Called upon connection, rejects connection if no authenticated user or password """
-        if AlarmCollection.init_state == 'pending':
-            asyncio.ensure_future(AlarmCollection.start_initialization())
-            await self.close()
-            return
-        elif AlarmCollection.init_state == 'in_progress':
-            await self.close()
-            return
-
+        """
+        Called upon connection, rejects connection if no authenticated user or password.
+        If the AlarmCollection is not initialized yet, the connection is accepted and its initialization is started
+        """
         # Reject connection if no authenticated user:
         if self.scope['user'].is_anonymous:
             if self.scope['password'] and \
@@ -29,17 +24,24 @@ class CoreConsumer(AsyncJsonWebsocketConsumer):
                 await self.accept()
             else:
                 await self.close()
+                return
         else:
             await self.accept()
 
+        if AlarmCollection.init_state != 'done':
+            asyncio.ensure_future(AlarmCollection.start_initialization())
+
     async def receive_json(self, content, **kwargs):
         """
         Handles the messages received by this consumer.
         It delegates handling of the alarms received in the messages to :func:`~AlarmCollection.add_or_update_alarm`
 
+        The messages received while the AlarmCollection is being initialized are parked until it is finished
+
         Responds with a message indicating the action taken
         (created, updated, ignored)
         """
+        await AlarmCollection.start_initialization()
         start = time.time()
         if not isinstance(content, list):
             content = [content]
@@ -55,26 +57,21 @@ class ClientConsumer(AsyncJsonWebsocketConsumer, AlarmCollectionObserver):
     async def connect(self):
         """
         Called upon connection, rejects connection if no authenticated user or password.
+        If the AlarmCollection is not initialized yet, the connection is accepted and parked until it is finished.
         Start the periodic notifications in the AlarmCollection
         """
         # Reject connection if no authenticated user:
-        if AlarmCollection.init_state == 'pending':
-            asyncio.ensure_future(AlarmCollection.start_initialization())
-            await self.close()
-            return
-        elif AlarmCollection.init_state == 'in_progress':
-            await self.close()
-            return
         if self.scope['user'].is_anonymous:
             if self.scope['password'] and \
               self.scope['password'] == PROCESS_CONNECTION_PASS:
-                AlarmCollection.register_observer(self)
                 await self.accept()
             else:
                 await self.close()
+                return
         else:
-            AlarmCollection.register_observer(self)
             await self.accept()
+        await AlarmCollection.start_initialization()
+        AlarmCollection.register_observer(self)
         await AlarmCollection.start_periodic_tasks()
 
     async def update(self, payload, stream):
@@ -0,0 +1,335 @@
+import logging
+import threading
+import time
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from tickets.models import Ticket, TicketStatus, ShelveRegistry, ShelveRegistryStatus
+from tickets.signals import (
+    tickets_created,
+    tickets_cleared,
+    tickets_acknowledged,
+    ticket_status_changed,
+    registries_unshelved,
+    tickets_write_failed,
+)
+from ias_webserver.settings import TICKET_INDEX_MAX_AGE
+from utils.executors import run_in_db_executor
+
+logger = logging.getLogger(__name__)
+
+
+class TicketIndex:
+    """
+    This class defines the in-memory index of the open tickets and the active shelves of the alarms, used to check
+    their acknowledgement and shelve states without querying the database.
+
+    The index is only a cache of the database of each process, the writes never depend on it. It is loaded from the
+    database and then kept in sync by the signals sent by the write paths of the tickets and the shelve registries,
+    when their transactions are committed. If a write fails the index is invalidated.
+    A change committed while the index is loaded may or may not be read by the load, so the changes queued before a
+    load invalidate the index instead of being applied twice or lost.
+    The changes written by other processes, as other workers of the webserver, are not signaled, so the index is
+    loaded again when it is used TICKET_INDEX_MAX_AGE seconds after it was loaded
+    """
+
+    lock = threading.RLock()
+    """ Lock used to access the index from different threads """
+
+    loaded = False
+    """ Defines if the index was loaded from the database """
+
+    loaded_at = None
+    """ Value of the monotonic clock when the index was loaded """
+
+    generation = 0
+    """ Number of the last load or invalidation of the index, used to detect the changes queued before it """
+
+    tickets = {}
+    """ Dictionary with the number of UNACK and CLEARED_UNACK tickets by status, indexed by alarm id """
+
+    shelves = {}
+    """ Dictionary with the set of ids of the SHELVED registries, indexed by alarm id """
+
+    unack_status = int(TicketStatus.get_choices_by_name()['UNACK'])
+    """ Status of the open tickets """
+
+    cleared_unack_status = int(TicketStatus.get_choices_by_name()['CLEARED_UNACK'])
+    """ Status of the tickets cleared before being acknowledged """
+
+    shelved_status = int(ShelveRegistryStatus.get_choices_by_name()['SHELVED'])
+    """ Status of the active shelve registries """
+
+    @classmethod
+    def load(self):
+        """ Loads the index from the database, with a grouped query of the tickets and a query of the registries """
+        with self.lock:
+            (self.tickets, self.shelves) = self._read_from_db()
+            self.loaded = True
+            self.loaded_at = time.monotonic()
+            self.generation += 1
+        logger.info(
+            'The ticket index was loaded with %d alarms with tickets and %d shelved alarms',
+            len(self.tickets), len(self.shelves)
+        )
+
+    @classmethod
+    def invalidate(self):
+        """ Discards the index, it is loaded again from the database when it is used """
+        with self.lock:
+            self.loaded = False
+            self.tickets = {}
+            self.shelves = {}
+            self.generation += 1
+
+    @classmethod
+    def verify(self):
+        """
+        Compares the index, as it is in memory, with the database. The index is not loaded by the check,
+        if it is not loaded there are no differences and it is reported as not 'loaded'
+
+        Returns:
+            dict: if the index is 'loaded', and the differences of the 'tickets' and the 'shelves', indexed by alarm id,
+            as dictionaries with the content of the 'index' and of the 'database'
+        """
+        with self.lock:
+            if not self.loaded:
+                return {'loaded': False, 'tickets': {}, 'shelves': {}}
+            (tickets, shelves) = self._read_from_db()
+            return {
+                'loaded': True,
+                'tickets': self._diff(self.tickets, tickets),
+                'shelves': self._diff(
+                    {alarm_id: sorted(pks) for (alarm_id, pks) in self.shelves.items()},
+                    {alarm_id: sorted(pks) for (alarm_id, pks) in shelves.items()}
+                ),
+            }
+
+    @classmethod
+    def is_acknowledged(self, alarm_id):
+        """ Returns True if the alarm does not have UNACK nor CLEARED_UNACK tickets """
+        with self.lock:
+            self._load_if_needed()
+            return alarm_id not in self.tickets
+
+    @classmethod
+    def is_shelved(self, alarm_id):
+        """ Returns True if the alarm has a SHELVED registry """
+        with self.lock:
+            self._load_if_needed()
+            return alarm_id in self.shelves
+
+    @classmethod
+    def get_unack_alarm_ids(self):
+        """ Returns the set of IDs of the alarms with UNACK or CLEARED_UNACK tickets """
+        with self.lock:
+            self._load_if_needed()
+            return set(self.tickets)
+
+    @classmethod
+    def get_shelved_alarm_ids(self):
+        """ Returns the set of IDs of the alarms with SHELVED registries """
+        with self.lock:
+            self._load_if_needed()
+            return set(self.shelves)
+
+    @classmethod
+    async def load_if_needed_in_db_executor(self):
+        """ Loads the index in the database executor if it is not loaded or it is too old, to not block the loop """
+        if self._needs_load():
+            await run_in_db_executor(self._load_if_needed)
+
+    @classmethod
+    def apply_on_commit(self, function, *args):
+        """ Applies a change to the index when the current transaction is committed, it is discarded on rollback """
+        generation = self.generation
+        transaction.on_commit(lambda: self._apply(generation, function, *args))
+
+    @classmethod
+    def _apply(self, generation, function, *args):
+        """ Applies a change queued in a generation of the index, or invalidates the index if it was loaded since """
+        with self.lock:
+            if generation == self.generation:
+                function(*args)
+            elif self.loaded:
+                logger.debug('A change of the ticket index was queued before a load, the index is invalidated')
+                self.invalidate()
+
+    @classmethod
+    def add_tickets(self, tickets):
+        """
+        Adds tickets to the index
+
+        Args:
+            tickets (list): list of tuples of (alarm_id, status) of the tickets
+        """
+        with self.lock:
+            if self.loaded:
+                for (alarm_id, status) in tickets:
+                    self._add_ticket(alarm_id, status, 1)
+
+    @classmethod
+    def move_tickets(self, tickets):
+        """
+        Changes the status of tickets in the index
+
+        Args:
+            tickets (list): list of tuples of (alarm_id, previous status, status) of the tickets
+        """
+        with self.lock:
+            if self.loaded:
+                for (alarm_id, previous_status, status) in tickets:
+                    self._add_ticket(alarm_id, previous_status, -1)
+                    self._add_ticket(alarm_id, status, 1)
+
+    @classmethod
+    def clear_tickets(self, alarm_ids):
+        """ Changes all the UNACK tickets of a list of alarms to CLEARED_UNACK in the index """
+        with self.lock:
+            if self.loaded:
+                for alarm_id in alarm_ids:
+                    count = self.tickets.get(alarm_id, {}).get(self.unack_status, 0)
+                    if count > 0:
+                        self._add_ticket(alarm_id, self.unack_status, -count)
+                        self._add_ticket(alarm_id, self.cleared_unack_status, count)
+
+    @classmethod
+    def update_registry(self, alarm_id, pk, status):
+        """ Adds the registry to the index if it is SHELVED, or removes it if not """
+        with self.lock:
+            if not self.loaded:
+                return
+            if status == self.shelved_status:
+                self.shelves.setdefault(alarm_id, set()).add(pk)
+            else:
+                self.remove_registries([(alarm_id, pk)])
+
+    @classmethod
+    def remove_registries(self, registries):
+        """
+        Removes registries from the index
+
+        Args:
+            registries (list): list of tuples of (alarm_id, pk) of the registries
+        """
+        with self.lock:
+            if not self.loaded:
+                return
+            for (alarm_id, pk) in registries:
+                pks = self.shelves.get(alarm_id, set())
+                pks.discard(pk)
+                if not pks:
+                    self.shelves.pop(alarm_id, None)
+
+    @classmethod
+    def _needs_load(self):
+        """ Returns True if the index was not loaded, it was invalidated or it is older than TICKET_INDEX_MAX_AGE """
+        return not self.loaded or time.monotonic() - self.loaded_at > TICKET_INDEX_MAX_AGE
+
+    @classmethod
+    def _load_if_needed(self):
+        """ Loads the index if it was not loaded, it was invalidated or it is older than TICKET_INDEX_MAX_AGE """
+        with self.lock:
+            if self._needs_load():
+                self.load()
+
+    @classmethod
+    def _add_ticket(self, alarm_id, status, count):
+        """ Adds a count to the number of tickets of a status of an alarm, if the status is indexed """
+        if status not in [self.unack_status, self.cleared_unack_status]:
+            return
+        by_status = self.tickets.setdefault(alarm_id, {})
+        by_status[status] = by_status.get(status, 0) + count
+        if by_status[status] <= 0:
+            del by_status[status]
+            if not by_status:
+                del self.tickets[alarm_id]
+
+    @classmethod
+    def _read_from_db(self):
+        """ Reads the content of the index from the database """
+        tickets = {}
+        queryset = Ticket.objects.filter(
+            status__in=[self.unack_status, self.cleared_unack_status]
+        ).values('alarm_id', 'status').annotate(count=Count('id')).order_by()
+        for row in queryset:
+            tickets.setdefault(row['alarm_id'], {})[row['status']] = row['count']
+        shelves = {}
+        for (alarm_id, pk) in ShelveRegistry.objects.filter(status=self.shelved_status).values_list('alarm_id', 'pk'):
+            shelves.setdefault(alarm_id, set()).add(pk)
+        return (tickets, shelves)
+
+    @staticmethod
+    def _diff(index, database):
+        """ Returns the differences between two dictionaries, indexed by key """
+        return {
+            key: {'index': index.get(key), 'database': database.get(key)}
+            for key in set(index) | set(database) if index.get(key) != database.get(key)
+        }
+
+
+@receiver(post_save, sender=Ticket)
+def _index_saved_ticket(sender, instance, created, **kwargs):
+    """ Adds the tickets created one by one, the changes of their status are sent by other signals """
+    if created:
+        TicketIndex.apply_on_commit(TicketIndex.add_tickets, [(instance.alarm_id, instance.status)])
+
+
+@receiver(post_delete, sender=Ticket)
+def _index_deleted_ticket(sender, instance, **kwargs):
+    """ Removes the deleted tickets """
+    TicketIndex.apply_on_commit(TicketIndex.move_tickets, [(instance.alarm_id, instance.status, None)])
+
+
+@receiver(tickets_created, sender=Ticket)
+def _index_created_tickets(sender, tickets, **kwargs):
+    """ Adds the tickets created in bulk """
+    TicketIndex.apply_on_commit(
+        TicketIndex.add_tickets, [(alarm_id, status) for (alarm_id, status, created_at) in tickets]
+    )
+
+
+@receiver(tickets_cleared, sender=Ticket)
+def _index_cleared_tickets(sender, alarm_ids, **kwargs):
+    """ Changes the status of the tickets cleared """
+    TicketIndex.apply_on_commit(TicketIndex.clear_tickets, alarm_ids)
+
+
+@receiver(tickets_acknowledged, sender=Ticket)
+def _index_acknowledged_tickets(sender, tickets, **kwargs):
+    """ Removes the tickets acknowledged, the acknowledged statuses are not indexed """
+    TicketIndex.apply_on_commit(
+        TicketIndex.move_tickets,
+        [(alarm_id, previous_status, None) for (alarm_id, previous_status, created_at) in tickets]
+    )
+
+
+@receiver(ticket_status_changed, sender=Ticket)
+def _index_ticket_status_change(sender, alarm_id, previous_status, status, **kwargs):
+    """ Changes the status of a ticket """
+    TicketIndex.apply_on_commit(TicketIndex.move_tickets, [(alarm_id, previous_status, status)])
+
+
+@receiver(post_save, sender=ShelveRegistry)
+def _index_saved_registry(sender, instance, **kwargs):
+    """ Adds or removes the registries created or modified one by one """
+    TicketIndex.apply_on_commit(TicketIndex.update_registry, instance.alarm_id, instance.pk, instance.status)
+
+
+@receiver(post_delete, sender=ShelveRegistry)
+def _index_deleted_registry(sender, instance, **kwargs):
+    """ Removes the deleted registries """
+    TicketIndex.apply_on_commit(TicketIndex.remove_registries, [(instance.alarm_id, instance.pk)])
+
+
+@receiver(registries_unshelved, sender=ShelveRegistry)
+def _index_unshelved_registries(sender, registries, **kwargs):
+    """ Removes the registries unshelved in bulk """
+    TicketIndex.apply_on_commit(TicketIndex.remove_registries, registries)
+
+
+@receiver(tickets_write_failed)
+def _invalidate_index(sender, **kwargs):
+    """ Discards the index when a write of the tickets or the registries fails """
+    TicketIndex.invalidate()
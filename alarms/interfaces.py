@@ -1,5 +1,6 @@
 from asgiref.sync import async_to_sync
 from alarms.collections import AlarmCollection
+from alarms.scheduler import ShelveScheduler
 
 
 class IAlarms:
@@ -35,6 +36,27 @@ class IAlarms:
         """
         return async_to_sync(AlarmCollection.unshelve)(alarm_ids)
 
+    @classmethod
+    def schedule_unshelve(self, alarm_id, expires_at):
+        """
+        Schedule the unshelving of an Alarm when its shelve timeout is reached
+
+        Args:
+            alarm_id (string): ID of the shelved Alarm
+            expires_at (datetime): time when the shelve expires
+        """
+        return ShelveScheduler.schedule(alarm_id, expires_at)
+
+    @classmethod
+    def get_alarms_views_dict(self):
+        """
+        Get the names of the views of each alarm, without initializing the alarms
+
+        Returns:
+            dict: the lists of names of the views, indexed by alarm id
+        """
+        return AlarmCollection.alarms_views_dict or {}
+
     @classmethod
     def get_alarm_dependencies(self, alarm_id):
         """
@@ -0,0 +1,285 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from alarms.connectors import TicketConnector
+from ias_webserver.settings import (
+    TICKET_JOURNAL_FILE,
+    TICKET_JOURNAL_BATCH_SIZE,
+    TICKET_JOURNAL_FLUSH_INTERVAL,
+    TICKET_JOURNAL_MAX_PENDING,
+)
+from utils.executors import run_in_db_executor
+
+logger = logging.getLogger(__name__)
+
+CREATE = 'create'
+""" Action of the intents to create a ticket for each alarm """
+
+CLEAR = 'clear'
+""" Action of the intents to clear the open tickets of each alarm """
+
+
+class TicketJournal:
+    """
+    This class defines the write-behind journal of the tickets created and cleared by the AlarmCollection.
+
+    The intents are kept in memory and appended to a local file, in order to replay them if the process stops before
+    they are written. They are written to the database in batches, when TICKET_JOURNAL_BATCH_SIZE alarm ids are
+    pending or every TICKET_JOURNAL_FLUSH_INTERVAL seconds, coalescing the intents of the same alarm.
+    When TICKET_JOURNAL_MAX_PENDING alarm ids are pending the new intents wait for the pending ones to be written
+    """
+
+    pending = []
+    """ List of the intents not written to the database yet, as tuples of (action, alarm_ids, timestamp) """
+
+    pending_count = 0
+    """ Number of alarm ids of the pending intents """
+
+    flushing = []
+    """ List of the intents taken from the pending ones that are being written to the database """
+
+    file = None
+    """ Reference to the journal file opened to append the intents """
+
+    file_lock = threading.Lock()
+    """ Lock used to access the journal file from the event loop and from the recovery in the database executor """
+
+    loop = None
+    """ Reference to the event loop where the flushes are performed """
+
+    flush_lock = None
+    """ Lock used to perform only one flush at a time """
+
+    periodic_flush_task = None
+    """ Reference to the Task that flushes the intents periodically """
+
+    batch_flush_task = None
+    """ Reference to the Task that flushes the intents when a batch is complete """
+
+    @classmethod
+    def get_location(self):
+        """ Returns the path of the journal file, or None if the intents are only kept in memory """
+        testing = os.environ.get('TESTING', False)
+        if testing or not TICKET_JOURNAL_FILE:
+            return None
+        return TICKET_JOURNAL_FILE
+
+    @classmethod
+    async def create_tickets(self, alarm_ids):
+        """
+        Registers the intent to create a ticket for a list of Alarm IDs
+
+        Args:
+            alarm_ids (string[]): List of Core ID of the Alarms to create tickets
+        """
+        await self.append(CREATE, alarm_ids)
+
+    @classmethod
+    async def clear_tickets(self, alarm_ids):
+        """
+        Registers the intent to clear the open tickets of a list of Alarm IDs
+
+        Args:
+            alarm_ids (string[]): List of Core ID of the Alarms associated to the Tickets to clear
+        """
+        await self.append(CLEAR, alarm_ids)
+
+    @classmethod
+    async def append(self, action, alarm_ids):
+        """
+        Appends an intent to the journal and triggers a flush if a batch is complete.
+        If too many alarm ids are pending it waits until they are written, applying back-pressure to the caller
+
+        Args:
+            action (string): the action of the intent, CREATE or CLEAR
+            alarm_ids (string[]): List of Core ID of the Alarms of the intent
+        """
+        intent = (action, list(alarm_ids), timezone.now())
+        self.pending.append(intent)
+        self.pending_count += len(intent[1])
+        self._write([intent])
+        self._start_periodic_flush()
+        if self.pending_count >= TICKET_JOURNAL_MAX_PENDING:
+            logger.warning('%d ticket intents are pending, waiting for them to be written', self.pending_count)
+            await self.flush()
+        elif self.pending_count >= TICKET_JOURNAL_BATCH_SIZE:
+            if self.batch_flush_task is None or self.batch_flush_task.done():
+                self.batch_flush_task = asyncio.ensure_future(self.flush())
+
+    @classmethod
+    async def flush(self):
+        """
+        Writes the pending intents to the database in the database executor.
+        If the writing fails the intents are kept to be written in the next flush
+
+        Returns:
+            int: the number of intents written
+        """
+        self._bind_to_loop()
+        async with self.flush_lock:
+            if len(self.pending) == 0:
+                return 0
+            intents = self.pending
+            self.pending = []
+            self.pending_count = 0
+            self.flushing = intents
+            try:
+                await run_in_db_executor(self._write_to_db, intents)
+            except Exception:
+                logger.exception('%d ticket intents could not be written, they will be retried', len(intents))
+                self.pending = intents + self.pending
+                self.pending_count = sum([len(alarm_ids) for (action, alarm_ids, timestamp) in self.pending])
+                return 0
+            finally:
+                self.flushing = []
+            self._rewrite(self.pending)
+            logger.debug('%d ticket intents were written', len(intents))
+            return len(intents)
+
+    @classmethod
+    async def periodic_flush_coroutine(self):
+        """ Coroutine that writes the pending intents to the database periodically """
+        while True:
+            await asyncio.sleep(TICKET_JOURNAL_FLUSH_INTERVAL)
+            await self.flush()
+
+    @classmethod
+    def recover(self):
+        """
+        Writes to the database the intents left in the journal file by a previous execution.
+        Intended to be called before the acknowledgement states of the alarms are read from the database.
+        The intents of the file that are pending or being flushed by this execution are skipped, because they are
+        written by the flushes
+
+        Returns:
+            int: the number of intents written
+        """
+        filepath = self.get_location()
+        if filepath is None:
+            return 0
+        intents = []
+        with self.file_lock:
+            if not os.path.exists(filepath):
+                return 0
+            own_lines = set([self._serialize(intent) for intent in self.flushing + self.pending])
+            with open(filepath) as file:
+                for line in file:
+                    if line in own_lines:
+                        continue
+                    try:
+                        data = json.loads(line)
+                        intents.append((data['action'], data['alarm_ids'], parse_datetime(data['timestamp'])))
+                    except (ValueError, KeyError):
+                        logger.warning('Ignoring an invalid line of the tickets journal %s: %s', filepath, line)
+        self._write_to_db(intents)
+        with self.file_lock:
+            self._rewrite_file(filepath, self.flushing + self.pending)
+        logger.info('%d ticket intents were recovered from %s', len(intents), filepath)
+        return len(intents)
+
+    @classmethod
+    def coalesce(self, intents):
+        """
+        Coalesces a list of intents into the changes to write to the database.
+        The tickets created and cleared inside the list of intents are created already cleared, and the open tickets
+        of each alarm already in the database are cleared only once, at the time of the first clearing
+
+        Args:
+            intents (list): list of intents as tuples of (action, alarm_ids, timestamp), in order
+
+        Returns:
+            tuple: the lists of alarm ids whose open tickets must be cleared indexed by the time of the clearing,
+            and the list of dicts of the tickets to create
+        """
+        first_clears = {}
+        tickets = []
+        open_tickets = {}
+        for (action, alarm_ids, timestamp) in intents:
+            for alarm_id in alarm_ids:
+                if action == CREATE:
+                    ticket = {'alarm_id': alarm_id, 'created_at': timestamp, 'cleared_at': None}
+                    tickets.append(ticket)
+                    open_tickets.setdefault(alarm_id, []).append(ticket)
+                elif action == CLEAR:
+                    for ticket in open_tickets.pop(alarm_id, []):
+                        ticket['cleared_at'] = timestamp
+                    first_clears.setdefault(alarm_id, timestamp)
+        cleared_alarm_ids = {}
+        for alarm_id, timestamp in first_clears.items():
+            cleared_alarm_ids.setdefault(timestamp, []).append(alarm_id)
+        return (cleared_alarm_ids, tickets)
+
+    @classmethod
+    def _write_to_db(self, intents):
+        """ Coalesces a list of intents and writes the result to the database """
+        (cleared_alarm_ids, tickets) = self.coalesce(intents)
+        TicketConnector.write_tickets(cleared_alarm_ids, tickets)
+
+    @classmethod
+    def _bind_to_loop(self):
+        """ Creates the flush lock in the current event loop, discarding the references to the tasks of other loops """
+        loop = asyncio.get_event_loop()
+        if self.loop is not loop:
+            self.loop = loop
+            self.flush_lock = asyncio.Lock()
+            self.periodic_flush_task = None
+            self.batch_flush_task = None
+
+    @classmethod
+    def _start_periodic_flush(self):
+        """ Starts the coroutine that flushes the intents periodically as a task, if it is not running """
+        self._bind_to_loop()
+        if self.periodic_flush_task is None or self.periodic_flush_task.done():
+            logger.info('Starting periodic flush of the tickets journal')
+            self.periodic_flush_task = asyncio.ensure_future(self.periodic_flush_coroutine())
+
+    @classmethod
+    def _write(self, intents):
+        """ Appends a list of intents to the journal file, if it is used """
+        filepath = self.get_location()
+        if filepath is None:
+            return
+        with self.file_lock:
+            if self.file is None:
+                self.file = open(filepath, 'a')
+            self.file.writelines([self._serialize(intent) for intent in intents])
+            self.file.flush()
+
+    @classmethod
+    def _rewrite(self, intents):
+        """ Replaces the content of the journal file with a list of intents, if it is used """
+        filepath = self.get_location()
+        if filepath is None:
+            return
+        with self.file_lock:
+            self._rewrite_file(filepath, intents)
+
+    @classmethod
+    def _rewrite_file(self, filepath, intents):
+        """ Replaces the content of the journal file with a list of intents. It must be called with the file lock """
+        self._close()
+        if len(intents) == 0:
+            if os.path.exists(filepath):
+                os.remove(filepath)
+            return
+        tmp_filepath = filepath + '.tmp'
+        with open(tmp_filepath, 'w') as file:
+            file.writelines([self._serialize(intent) for intent in intents])
+        os.replace(tmp_filepath, filepath)
+
+    @staticmethod
+    def _serialize(intent):
+        """ Returns the line of the journal file of an intent """
+        (action, alarm_ids, timestamp) = intent
+        return json.dumps({'action': action, 'alarm_ids': alarm_ids, 'timestamp': timestamp.isoformat()}) + '\n'
+
+    @classmethod
+    def _close(self):
+        """ Closes the journal file if it is open. It must be called with the file lock """
+        if self.file is not None:
+            self.file.close()
+            self.file = None
@@ -0,0 +1,73 @@
+"""
+Management utility to benchmark the initialization of the AlarmCollection against the size of the CDB.
+"""
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from alarms.collections import AlarmCollection
+from tickets.models import Ticket, ShelveRegistry
+
+DEFAULT_SIZES = [1000, 10000, 50000]
+""" Default number of IASIOs of the synthetic CDBs """
+
+DEFAULT_RATIO = 0.1
+""" Default ratio of alarms with an open ticket and with an active shelve """
+
+
+class Command(BaseCommand):
+    """ Command used to measure the time taken by the AlarmCollection initialization for synthetic CDBs.
+    All the database records created by the command are rolled back at the end of each run """
+
+    help = 'Measures the AlarmCollection initialization time for synthetic CDBs of different sizes'
+
+    def add_arguments(self, parser):
+        """ Command arguments setup """
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+            help='Number of IASIOs of each synthetic CDB')
+        parser.add_argument(
+            '--ratio', type=float, default=DEFAULT_RATIO,
+            help='Ratio of alarms with open tickets and active shelves')
+
+    def handle(self, *args, **options):
+        """ Run the benchmark for each size and print the results """
+        for size in options['sizes']:
+            elapsed = self._run(size, options['ratio'])
+            self.stdout.write('{:>8d} IASIOs: {:8.3f} s ({:.3f} ms per alarm)'.format(
+                size, elapsed, elapsed * 1000 / size))
+
+    def _run(self, size, ratio):
+        """
+        Initializes the AlarmCollection with a synthetic CDB inside a transaction that is rolled back
+
+        Args:
+            size (int): number of IASIOs of the synthetic CDB
+            ratio (float): ratio of alarms with open tickets and active shelves
+
+        Returns:
+            float: the initialization time in seconds
+        """
+        iasios = [
+            {
+                'id': 'BENCHMARK_ALARM_{}'.format(i),
+                'shortDesc': 'Benchmark alarm {}'.format(i),
+                'iasType': 'ALARM',
+                'docUrl': 'http://www.alma.cl',
+                'canShelve': 'True',
+            }
+            for i in range(size)
+        ]
+        step = max(int(1 / ratio), 1) if ratio > 0 else size + 1
+        with transaction.atomic():
+            Ticket.objects.bulk_create([
+                Ticket(alarm_id=iasio['id']) for iasio in iasios[::step]
+            ])
+            ShelveRegistry.objects.bulk_create([
+                ShelveRegistry(alarm_id=iasio['id'], message='benchmark', user='benchmark')
+                for iasio in iasios[1::step]
+            ])
+            start = time.time()
+            AlarmCollection.reset(iasios)
+            elapsed = time.time() - start
+            transaction.set_rollback(True)
+        return elapsed
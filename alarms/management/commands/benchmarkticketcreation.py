@@ -0,0 +1,123 @@
+"""
+Management utility to benchmark the stall of the event loop while the tickets of an unacknowledgement cascade
+are created.
+"""
+import asyncio
+import time
+from django.core.management.base import BaseCommand
+from alarms.collections import AlarmCollection
+from alarms.journal import TicketJournal
+from alarms.models import Alarm
+from tickets.models import Ticket
+
+DEFAULT_SIZE = 1000
+""" Default number of alarms of the cascade """
+
+MONITOR_INTERVAL = 0.001
+""" Time in seconds between the checks of the event loop monitor """
+
+ALARM_PREFIX = 'BENCHMARK_CASCADE_'
+""" Prefix of the ids of the alarms of the benchmark, used to delete their tickets at the end """
+
+
+class Command(BaseCommand):
+    """ Command used to measure how long the event loop is blocked by the creation of the tickets of a cascade.
+    The tickets created by the command are deleted at the end of each run """
+
+    help = 'Measures the event loop stall while creating the tickets of an unacknowledgement cascade'
+
+    def add_arguments(self, parser):
+        """ Command arguments setup """
+        parser.add_argument(
+            '--size', type=int, default=DEFAULT_SIZE,
+            help='Number of alarms of the cascade')
+
+    def handle(self, *args, **options):
+        """ Run the benchmark creating the tickets on the event loop and in the database executor """
+        size = options['size']
+        loop = asyncio.get_event_loop()
+        alarm_ids = self._create_cascade(size)
+        runs = [
+            ('one insert per ticket on the loop', self._create_tickets_on_the_loop),
+            ('bulk insert in the db executor', AlarmCollection.create_tickets),
+            ('write-behind journal', self._create_tickets_with_the_journal),
+        ]
+        for (name, create_tickets) in runs:
+            try:
+                (elapsed, stall) = loop.run_until_complete(self._run(create_tickets, alarm_ids))
+            finally:
+                Ticket.objects.filter(alarm_id__startswith=ALARM_PREFIX).delete()
+            self.stdout.write('{:>8d} tickets, {:<34}: total {:8.3f} s, max loop stall {:8.3f} s'.format(
+                len(alarm_ids), name, elapsed, stall))
+        AlarmCollection.reset([])
+
+    def _create_cascade(self, size):
+        """
+        Initializes the AlarmCollection with a cleared and acknowledged child alarm with size - 1 parents,
+        and sets the child alarm to trigger an unacknowledgement cascade
+
+        Args:
+            size (int): number of alarms of the cascade
+
+        Returns:
+            list: the ids of the alarms that need a ticket after the cascade
+        """
+        child_id = ALARM_PREFIX + 'CHILD'
+        parent_ids = [ALARM_PREFIX + 'PARENT_{}'.format(i) for i in range(size - 1)]
+        AlarmCollection.reset([])
+        timestamp = int(round(time.time() * 1000))
+        for core_id in [child_id] + parent_ids:
+            alarm = Alarm(
+                value=0, mode=7, validity=1, core_timestamp=timestamp, core_id=core_id,
+                running_id='({}:IASIO)'.format(core_id),
+                dependencies=[child_id] if core_id != child_id else [],
+            )
+            AlarmCollection.add(alarm, ack=True, shelved=False)
+        child = AlarmCollection.get(child_id)
+        set_child = Alarm(
+            value=4, mode=7, validity=1, core_timestamp=timestamp + 1, core_id=child_id,
+            running_id='({}:IASIO)'.format(child_id)
+        )
+        (notify, alarm_ids, tickets_to_clear) = AlarmCollection.update_alarm(child, set_child)
+        return alarm_ids
+
+    async def _create_tickets_on_the_loop(self, alarm_ids):
+        """ Creates the tickets inserting them one by one in the event loop, as a reference """
+        for alarm_id in alarm_ids:
+            Ticket.objects.create(alarm_id=alarm_id)
+
+    async def _create_tickets_with_the_journal(self, alarm_ids):
+        """ Creates the tickets registering an intent for each alarm in the journal and flushing it at the end """
+        for alarm_id in alarm_ids:
+            await TicketJournal.create_tickets([alarm_id])
+        await TicketJournal.flush()
+
+    async def _run(self, create_tickets, alarm_ids):
+        """
+        Creates the tickets of the cascade while a monitor measures the stall of the event loop
+
+        Args:
+            create_tickets (function): coroutine function that creates the tickets of a list of alarm ids
+            alarm_ids (list): the ids of the alarms
+
+        Returns:
+            tuple: the total time and the maximum stall of the event loop in seconds
+        """
+        loop = asyncio.get_event_loop()
+        stalls = [0]
+        done = asyncio.Event()
+
+        async def monitor():
+            while not done.is_set():
+                start = loop.time()
+                await asyncio.sleep(MONITOR_INTERVAL)
+                stalls.append(loop.time() - start - MONITOR_INTERVAL)
+
+        monitor_task = asyncio.ensure_future(monitor())
+        await asyncio.sleep(0)
+        start = time.time()
+        await create_tickets(alarm_ids)
+        elapsed = time.time() - start
+        done.set()
+        await monitor_task
+        return (elapsed, max(stalls))
@@ -0,0 +1,48 @@
+"""
+Management utility to check the consistency of the in-memory index of the open tickets and the active shelves of a
+running webserver with the database.
+"""
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+DEFAULT_HOSTNAME = 'localhost'
+DEFAULT_PORT = '8000'
+
+
+class Command(BaseCommand):
+    """ Command used to request the check of the ticket index to the webserver, because the index lives in the memory
+    of the webserver process. If the webserver runs several workers only the index of the worker that serves the
+    request is checked. It fails if the index is not consistent with the database """
+
+    help = 'Checks the consistency of the in-memory index of tickets and shelves of the webserver with the database'
+
+    def add_arguments(self, parser):
+        """ Command arguments setup """
+        parser.add_argument('--hostname', type=str, default=DEFAULT_HOSTNAME, help='Webserver hostname')
+        parser.add_argument('--port', type=str, default=DEFAULT_PORT, help='Webserver port number')
+        parser.add_argument('--token', type=str, required=True, help='Authentication token of an admin user')
+        parser.add_argument(
+            '--repair', action='store_true',
+            help='Load the index again from the database after the check')
+
+    def handle(self, *args, **options):
+        """ Request the check and print the differences found """
+        url = 'http://{}:{}/ticket-index/'.format(options['hostname'], options['port'])
+        method = requests.post if options['repair'] else requests.get
+        response = method(url, headers={'Authorization': 'Token {}'.format(options['token'])})
+        if response.status_code != 200:
+            raise CommandError('The check failed with status {}: {}'.format(response.status_code, response.text))
+        data = response.json()
+        for name in ['tickets', 'shelves']:
+            for (alarm_id, difference) in sorted(data[name].items()):
+                self.stdout.write('{} of {}: index {}, database {}'.format(
+                    name, alarm_id, difference['index'], difference['database']
+                ))
+        if not data['loaded']:
+            self.stdout.write('The ticket index is not loaded, it is loaded from the database when it is used')
+        elif data['consistent']:
+            self.stdout.write('The ticket index is consistent with the database')
+        elif options['repair']:
+            self.stdout.write('The ticket index was inconsistent with the database and it was loaded again')
+        else:
+            raise CommandError('The ticket index is not consistent with the database')
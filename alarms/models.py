@@ -170,6 +170,16 @@ class AlarmCountManager:
                             # to unack state
                             self.counter_by_view[view] -= 1
 
+    def update_counter_by_view_if_alarm_is_removed(self, alarm):
+        """ Decrease counter for a removed SET UNACK alarm
+            Note: This method is used in the AlarmCollection
+        """
+        if alarm.is_stored():
+            for view in alarm.views:
+                if view in self.counter_by_view and alarm.value > 0 and alarm.ack is not True:
+                    # unacknowledged alarm in set status
+                    self.counter_by_view[view] -= 1
+
 
 class AlarmManager(AlarmCountManager):
     """ Set of auxiliary methods for the alarm model. """
@@ -326,10 +336,7 @@ class Alarm:
                 'value_change_timestamp', 'value_change_transition']
 
         notify = 'updated-equal'
-        if Counter(self.dependencies) == Counter(alarm.dependencies):
-            dependencies_changed = True
-        else:
-            dependencies_changed = False
+        dependencies_changed = Counter(self.dependencies) != Counter(alarm.dependencies)
 
         for field in alarm.__dict__.keys():
             if field in unchanged_fields:
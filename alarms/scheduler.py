@@ -0,0 +1,180 @@
+import asyncio
+import heapq
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+RETRY_DELAY = 1
+""" Time in seconds to wait before retrying the expiration of shelves that could not be unshelved """
+
+
+class ShelveScheduler:
+    """
+    This class defines the scheduler of the expiration of the shelved alarms, running in the event loop.
+
+    The deadlines are kept in a heap ordered by time and a single timer is armed for the earliest one, so each shelve
+    expires at its deadline without polling. The deadlines replaced or cancelled are left in the heap and discarded
+    when they reach the top. Deadlines can be scheduled and cancelled from any thread
+    """
+
+    deadlines = {}
+    """ Dictionary with the current expiration time of each shelved alarm, as a POSIX timestamp, indexed by alarm id """
+
+    heap = []
+    """ Heap of tuples of (deadline, alarm_id), it may contain deadlines that are no longer current """
+
+    lock = threading.RLock()
+    """ Lock used to access the deadlines and the heap from different threads """
+
+    loop = None
+    """ Reference to the event loop where the timer is armed """
+
+    handler = None
+    """ Coroutine function called with the list of alarm ids whose deadlines are reached """
+
+    timer = None
+    """ Reference to the TimerHandle of the earliest deadline """
+
+    expire_task = None
+    """ Reference to the Task that expires the shelves whose deadlines are reached """
+
+    @classmethod
+    def start(self, handler):
+        """
+        Binds the scheduler to the current event loop and arms the timer of the earliest deadline.
+        If it was started in another event loop the timer of that loop is discarded
+
+        Args:
+            handler (function): coroutine function called with the list of alarm ids whose deadlines are reached
+        """
+        loop = asyncio.get_event_loop()
+        self.handler = handler
+        if self.loop is not loop:
+            logger.info('Starting the shelve expiration scheduler')
+            self.loop = loop
+            self.timer = None
+            self.expire_task = None
+            self._arm()
+
+    @classmethod
+    def load(self, deadlines):
+        """
+        Replaces all the deadlines, intended to rebuild the scheduler from the database at startup
+
+        Args:
+            deadlines (dict): dictionary with the expiration time (datetime) of each shelved alarm, indexed by alarm id
+        """
+        with self.lock:
+            self.deadlines = {
+                alarm_id: expires_at.timestamp() for (alarm_id, expires_at) in deadlines.items()
+                if expires_at is not None
+            }
+            self.heap = [(deadline, alarm_id) for (alarm_id, deadline) in self.deadlines.items()]
+            heapq.heapify(self.heap)
+        logger.debug('%d shelve deadlines were loaded', len(self.deadlines))
+        self._request_arm()
+
+    @classmethod
+    def schedule(self, alarm_id, expires_at):
+        """
+        Schedules the expiration of the shelve of an alarm, replacing its previous deadline
+
+        Args:
+            alarm_id (string): ID of the shelved Alarm
+            expires_at (datetime): time when the shelve expires
+        """
+        deadline = expires_at.timestamp()
+        with self.lock:
+            self.deadlines[alarm_id] = deadline
+            heapq.heappush(self.heap, (deadline, alarm_id))
+        logger.debug('The shelve of the alarm %s will expire at %s', alarm_id, expires_at)
+        self._request_arm()
+
+    @classmethod
+    def cancel(self, alarm_ids):
+        """
+        Cancels the expiration of the shelves of a list of alarms, for example because they were unshelved
+
+        Args:
+            alarm_ids (list): List of IDs of the Alarms
+        """
+        with self.lock:
+            for alarm_id in alarm_ids:
+                self.deadlines.pop(alarm_id, None)
+
+    @classmethod
+    def pop_due(self, now):
+        """
+        Removes and returns the alarms whose deadlines are reached
+
+        Args:
+            now (float): the current time as a POSIX timestamp
+
+        Returns:
+            list: the IDs of the Alarms whose deadlines are reached, in order of expiration
+        """
+        due = []
+        with self.lock:
+            while self.heap and self.heap[0][0] <= now:
+                (deadline, alarm_id) = heapq.heappop(self.heap)
+                if self.deadlines.get(alarm_id) == deadline:
+                    del self.deadlines[alarm_id]
+                    due.append(alarm_id)
+        return due
+
+    @classmethod
+    def next_deadline(self):
+        """ Returns the earliest current deadline as a POSIX timestamp, or None if there are no deadlines """
+        with self.lock:
+            while self.heap and self.deadlines.get(self.heap[0][1]) != self.heap[0][0]:
+                heapq.heappop(self.heap)
+            return self.heap[0][0] if self.heap else None
+
+    @classmethod
+    async def expire(self):
+        """
+        Calls the handler with the alarms whose deadlines are reached.
+        If the handler fails the alarms are scheduled again after RETRY_DELAY seconds
+        """
+        due = self.pop_due(time.time())
+        if due:
+            try:
+                await self.handler(due)
+            except Exception:
+                logger.exception('The shelves of %d alarms could not be expired, they will be retried', len(due))
+                with self.lock:
+                    deadline = time.time() + RETRY_DELAY
+                    for alarm_id in due:
+                        self.deadlines.setdefault(alarm_id, deadline)
+                        heapq.heappush(self.heap, (self.deadlines[alarm_id], alarm_id))
+
+    @classmethod
+    def _request_arm(self):
+        """ Arms the timer in the event loop of the scheduler, if it was started, from any thread """
+        if self.loop is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self._arm)
+
+    @classmethod
+    def _arm(self):
+        """ Arms the timer of the earliest deadline, replacing the previous one. Must be called in the event loop """
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if self.expire_task is not None and not self.expire_task.done():
+            # The timer is armed again when the running expiration finishes
+            return
+        deadline = self.next_deadline()
+        if deadline is not None:
+            self.timer = self.loop.call_later(max(deadline - time.time(), 0), self._on_deadline)
+
+    @classmethod
+    def _on_deadline(self):
+        """
+        Starts the expiration of the shelves as a task when the timer of the earliest deadline fires,
+        the timer of the next deadline is armed when the task finishes
+        """
+        self.timer = None
+        self.expire_task = asyncio.ensure_future(self.expire(), loop=self.loop)
+        self.expire_task.add_done_callback(lambda task: self._arm())
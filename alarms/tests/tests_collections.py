@@ -1,10 +1,12 @@
 import datetime
+import threading
 import time
 import pytest
 from freezegun import freeze_time
 from alarms.models import Alarm, Value, IASValue, OperationalMode, Validity
 from alarms.tests.factories import AlarmFactory
 from alarms.collections import AlarmCollection
+from alarms.index import TicketIndex
 from alarms.connectors import CdbConnector, TicketConnector, PanelsConnector
 
 
@@ -551,6 +553,208 @@ class TestAlarmsCollectionHandling:
         assert retrieved_alarms_descriptions == expected_alarm_descriptions
         assert retrieved_alarms_urls == expected_alarm_urls
 
+    @pytest.mark.django_db
+    def test_initialize_swaps_the_collection_when_it_is_built(self, mocker):
+        """ Test that the collection being built is not visible until the initialization is finished """
+        # Arrange:
+        iasio = {"id": "new_alarm", "shortDesc": "", "iasType": "ALARM", "docUrl": ""}
+        AlarmCollection.reset([{"id": "old_alarm", "shortDesc": "", "iasType": "ALARM", "docUrl": ""}])
+        old_collection = AlarmCollection.singleton_collection
+        visible_alarm_ids = []
+        add_initial_iasio = AlarmCollection._add_initial_iasio.__func__
+
+        def spy_add_initial_iasio(cls, *args, **kwargs):
+            add_initial_iasio(cls, *args, **kwargs)
+            visible_alarm_ids.append(list(AlarmCollection.singleton_collection.keys()))
+        mocker.patch.object(AlarmCollection, '_add_initial_iasio', classmethod(spy_add_initial_iasio))
+        # Act:
+        AlarmCollection.reset([iasio])
+        # Assert:
+        assert visible_alarm_ids == [['old_alarm']], \
+            'The previous collection should be visible while the new one is built'
+        assert AlarmCollection.singleton_collection is not old_collection, 'The new collection should be swapped'
+        assert list(AlarmCollection.singleton_collection.keys()) == ['new_alarm'], \
+            'The new collection should be visible when the initialization is finished'
+
+    def test_get_does_not_initialize(self, mocker):
+        """ Test that getting an alarm before the initialization does not initialize the collection """
+        # Arrange:
+        mocker.patch.object(AlarmCollection, 'singleton_collection', None)
+        mocker.patch.object(AlarmCollection, 'init_state', 'pending')
+        mocker.spy(AlarmCollection, 'initialize')
+        # Act:
+        alarm = AlarmCollection.get('alarm')
+        # Assert:
+        assert alarm is None, 'No alarm should be returned before the initialization'
+        assert AlarmCollection.initialize.call_count == 0, 'The collection should not be initialized'
+
+    @pytest.mark.django_db
+    def test_initialize_with_bulk_ticket_and_shelve_states(self, mocker):
+        """ Test the AlarmCollection initialization retrieves the ack and shelve states in bulk """
+        # Arrange:
+        mock_iasios = [
+            {"id": "unack_alarm", "shortDesc": "", "iasType": "ALARM", "docUrl": ""},
+            {"id": "shelved_alarm", "shortDesc": "", "iasType": "ALARM", "docUrl": ""},
+            {"id": "other_alarm", "shortDesc": "", "iasType": "ALARM", "docUrl": ""},
+        ]
+        mocker.patch.object(TicketConnector, 'get_unack_alarm_ids', return_value={'unack_alarm'})
+        mocker.patch.object(TicketConnector, 'get_shelved_alarm_ids', return_value={'shelved_alarm'})
+        mocker.spy(TicketConnector, 'check_acknowledgement')
+        mocker.spy(TicketConnector, 'check_shelve')
+        # Act:
+        AlarmCollection.reset(mock_iasios)
+        # Assert:
+        assert TicketConnector.get_unack_alarm_ids.call_count == 1
+        assert TicketConnector.get_shelved_alarm_ids.call_count == 1
+        assert TicketConnector.check_acknowledgement.call_count == 0, \
+            'The ack state should not be queried for each alarm'
+        assert TicketConnector.check_shelve.call_count == 0, \
+            'The shelve state should not be queried for each alarm'
+        assert AlarmCollection.get('unack_alarm').ack is False
+        assert AlarmCollection.get('shelved_alarm').ack is True
+        assert AlarmCollection.get('shelved_alarm').shelved is True
+        assert AlarmCollection.get('other_alarm').ack is True
+        assert AlarmCollection.get('other_alarm').shelved is False
+
+    @pytest.mark.django_db
+    def test_initialize_with_templated_alarms(self, mocker):
+        """ Test the AlarmCollection initialization only creates the instances of templated alarms when they are
+        referenced, while they are still listed in the broadcasts and in the dictionary of alarms """
+        # Arrange:
+        mock_iasios = [
+            {"id": "alarm", "shortDesc": "", "iasType": "ALARM", "docUrl": ""},
+            {
+                "id": "templated", "shortDesc": "Templated alarm", "iasType": "ALARM", "docUrl": "",
+                "templateId": "template", "templateRange": [1, 5]
+            },
+        ]
+        mocker.patch.object(TicketConnector, 'get_unack_alarm_ids', return_value={'templated instance 2'})
+        mocker.patch.object(TicketConnector, 'get_shelved_alarm_ids', return_value=set())
+        expected_ids = ['alarm'] + ['templated instance {}'.format(i) for i in range(1, 6)]
+        # Act:
+        AlarmCollection.reset(mock_iasios)
+        initial_ids = sorted(AlarmCollection.singleton_collection.keys())
+        instance = AlarmCollection.get('templated instance 3')
+        missing_instance = AlarmCollection.get('templated instance 6')
+        broadcast_alarms = sorted(
+            list(AlarmCollection.singleton_collection.values()), key=lambda a: a.core_id
+        )
+        broadcast_dicts = sorted(
+            [a.to_dict() for a in broadcast_alarms] + AlarmCollection._get_template_instances_as_dicts(),
+            key=lambda a: a['core_id']
+        )
+        all_alarms = AlarmCollection.get_all_as_dict()
+        stored_ids = sorted(AlarmCollection.singleton_collection.keys())
+        # Assert:
+        assert initial_ids == ['alarm', 'templated instance 2'], \
+            'Only the instances with tickets should be created on initialization'
+        assert AlarmCollection.get('templated instance 2').ack is False
+        assert instance.core_id == 'templated instance 3'
+        assert instance.description == 'Templated alarm'
+        assert instance.ack is True
+        assert instance.shelved is False
+        assert missing_instance is None, 'Instances out of the range of the template should not be created'
+        assert [a['core_id'] for a in broadcast_dicts] == expected_ids, \
+            'All the instances should be broadcasted'
+        assert [a['running_id'] for a in broadcast_dicts][1:] == \
+            ['(templated instance {}:IASIO)'.format(i) for i in range(1, 6)]
+        assert sorted(all_alarms.keys()) == expected_ids, 'All the instances should be in the dictionary'
+        assert stored_ids == ['alarm', 'templated instance 2', 'templated instance 3'], \
+            'Only the referenced instances should be stored'
+        assert [alarm.to_dict() for alarm in sorted(all_alarms.values(), key=lambda a: a.core_id)] == \
+            broadcast_dicts, 'The created instances should be equal to the broadcasted ones'
+
+    @pytest.mark.django_db
+    def test_reload(self, mocker):
+        """ Test the AlarmCollection reload only applies the differences with the previous CDB,
+        preserving the state of the alarms and the counters by view """
+        # Arrange:
+        mocker.patch.object(
+            PanelsConnector, 'get_alarms_views_dict_of_alarm_configs', return_value={'alarm_1': ['view']}
+        )
+        mocker.patch.object(PanelsConnector, 'get_alarm_ids_of_alarm_configs', return_value=['alarm_1'])
+        old_iasios = [
+            {"id": "alarm_1", "shortDesc": "Alarm 1", "iasType": "ALARM", "docUrl": ""},
+            {"id": "alarm_2", "shortDesc": "Alarm 2", "iasType": "ALARM", "docUrl": ""},
+            {"id": "alarm_3", "shortDesc": "Alarm 3", "iasType": "ALARM", "docUrl": ""},
+            {"id": "templated", "shortDesc": "Templated", "iasType": "ALARM", "templateRange": [1, 3]},
+        ]
+        new_iasios = [
+            {"id": "alarm_1", "shortDesc": "New alarm 1", "iasType": "ALARM", "docUrl": "http://www.alma.cl"},
+            old_iasios[1],
+            {"id": "alarm_4", "shortDesc": "Alarm 4", "iasType": "ALARM", "docUrl": ""},
+            {"id": "templated", "shortDesc": "New templated", "iasType": "ALARM", "templateRange": [1, 2]},
+        ]
+        Alarm.objects.reset_counter_by_view()
+        AlarmCollection.reset(old_iasios)
+        timestamp = datetime.datetime.now() + datetime.timedelta(seconds=1)
+        formatted_current_time = timestamp.strftime('%Y-%m-%dT%H:%M:%S.%f')
+        AlarmCollection.add_or_update_alarm({
+            "value": "SET_HIGH",
+            "productionTStamp": formatted_current_time,
+            "sentToBsdbTStamp": formatted_current_time,
+            "mode": "OPERATIONAL",
+            "iasValidity": "RELIABLE",
+            "fullRunningId": "(Converter-ID:CONVERTER)@(alarm_1:IASIO)",
+            "valueType": "ALARM"
+        })
+        alarm_1 = AlarmCollection.get('alarm_1')
+        AlarmCollection.get('templated instance 2')
+        AlarmCollection.get('templated instance 3')
+        AlarmCollection.alarm_changes = []
+        # Act:
+        changes = AlarmCollection.reload(new_iasios)
+        # Assert:
+        assert changes == {'added': ['alarm_4'], 'updated': ['alarm_1', 'templated'], 'removed': ['alarm_3']}
+        assert AlarmCollection.get('alarm_1') is alarm_1, 'The modified alarms should be updated in place'
+        assert alarm_1.description == 'New alarm 1'
+        assert alarm_1.url == 'http://www.alma.cl'
+        assert alarm_1.value == Value.SET_HIGH.value, 'The value of the alarms should be preserved'
+        assert alarm_1.ack is False, 'The ack state of the alarms should be preserved'
+        assert Alarm.objects.counter_by_view == {'view': 1}, 'The counters by view should be preserved'
+        assert AlarmCollection.get('alarm_3') is None, 'The removed alarms should be retired'
+        assert AlarmCollection.get('alarm_4').description == 'Alarm 4', 'The new alarms should be added'
+        assert AlarmCollection.get('templated instance 2').description == 'New templated'
+        assert AlarmCollection.get('templated instance 1').description == 'New templated'
+        assert AlarmCollection.get('templated instance 3') is None, \
+            'The instances out of the new range should be retired'
+        assert sorted(set(AlarmCollection.alarm_changes)) == ['alarm_1', 'alarm_4', 'templated instance 2'], \
+            'Only the added and updated alarms should be notified'
+
+    @pytest.mark.django_db
+    def test_reload_retires_the_dependencies_of_other_alarms(self):
+        """ Test the AlarmCollection reload removes the retired alarms from the dependencies of the other alarms,
+        so their parents can still be acknowledged """
+        # Arrange:
+        iasios = [
+            {"id": "PARENT-ALARM", "shortDesc": "Parent", "iasType": "ALARM", "docUrl": ""},
+            {"id": "CHILD-ALARM", "shortDesc": "Child", "iasType": "ALARM", "docUrl": ""},
+        ]
+        AlarmCollection.reset(iasios)
+        timestamp = datetime.datetime.now() + datetime.timedelta(seconds=1)
+        formatted_current_time = timestamp.strftime('%Y-%m-%dT%H:%M:%S.%f')
+        for (core_id, dependencies) in [('CHILD-ALARM', []), ('PARENT-ALARM', ['CHILD-ALARM'])]:
+            AlarmCollection.add_or_update_alarm({
+                "value": "SET_HIGH",
+                "productionTStamp": formatted_current_time,
+                "sentToBsdbTStamp": formatted_current_time,
+                "mode": "OPERATIONAL",
+                "iasValidity": "RELIABLE",
+                "fullRunningId": "(Converter-ID:CONVERTER)@({}:IASIO)".format(core_id),
+                "valueType": "ALARM",
+                "depsFullRunningIds": ["(Converter-ID:CONVERTER)@({}:IASIO)".format(d) for d in dependencies]
+            })
+        parent = AlarmCollection.get('PARENT-ALARM')
+        assert parent.dependencies == ['CHILD-ALARM']
+        # Act:
+        AlarmCollection.reload(iasios[:1])
+        (acknowledged_alarms, acknowledged_ids) = AlarmCollection._recursive_acknowledge('PARENT-ALARM')
+        # Assert:
+        assert parent.dependencies == [], 'The retired alarm should be removed from the dependencies'
+        assert 'CHILD-ALARM' not in AlarmCollection.parents_collection, \
+            'The retired alarm should be removed from the parents collection'
+        assert acknowledged_ids == ['PARENT-ALARM'], 'The parent of the retired alarm should be acknowledged'
+
 
 class TestAlarmsCollectionAcknowledge:
     """ This class defines the test suite for the Alarms Collection acknowledge and ticket handling """
@@ -975,6 +1179,54 @@ class TestAlarmsCollectionAcknowledge:
         assert TicketConnector.create_tickets.call_count == 1, \
             'The ticket was no actually created'
 
+    @pytest.mark.asyncio
+    @pytest.mark.django_db
+    async def test_create_tickets_off_the_event_loop(self, mocker):
+        """ Test that AlarmCollection.create_tickets creates the tickets in the database executor """
+        # Arrange:
+        threads = []
+        mocker.patch.object(
+            TicketConnector, 'create_tickets', side_effect=lambda ids: threads.append(threading.current_thread())
+        )
+        # Act:
+        await AlarmCollection.create_tickets(['MOCK-ALARM'])
+        # Assert:
+        assert len(threads) == 1, 'The tickets should be created'
+        assert threads[0] is not threading.current_thread(), \
+            'The tickets should not be created in the thread of the event loop'
+
+    @pytest.mark.asyncio
+    @pytest.mark.django_db(transaction=True)
+    async def test_ticket_index_loaded_off_the_event_loop(self, mocker):
+        """ Test that the ticket index is loaded in the database executor when the iasios are received """
+        # Arrange:
+        AlarmCollection.reset([])
+        TicketIndex.invalidate()
+        threads = []
+        mocker.patch.object(TicketIndex, 'load', side_effect=lambda: threads.append(threading.current_thread()))
+        # Act:
+        await AlarmCollection.receive_iasios([])
+        # Assert:
+        assert len(threads) == 1, 'The ticket index should be loaded'
+        assert threads[0] is not threading.current_thread(), \
+            'The ticket index should not be loaded in the thread of the event loop'
+
+    @pytest.mark.asyncio
+    @pytest.mark.django_db(transaction=True)
+    async def test_clear_tickets_off_the_event_loop(self, mocker):
+        """ Test that AlarmCollection.clear_tickets clears the tickets in the database executor """
+        # Arrange:
+        threads = []
+        mocker.patch.object(
+            TicketConnector, 'clear_tickets', side_effect=lambda ids: threads.append(threading.current_thread())
+        )
+        # Act:
+        await AlarmCollection.clear_tickets(['MOCK-ALARM'])
+        # Assert:
+        assert len(threads) == 1, 'The tickets should be cleared'
+        assert threads[0] is not threading.current_thread(), \
+            'The tickets should not be cleared in the thread of the event loop'
+
 
 class TestAlarmsCollectionShelve:
     """ This class defines the test suite for the Alarms Collection shelve and registry handling """
@@ -3,6 +3,7 @@ from freezegun import freeze_time
 from django.test import TestCase
 from django.utils import timezone
 from alarms.connectors import CdbConnector, TicketConnector, PanelsConnector
+from alarms.index import TicketIndex
 from tickets.models import Ticket, TicketStatus, ShelveRegistry
 
 
@@ -123,6 +124,19 @@ class TestTicketConnector(TestCase):
                     'When the ticket is created the message must be none'
                 )
 
+    def test_create_tickets_in_bulk(self):
+        """ Test that the create_tickets function creates all the tickets with a single insert """
+        # Arrange:
+        alarm_ids = ['AlarmID{}'.format(i) for i in range(100)]
+        # Act:
+        with self.assertNumQueries(3):  # savepoint, insert and release of the savepoint
+            TicketConnector.create_tickets(alarm_ids)
+        # Assert:
+        self.assertEqual(
+            sorted(Ticket.objects.values_list('alarm_id', flat=True)), sorted(alarm_ids),
+            'A ticket should be created for each alarm'
+        )
+
     def test_clear_tickets(self):
         """ Test that the clear_tickets function can clear a ticket """
         # Arrange:
@@ -161,6 +175,34 @@ class TestTicketConnector(TestCase):
                     'When the ticket is clared but not acknowledged the message must be None'
                 )
 
+    def test_clear_tickets_with_set_based_updates(self):
+        """ Test that the clear_tickets function clears the tickets with a single update,
+        keeping the acknowledged tickets and the tickets of other alarms untouched """
+        # Arrange:
+        alarm_ids = ['AlarmID{}'.format(i) for i in range(100)]
+        Ticket.objects.bulk_create([Ticket(alarm_id=alarm_id) for alarm_id in alarm_ids + ['OtherAlarmID']])
+        ack_ticket = Ticket.objects.create(alarm_id='AlarmID0')
+        ack_ticket.acknowledge(message='ack message', user='testuser')
+        TicketIndex.load()
+        # Act:
+        with self.assertNumQueries(3):  # savepoint, update and release of the savepoint
+            TicketConnector.clear_tickets(alarm_ids)
+        # Assert:
+        self.assertEqual(
+            Ticket.objects.filter(
+                alarm_id__in=alarm_ids, status=int(TicketStatus.get_choices_by_name()['CLEARED_UNACK'])
+            ).count(), len(alarm_ids),
+            'The open tickets of the alarms should be cleared'
+        )
+        self.assertEqual(
+            Ticket.objects.get(alarm_id='OtherAlarmID').status, int(TicketStatus.get_choices_by_name()['UNACK']),
+            'The tickets of other alarms should not be cleared'
+        )
+        self.assertEqual(
+            Ticket.objects.get(pk=ack_ticket.pk).status, int(TicketStatus.get_choices_by_name()['ACK']),
+            'The acknowledged tickets should not be changed'
+        )
+
     def test_check_acknowledgement(self):
         """ Test if the check_acknowledgement return true or false depending
         if the alarm has open tickets (UNACK or CLEARED_UNACK) or not
@@ -229,6 +271,41 @@ class TestTicketConnector(TestCase):
             'The check_shelve should return False if the alarm has notrelated ShelveRegistries'
         )
 
+    def test_get_unack_alarm_ids(self):
+        """ Test if the get_unack_alarm_ids returns the ids of the alarms
+        with open tickets (UNACK or CLEARED_UNACK)
+        """
+        # Arrange:
+        Ticket.objects.create(alarm_id='unack_alarm')
+        Ticket.objects.create(alarm_id='unack_alarm')
+        ticket_ack = Ticket.objects.create(alarm_id='ack_alarm')
+        ticket_ack.acknowledge('test', 'testuser')
+        ticket_cleared = Ticket.objects.create(alarm_id='unack_cleared_alarm')
+        ticket_cleared.clear()
+        # Act:
+        result = TicketConnector.get_unack_alarm_ids()
+        # Assert:
+        self.assertEqual(
+            result, {'unack_alarm', 'unack_cleared_alarm'},
+            'The get_unack_alarm_ids should return the ids of the alarms with tickets UNACK or CLEARED_UNACK'
+        )
+
+    def test_get_shelved_alarm_ids(self):
+        """ Test if the get_shelved_alarm_ids returns the ids of the alarms
+        with opened shelve registries
+        """
+        # Arrange:
+        ShelveRegistry.objects.create(alarm_id='shelved_alarm', message='test')
+        shelve_registry = ShelveRegistry.objects.create(alarm_id='unshelved_alarm', message='test')
+        shelve_registry.unshelve()
+        # Act:
+        result = TicketConnector.get_shelved_alarm_ids()
+        # Assert:
+        self.assertEqual(
+            result, {'shelved_alarm'},
+            'The get_shelved_alarm_ids should return the ids of the alarms with ShelveRegistries SHELVED'
+        )
+
 
 class TestPanelsConnector(TestCase):
     """This class defines the test suite for the Tickets Connector"""
@@ -1,9 +1,12 @@
 import datetime
+import time
 import pytest
 from channels.testing import WebsocketCommunicator
 from alarms.collections import AlarmCollection
+from alarms.journal import TicketJournal
 from ias_webserver.routing import application as ias_app
 from ias_webserver.settings import PROCESS_CONNECTION_PASS
+from tickets.models import Ticket
 
 
 class TestCoreConsumer:
@@ -28,7 +31,7 @@ class TestCoreConsumer:
         self.ws_url = '/core/?password={}'.format(PROCESS_CONNECTION_PASS)
 
     @pytest.mark.asyncio
-    @pytest.mark.django_db
+    @pytest.mark.django_db(transaction=True)  # the tickets are created by the database executor thread
     async def test_receive_json(self):
         """ Test if the core consumer receives the list of iasios and passes it to the AlarmCollection """
         AlarmCollection.reset(self.iasios)
@@ -87,5 +90,51 @@ class TestCoreConsumer:
         assert old_alarms_count + 3 == new_alarms_count, 'The Iasios shoul have been added to the AlarmCollection'
         for core_id in core_ids:
             assert core_id in all_alarms_list, 'The alarm {} is not in the collection'.format(core_id)
+        await TicketJournal.flush()
+        assert sorted(Ticket.objects.filter(alarm_id__in=core_ids).values_list('alarm_id', flat=True)) == core_ids, \
+            'The tickets of the set alarms should be written by the journal'
+        # Close:
+        await communicator.disconnect()
+
+    @pytest.mark.asyncio
+    @pytest.mark.django_db(transaction=True)  # the tickets are created by the database executor thread
+    async def test_receive_json_while_initializing(self, mocker):
+        """ Test if the core consumer accepts the connection while the AlarmCollection is being initialized,
+        and parks the received iasios until the initialization is finished """
+        # Arrange:
+        def slow_initialize(iasios=None):
+            time.sleep(0.5)
+            AlarmCollection.singleton_collection = {}
+            AlarmCollection.parents_collection = {}
+            AlarmCollection.values_collection = {}
+            AlarmCollection.alarms_views_dict = {}
+        mocker.patch.object(AlarmCollection, '_initialize', side_effect=slow_initialize)
+        AlarmCollection.init_state = 'pending'
+        AlarmCollection.init_future = None
+        # Connect:
+        communicator = WebsocketCommunicator(ias_app, self.ws_url)
+        connected, subprotocol = await communicator.connect()
+        assert connected, 'The communicator should be connected while the collection is initialized'
+        assert AlarmCollection.init_state != 'done', 'The collection should still be initializing'
+        # Act:
+        formatted_current_time = datetime.datetime.now().strftime('%Y-%m-%dT%H:%M:%S.%f')
+        msg = [{
+            "value": "SET_MEDIUM",
+            "productionTStamp": formatted_current_time,
+            "sentToBsdbTStamp": formatted_current_time,
+            "mode": "OPERATIONAL",   # 5: OPERATIONAL
+            "iasValidity": "RELIABLE",
+            "fullRunningId": "(Converter-ID:CONVERTER)@(AlarmType-ID1:IASIO)",
+            "valueType": "ALARM"
+        }]
+        await communicator.send_json_to(msg)
+        response = await communicator.receive_from(timeout=5)
+        # Assert:
+        assert response == 'Received 1 IASIOS', 'The alarms were not received'
+        assert AlarmCollection.init_state == 'done', 'The collection should be initialized'
+        assert AlarmCollection.get('AlarmType-ID1') is not None, \
+            'The iasio received during the initialization should be added to the AlarmCollection'
+        assert AlarmCollection._initialize.call_count == 1, 'The collection should be initialized only once'
+        await TicketJournal.flush()
         # Close:
         await communicator.disconnect()
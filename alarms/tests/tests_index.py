@@ -0,0 +1,196 @@
+import datetime
+import mock
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+from freezegun import freeze_time
+from rest_framework import status
+from rest_framework.test import APIClient
+from alarms.connectors import TicketConnector
+from alarms.index import TicketIndex
+from tickets.models import Ticket, TicketStatus, ShelveRegistry
+
+
+class TicketIndexTestCase(TransactionTestCase):
+    """This class defines the test suite for the in-memory index of the tickets and the shelve registries.
+    It uses transactions because the index is updated when the transactions are committed"""
+
+    def setUp(self):
+        """TestCase setup, executed before each test of the TestCase"""
+        Ticket.objects.create(alarm_id='alarm_1')
+        self.registry = ShelveRegistry.objects.create(alarm_id='alarm_2', message='Shelved', user='testuser')
+        TicketIndex.load()
+
+    def test_index_is_kept_in_sync_without_queries(self):
+        """ Test that the index is updated by the write paths and the checks do not query the database """
+        # Act:
+        TicketConnector.create_tickets(['alarm_2', 'alarm_3'])
+        TicketConnector.clear_tickets(['alarm_1', 'alarm_2'])
+        Ticket.objects.acknowledge(['alarm_2'], 'Acknowledged', 'testuser')
+        ShelveRegistry.objects.create(
+            alarm_id='alarm_3', message='Shelved', user='testuser', timeout=datetime.timedelta(0)
+        )
+        self.registry.unshelve()
+        with self.assertNumQueries(0):
+            acknowledged = [TicketConnector.check_acknowledgement(alarm_id) for alarm_id in ['alarm_1', 'alarm_2']]
+            shelved = [TicketConnector.check_shelve(alarm_id) for alarm_id in ['alarm_2', 'alarm_3']]
+        with freeze_time(timezone.now() + datetime.timedelta(seconds=1)):
+            ShelveRegistry.objects.unshelve_expired()
+        # Assert:
+        self.assertEqual(acknowledged, [False, True], 'The acknowledgement should be checked in the index')
+        self.assertEqual(shelved, [False, True], 'The shelve should be checked in the index')
+        self.assertEqual(
+            TicketIndex.tickets,
+            {
+                'alarm_1': {int(TicketStatus.get_choices_by_name()['CLEARED_UNACK']): 1},
+                'alarm_3': {int(TicketStatus.get_choices_by_name()['UNACK']): 1},
+            },
+            'The index should count the tickets pending acknowledgement by status'
+        )
+        self.assertEqual(TicketIndex.shelves, {}, 'The unshelved registries should be removed from the index')
+        self.assertEqual(
+            TicketIndex.verify(), {'loaded': True, 'tickets': {}, 'shelves': {}},
+            'The index should be consistent with the database'
+        )
+
+    def test_index_is_invalidated_when_a_write_fails(self):
+        """ Test that the index is discarded and loaded again when a write of the tickets fails """
+        # Act:
+        with mock.patch.object(Ticket.objects, 'bulk_create', side_effect=Exception('write failed')):
+            with self.assertRaises(Exception):
+                TicketConnector.create_tickets(['alarm_3'])
+        invalidated = not TicketIndex.loaded
+        unack_alarm_ids = TicketConnector.get_unack_alarm_ids()
+        # Assert:
+        self.assertTrue(invalidated, 'The index should be invalidated')
+        self.assertEqual(unack_alarm_ids, {'alarm_1'}, 'The index should be loaded again from the database')
+
+    def test_index_is_invalidated_when_an_acknowledgement_fails(self):
+        """ Test that the index is discarded when the acknowledgement of the tickets fails """
+        # Act:
+        with mock.patch('tickets.models.tickets_acknowledged.send', side_effect=Exception('write failed')):
+            with self.assertRaises(Exception):
+                Ticket.objects.acknowledge(['alarm_1'], 'Acknowledged', 'testuser')
+        # Assert:
+        self.assertFalse(TicketIndex.loaded, 'The index should be invalidated')
+        self.assertFalse(TicketConnector.check_acknowledgement('alarm_1'), 'The acknowledgement should be rolled back')
+
+    def test_index_is_not_updated_by_rolled_back_writes(self):
+        """ Test that the changes of a transaction are applied to the index only when it is committed """
+        # Act:
+        with self.assertRaises(Exception):
+            with transaction.atomic():
+                TicketConnector.create_tickets(['alarm_3'])
+                raise Exception('rollback')
+        # Assert:
+        self.assertTrue(TicketIndex.loaded, 'The index should be kept')
+        self.assertTrue(
+            TicketConnector.check_acknowledgement('alarm_3'), 'The rolled back ticket should not be indexed'
+        )
+
+    def test_changes_queued_before_a_load_invalidate_the_index(self):
+        """ Test that a change committed before a load but applied after it is not applied twice """
+        # Act:
+        with transaction.atomic():
+            TicketConnector.create_tickets(['alarm_3'])
+            # The load reads the ticket as if it was committed before the change is applied
+            with mock.patch.object(TicketIndex, '_read_from_db', return_value=({'alarm_3': {0: 1}}, {})):
+                TicketIndex.load()
+        invalidated = not TicketIndex.loaded
+        unack_alarm_ids = TicketConnector.get_unack_alarm_ids()
+        # Assert:
+        self.assertTrue(invalidated, 'The index should be invalidated by the change queued before the load')
+        self.assertEqual(
+            TicketIndex.tickets, {
+                'alarm_1': {int(TicketStatus.get_choices_by_name()['UNACK']): 1},
+                'alarm_3': {int(TicketStatus.get_choices_by_name()['UNACK']): 1},
+            },
+            'The tickets should be counted once'
+        )
+        self.assertEqual(unack_alarm_ids, {'alarm_1', 'alarm_3'}, 'The index should be loaded again')
+
+    def test_verify_does_not_load_the_index(self):
+        """ Test that the check compares the index in memory, even if it is too old, and reports if it is not loaded """
+        # Arrange:
+        Ticket.objects.bulk_create([Ticket(alarm_id='alarm_3')])
+        # Act:
+        with mock.patch('alarms.index.TICKET_INDEX_MAX_AGE', -1):
+            differences = TicketIndex.verify()
+        TicketIndex.invalidate()
+        not_loaded_differences = TicketIndex.verify()
+        # Assert:
+        self.assertEqual(
+            differences['tickets'],
+            {'alarm_3': {'index': None, 'database': {int(TicketStatus.get_choices_by_name()['UNACK']): 1}}},
+            'The differences of the index in memory should be reported'
+        )
+        self.assertEqual(
+            not_loaded_differences, {'loaded': False, 'tickets': {}, 'shelves': {}},
+            'The index should be reported as not loaded'
+        )
+        self.assertFalse(TicketIndex.loaded, 'The index should not be loaded by the check')
+
+    def test_writes_of_other_processes(self):
+        """ Test that the tickets written by other processes are cleared, and indexed when the index is too old """
+        # Arrange:
+        # The bulk insertion does not send signals, as the tickets written by other processes
+        Ticket.objects.bulk_create([Ticket(alarm_id='alarm_3')])
+        acknowledged = TicketConnector.check_acknowledgement('alarm_3')
+        # Act:
+        with mock.patch('alarms.index.TICKET_INDEX_MAX_AGE', -1):
+            refreshed_acknowledged = TicketConnector.check_acknowledgement('alarm_3')
+        TicketConnector.clear_tickets(['alarm_3'])
+        # Assert:
+        self.assertTrue(acknowledged, 'The index should not include the tickets written by other processes')
+        self.assertFalse(refreshed_acknowledged, 'The index should be loaded again when it is too old')
+        self.assertEqual(
+            Ticket.objects.get(alarm_id='alarm_3').status, int(TicketStatus.get_choices_by_name()['CLEARED_UNACK']),
+            'The ticket should be cleared in the database'
+        )
+
+
+class TicketIndexApiTestCase(TestCase):
+    """This class defines the test suite for the endpoint that checks the consistency of the ticket index"""
+
+    def setUp(self):
+        """TestCase setup, executed before each test of the TestCase"""
+        self.client = APIClient()
+        self.url = reverse('ticket-index')
+        Ticket.objects.create(alarm_id='alarm_1')
+        TicketIndex.load()
+        # A change that bypasses the write paths of the tickets
+        Ticket.objects.filter(alarm_id='alarm_1').update(status=int(TicketStatus.get_choices_by_name()['ACK']))
+
+    def test_check_and_repair_as_admin(self):
+        """ The endpoint should respond with the differences and load the index again with POST requests """
+        # Arrange:
+        admin = User.objects.create_superuser('admin', 'admin@alma.cl', '123')
+        self.client.force_authenticate(user=admin)
+        # Act:
+        check_response = self.client.get(self.url, format='json')
+        repair_response = self.client.post(self.url, format='json')
+        repaired_response = self.client.get(self.url, format='json')
+        # Assert:
+        self.assertEqual(check_response.status_code, status.HTTP_200_OK, 'The server should retrieve a 200 status')
+        self.assertFalse(check_response.data['consistent'], 'The index should not be consistent')
+        self.assertEqual(
+            check_response.data['tickets'],
+            {'alarm_1': {'index': {int(TicketStatus.get_choices_by_name()['UNACK']): 1}, 'database': None}},
+            'The server should respond with the differences of the tickets'
+        )
+        self.assertFalse(repair_response.data['consistent'], 'The differences found should be reported')
+        self.assertTrue(repaired_response.data['consistent'], 'The index should be loaded again')
+
+    def test_check_as_non_admin(self):
+        """ The endpoint should respond with a 403 status for users that are not admin """
+        # Arrange:
+        user = User.objects.create_user('user', 'user@alma.cl', '123')
+        self.client.force_authenticate(user=user)
+        # Act:
+        response = self.client.get(self.url, format='json')
+        # Assert:
+        self.assertEqual(
+            response.status_code, status.HTTP_403_FORBIDDEN, 'The server should retrieve a 403 status'
+        )
@@ -0,0 +1,130 @@
+import datetime
+import pytest
+from django.utils import timezone
+from alarms.connectors import TicketConnector
+from alarms.journal import TicketJournal, CREATE, CLEAR
+from tickets.models import Ticket, TicketStatus
+
+
+class TestTicketJournal:
+    """ This class defines the test suite for the write-behind journal of the tickets """
+
+    def setup_method(self):
+        """ TestCase setup, executed before each test of the TestCase """
+        TicketJournal.pending = []
+        TicketJournal.pending_count = 0
+        TicketJournal.flushing = []
+        TicketJournal.loop = None
+
+    def test_coalesce(self):
+        """ Test that the intents are coalesced in the clearings of the stored tickets and the tickets to create """
+        # Arrange:
+        t1 = timezone.now()
+        t2 = t1 + datetime.timedelta(seconds=1)
+        t3 = t1 + datetime.timedelta(seconds=2)
+        intents = [
+            (CLEAR, ['A', 'B'], t1),
+            (CREATE, ['A', 'C'], t2),
+            (CLEAR, ['A', 'B'], t3),
+        ]
+        # Act:
+        (cleared_alarm_ids, tickets) = TicketJournal.coalesce(intents)
+        # Assert:
+        assert cleared_alarm_ids == {t1: ['A', 'B']}, \
+            'The stored tickets of each alarm should be cleared once, at the time of the first clearing'
+        assert tickets == [
+            {'alarm_id': 'A', 'created_at': t2, 'cleared_at': t3},
+            {'alarm_id': 'C', 'created_at': t2, 'cleared_at': None},
+        ], 'A ticket created and cleared in the same window should be created already cleared'
+
+    @pytest.mark.asyncio
+    @pytest.mark.django_db(transaction=True)  # the tickets are written by the database executor thread
+    async def test_flush(self):
+        """ Test that the pending intents are written to the database in a single batch when they are flushed """
+        # Arrange:
+        stored_ticket = Ticket.objects.create(alarm_id='A')
+        await TicketJournal.create_tickets(['B', 'C'])
+        await TicketJournal.clear_tickets(['A', 'B'])
+        assert Ticket.objects.count() == 1, 'The tickets should not be written before the flush'
+        # Act:
+        written = await TicketJournal.flush()
+        # Assert:
+        cleared_unack = int(TicketStatus.get_choices_by_name()['CLEARED_UNACK'])
+        assert written == 2, 'The two intents should be written'
+        assert TicketJournal.pending == [], 'There should not be pending intents'
+        assert Ticket.objects.get(pk=stored_ticket.pk).status == cleared_unack, \
+            'The stored ticket should be cleared'
+        assert Ticket.objects.get(alarm_id='B').status == cleared_unack, \
+            'The ticket created and cleared should be created already cleared'
+        assert Ticket.objects.get(alarm_id='C').status == int(TicketStatus.get_choices_by_name()['UNACK']), \
+            'The ticket only created should be open'
+
+    @pytest.mark.asyncio
+    @pytest.mark.django_db(transaction=True)  # the connections are checked by the database executor thread
+    async def test_flush_failure_keeps_the_intents(self, mocker):
+        """ Test that the intents are kept to be retried when they cannot be written """
+        # Arrange:
+        mocker.patch.object(TicketConnector, 'write_tickets', side_effect=Exception('Database error'))
+        await TicketJournal.create_tickets(['A'])
+        # Act:
+        written = await TicketJournal.flush()
+        # Assert:
+        assert written == 0, 'No intents should be written'
+        assert [intent[:2] for intent in TicketJournal.pending] == [(CREATE, ['A'])], \
+            'The intents should be kept'
+        assert TicketJournal.pending_count == 1, 'The number of pending alarm ids should be restored'
+
+    @pytest.mark.asyncio
+    @pytest.mark.django_db(transaction=True)  # the connections are checked by the database executor thread
+    async def test_back_pressure(self, mocker):
+        """ Test that appending an intent waits until the pending intents are written when too many are pending """
+        # Arrange:
+        mocker.patch('alarms.journal.TICKET_JOURNAL_MAX_PENDING', 3)
+        mocker.patch.object(TicketConnector, 'write_tickets')
+        await TicketJournal.create_tickets(['A', 'B'])
+        assert TicketConnector.write_tickets.call_count == 0, 'The intents should be pending'
+        # Act:
+        await TicketJournal.create_tickets(['C'])
+        # Assert:
+        assert TicketConnector.write_tickets.call_count == 1, \
+            'The intents should be written before the append returns'
+        assert TicketJournal.pending_count == 0, 'There should not be pending alarm ids'
+
+    @pytest.mark.django_db
+    def test_recover(self, mocker, tmpdir):
+        """ Test that the intents left in the journal file are written to the database and removed from the file """
+        # Arrange:
+        filepath = str(tmpdir.join('journal.ndjson'))
+        mocker.patch.object(TicketJournal, 'get_location', return_value=filepath)
+        timestamp = timezone.now()
+        TicketJournal._write([(CREATE, ['A'], timestamp), (CLEAR, ['A'], timestamp)])
+        TicketJournal._close()
+        with open(filepath, 'a') as file:
+            file.write('{"action": "create", "alarm')  # partial line written before a crash
+        # Act:
+        recovered = TicketJournal.recover()
+        # Assert:
+        assert recovered == 2, 'The complete intents of the file should be recovered'
+        ticket = Ticket.objects.get(alarm_id='A')
+        assert ticket.created_at == timestamp and ticket.cleared_at == timestamp, \
+            'The ticket should be written with the times of the intents'
+        assert not tmpdir.join('journal.ndjson').exists(), 'The journal file should be removed'
+
+    @pytest.mark.asyncio
+    @pytest.mark.django_db(transaction=True)  # the tickets are written by the database executor thread
+    async def test_recover_skips_the_pending_intents(self, mocker, tmpdir):
+        """ Test that the intents of the journal file that are pending in this execution are not recovered """
+        # Arrange:
+        filepath = str(tmpdir.join('journal.ndjson'))
+        mocker.patch.object(TicketJournal, 'get_location', return_value=filepath)
+        TicketJournal._write([(CREATE, ['A'], timezone.now())])
+        await TicketJournal.create_tickets(['B'])
+        # Act:
+        recovered = TicketJournal.recover()
+        TicketJournal.recover()
+        await TicketJournal.flush()
+        # Assert:
+        assert recovered == 1, 'Only the intents of the previous execution should be recovered'
+        assert sorted(Ticket.objects.values_list('alarm_id', flat=True)) == ['A', 'B'], \
+            'The tickets should be written once'
+        assert not tmpdir.join('journal.ndjson').exists(), 'The journal file should be removed'
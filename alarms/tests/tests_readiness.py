@@ -0,0 +1,48 @@
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from alarms.collections import AlarmCollection
+
+
+class TestReadiness(TestCase):
+    """This class defines the test suite for the readiness endpoint"""
+
+    def setUp(self):
+        """TestCase setup, executed before each test of the TestCase"""
+        self.client = APIClient()
+        self.url = reverse('readiness')
+
+    def tearDown(self):
+        """TestCase teardown, executed after each test of the TestCase"""
+        AlarmCollection.reset([])
+
+    def test_readiness_when_collection_is_initialized(self):
+        """ The endpoint should respond with a 200 status when the collection is initialized """
+        # Arrange:
+        AlarmCollection.reset([])
+        # Act:
+        response = self.client.get(self.url, format='json')
+        # Assert:
+        self.assertEqual(response.status_code, status.HTTP_200_OK, 'The server should retrieve a 200 status')
+        self.assertEqual(
+            response.data, {'state': 'done', 'progress': 100},
+            'The server should report the initialization as done'
+        )
+
+    def test_readiness_when_collection_is_initializing(self):
+        """ The endpoint should respond with a 503 status while the collection is being initialized """
+        # Arrange:
+        AlarmCollection.init_state = 'in_progress'
+        AlarmCollection.init_progress = 40
+        # Act:
+        response = self.client.get(self.url, format='json')
+        # Assert:
+        self.assertEqual(
+            response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE,
+            'The server should retrieve a 503 status'
+        )
+        self.assertEqual(
+            response.data, {'state': 'in_progress', 'progress': 40},
+            'The server should report the initialization progress'
+        )
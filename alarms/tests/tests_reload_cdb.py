@@ -0,0 +1,54 @@
+import mock
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from alarms.collections import AlarmCollection
+from alarms.connectors import CdbConnector
+
+
+class TestReloadCdb(TestCase):
+    """This class defines the test suite for the CDB reload endpoint"""
+
+    def setUp(self):
+        """TestCase setup, executed before each test of the TestCase"""
+        self.client = APIClient()
+        self.url = reverse('reload-cdb')
+        self.iasio = {"id": "alarm", "shortDesc": "Alarm", "iasType": "ALARM", "docUrl": ""}
+        AlarmCollection.reset([self.iasio])
+
+    def tearDown(self):
+        """TestCase teardown, executed after each test of the TestCase"""
+        AlarmCollection.reset([])
+
+    def test_reload_cdb_as_admin(self):
+        """ The endpoint should reload the CDB and respond with the changes for admin users """
+        # Arrange:
+        admin = User.objects.create_superuser('admin', 'admin@alma.cl', '123')
+        self.client.force_authenticate(user=admin)
+        alarm = AlarmCollection.get('alarm')
+        new_iasios = [dict(self.iasio, shortDesc='New alarm')]
+        # Act:
+        with mock.patch.object(CdbConnector, 'get_iasios', return_value=new_iasios):
+            response = self.client.post(self.url, format='json')
+        # Assert:
+        self.assertEqual(response.status_code, status.HTTP_200_OK, 'The server should retrieve a 200 status')
+        self.assertEqual(
+            response.data, {'added': [], 'updated': ['alarm'], 'removed': []},
+            'The server should respond with the changes'
+        )
+        self.assertIs(AlarmCollection.get('alarm'), alarm, 'The collection should not be reset')
+        self.assertEqual(alarm.description, 'New alarm', 'The alarm should be updated')
+
+    def test_reload_cdb_as_non_admin(self):
+        """ The endpoint should respond with a 403 status for users that are not admin """
+        # Arrange:
+        user = User.objects.create_user('user', 'user@alma.cl', '123')
+        self.client.force_authenticate(user=user)
+        # Act:
+        response = self.client.post(self.url, format='json')
+        # Assert:
+        self.assertEqual(
+            response.status_code, status.HTTP_403_FORBIDDEN, 'The server should retrieve a 403 status'
+        )
@@ -0,0 +1,97 @@
+import asyncio
+import datetime
+import time
+import pytest
+from django.utils import timezone
+from alarms.collections import AlarmCollection
+from alarms.scheduler import ShelveScheduler
+from tickets.models import ShelveRegistry, ShelveRegistryStatus
+
+
+class TestShelveScheduler:
+    """ This class defines the test suite for the scheduler of the shelve expirations """
+
+    def setup_method(self):
+        """ TestCase setup, executed before each test of the TestCase """
+        ShelveScheduler.loop = None
+        ShelveScheduler.load({})
+
+    def test_pop_due_in_order(self):
+        """ Test that only the current deadlines that are reached are returned, in order of expiration """
+        # Arrange:
+        now = timezone.now()
+        ShelveScheduler.load({
+            'A': now - datetime.timedelta(seconds=1),
+            'B': now - datetime.timedelta(seconds=2),
+            'C': now + datetime.timedelta(hours=1),
+        })
+        ShelveScheduler.cancel(['A'])
+        ShelveScheduler.schedule('B', now - datetime.timedelta(seconds=3))
+        # Act:
+        due = ShelveScheduler.pop_due(now.timestamp())
+        # Assert:
+        assert due == ['B'], 'Only the current reached deadline should be returned, once'
+        assert ShelveScheduler.next_deadline() == (now + datetime.timedelta(hours=1)).timestamp(), \
+            'The deadline not reached should remain scheduled'
+
+    @pytest.mark.asyncio
+    async def test_expire_at_the_deadline(self):
+        """ Test that the handler is called at the deadline without waiting for a periodic check """
+        # Arrange:
+        calls = []
+
+        async def handler(alarm_ids):
+            calls.append((alarm_ids, time.time()))
+
+        deadline = timezone.now() + datetime.timedelta(milliseconds=100)
+        ShelveScheduler.start(handler)
+        ShelveScheduler.schedule('A', deadline)
+        ShelveScheduler.schedule('B', deadline + datetime.timedelta(hours=1))
+        # Act:
+        await asyncio.sleep(0.3)
+        # Assert:
+        assert [alarm_ids for (alarm_ids, called_at) in calls] == [['A']], \
+            'The handler should be called once with the alarm whose deadline was reached'
+        assert calls[0][1] >= deadline.timestamp(), 'The handler should not be called before the deadline'
+        assert ShelveScheduler.timer is not None, 'The timer of the next deadline should be armed'
+        ShelveScheduler.timer.cancel()
+
+    @pytest.mark.asyncio
+    async def test_retry_if_the_handler_fails(self):
+        """ Test that the alarms are scheduled again if the handler fails """
+        # Arrange:
+        async def handler(alarm_ids):
+            raise Exception('Database not available')
+
+        ShelveScheduler.handler = handler
+        ShelveScheduler.schedule('A', timezone.now())
+        # Act:
+        await ShelveScheduler.expire()
+        # Assert:
+        assert ShelveScheduler.deadlines.keys() == {'A'}, 'The alarm should be scheduled again'
+        assert ShelveScheduler.next_deadline() > time.time(), 'The alarm should be retried later'
+
+    @pytest.mark.asyncio
+    @pytest.mark.django_db(transaction=True)  # the registries are unshelved by the database executor thread
+    async def test_unshelve_at_the_deadline(self):
+        """ Test that the AlarmCollection rebuilds the deadlines from the database and unshelves the expired alarms """
+        # Arrange:
+        shelved_at = timezone.now() - datetime.timedelta(minutes=1)
+        for (core_id, timeout) in [('A', datetime.timedelta(minutes=1)), ('B', datetime.timedelta(hours=1))]:
+            ShelveRegistry.objects.create(
+                alarm_id=core_id, message='Shelved', user='testuser', shelved_at=shelved_at, timeout=timeout
+            )
+        AlarmCollection.reset([
+            {"id": core_id, "shortDesc": "", "iasType": "ALARM", "docUrl": "", "canShelve": True}
+            for core_id in ['A', 'B']
+        ])
+        assert AlarmCollection.get('A').shelved, 'The alarm should be shelved after the initialization'
+        # Act:
+        await AlarmCollection.start_initialization()
+        await asyncio.sleep(0.1)
+        # Assert:
+        assert not AlarmCollection.get('A').shelved, 'The alarm whose shelve expired should be unshelved'
+        assert AlarmCollection.get('B').shelved, 'The alarm whose shelve did not expire should remain shelved'
+        assert ShelveRegistry.objects.get(alarm_id='A').status == \
+            int(ShelveRegistryStatus.get_choices_by_name()['UNSHELVED']), 'The expired registry should be unshelved'
+        ShelveScheduler.timer.cancel()
@@ -1,6 +1,53 @@
+from asgiref.sync import async_to_sync
 from django.shortcuts import render
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import AllowAny, IsAdminUser
+from rest_framework.response import Response
+from alarms.collections import AlarmCollection
+from alarms.index import TicketIndex
 
 
 def test_core(request):
     """ Basic view used mostly for debuging purposes """
     return render(request, "test.html")
+
+
+@api_view(['GET'])
+@permission_classes((AllowAny,))
+def readiness(request, format=None):
+    """
+    Reports the status of the initialization of the AlarmCollection.
+    Responds with status 200 if the collection is ready, and 503 if not
+    """
+    data = AlarmCollection.get_init_status()
+    if data['state'] == 'done':
+        return Response(data, status=status.HTTP_200_OK)
+    return Response(data, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+
+@api_view(['POST'])
+@permission_classes((IsAdminUser,))
+def reload_cdb(request, format=None):
+    """
+    Reloads the alarms of the CDB without resetting the AlarmCollection.
+    Responds with the ids of the 'added', 'updated' and 'removed' IASIOs
+    """
+    changes = async_to_sync(AlarmCollection.reload_cdb)()
+    return Response(changes, status=status.HTTP_200_OK)
+
+
+@api_view(['GET', 'POST'])
+@permission_classes((IsAdminUser,))
+def ticket_index(request, format=None):
+    """
+    Checks the consistency of the in-memory index of the open tickets and the active shelves with the database.
+    Responds with the differences of the 'tickets' and the 'shelves', if they are 'consistent', and if the index
+    is 'loaded', since an index that is not loaded is not checked.
+    With POST requests the index is also loaded again from the database after the check
+    """
+    differences = TicketIndex.verify()
+    if request.method == 'POST':
+        TicketIndex.load()
+    data = dict(differences, consistent=not (differences['tickets'] or differences['shelves']))
+    return Response(data, status=status.HTTP_200_OK)
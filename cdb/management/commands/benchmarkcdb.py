@@ -0,0 +1,161 @@
+"""
+Management utility to benchmark the CDB reader against synthetic CDBs of different sizes.
+"""
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import tempfile
+import time
+from django.core.management.base import BaseCommand
+from cdb.readers import CdbReader, CdbFileCache
+from ias_webserver.settings import (
+    IAS_FILE,
+    IASIOS_FILE,
+    SUPERVISORS_FOLDER,
+    DASUS_FOLDER,
+    TEMPLATES_FILE,
+)
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+""" Default number of IASIOs of the synthetic CDBs """
+
+DASUS_PER_SUPERVISOR = 100
+""" Number of DASUs deployed by each Supervisor of the synthetic CDBs """
+
+TEMPLATED_RATIO = 10
+""" One of every TEMPLATED_RATIO alarm IASIOs of the synthetic CDBs is templated """
+
+
+def create_synthetic_cdb(location, size):
+    """
+    Writes a synthetic CDB in a folder. Half of the IASIOs are alarms, each of them is the output of a DASU,
+    and one of every TEMPLATED_RATIO alarms is templated with 10 instances
+
+    Args:
+        location (string): the path of the folder, ending with a separator
+        size (int): the number of IASIOs of the CDB
+    """
+    for folder in [os.path.dirname(IASIOS_FILE), os.path.dirname(TEMPLATES_FILE), SUPERVISORS_FOLDER, DASUS_FOLDER]:
+        os.makedirs(location + folder, exist_ok=True)
+    with open(location + IAS_FILE, 'w') as file:
+        json.dump({'logLevel': 'INFO', 'refreshRate': '3', 'validityThreshold': '10', 'hbFrequency': '5'}, file)
+    with open(location + TEMPLATES_FILE, 'w') as file:
+        json.dump([{'id': 'template-{}'.format(i), 'min': '1', 'max': '10'} for i in range(10)], file)
+
+    iasios = []
+    dasu_ids = []
+    for i in range(size):
+        iasio = {
+            'id': 'IASIO_{}'.format(i),
+            'shortDesc': 'Synthetic IASIO {}'.format(i),
+            'iasType': 'ALARM' if i % 2 == 0 else 'DOUBLE',
+            'docUrl': 'http://www.alma.cl',
+        }
+        if iasio['iasType'] == 'ALARM':
+            if (i // 2) % TEMPLATED_RATIO == 0:
+                iasio['templateId'] = 'template-{}'.format(i % 10)
+            dasu_id = 'DASU_{}'.format(i)
+            with open('{}{}{}.json'.format(location, DASUS_FOLDER, dasu_id), 'w') as file:
+                json.dump({'id': dasu_id, 'outputId': iasio['id'], 'asceIDs': []}, file)
+            dasu_ids.append(dasu_id)
+        iasios.append(iasio)
+    with open(location + IASIOS_FILE, 'w') as file:
+        json.dump(iasios, file)
+
+    for i in range(0, len(dasu_ids), DASUS_PER_SUPERVISOR):
+        supervisor = {
+            'id': 'SUPERVISOR_{}'.format(i),
+            'dasusToDeploy': [{'dasuId': dasu_id} for dasu_id in dasu_ids[i:i + DASUS_PER_SUPERVISOR]],
+        }
+        with open('{}{}SUPERVISOR_{}.json'.format(location, SUPERVISORS_FOLDER, i), 'w') as file:
+            json.dump(supervisor, file)
+
+
+class Command(BaseCommand):
+    """ Command used to measure the time taken by the CdbReader to read and resolve the alarms of synthetic CDBs """
+
+    help = 'Measures the time to read and resolve the alarm IASIOs of synthetic CDBs of different sizes'
+
+    def add_arguments(self, parser):
+        """ Command arguments setup """
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+            help='Number of IASIOs of each synthetic CDB')
+
+    def handle(self, *args, **options):
+        """ Run the benchmark for each size and print the results """
+        for size in options['sizes']:
+            tmp_dir = tempfile.mkdtemp()
+            try:
+                location = os.path.join(tmp_dir, 'CDB') + os.sep
+                create_synthetic_cdb(location, size)
+                results = self._run_in_process(location)
+            finally:
+                shutil.rmtree(tmp_dir)
+            self.stdout.write(
+                '{:>8d} IASIOs: {:>8d} alarms, cold read {:8.3f} s, repeated read {:8.3f} s, '
+                'compiled read {:8.3f} s, peak RSS {:8.1f} MB (+{:.1f} MB)'.format(
+                    size, results['alarms'], results['cold'], results['repeated'], results['compiled'],
+                    results['peak_rss'], results['peak_rss'] - results['initial_rss']))
+
+    def _run_in_process(self, location):
+        """
+        Runs the benchmark of a CDB in a new process, so that its peak RSS is not affected by the previous runs
+
+        Args:
+            location (string): the path of the CDB folder
+
+        Returns:
+            dict: the results of the benchmark, see _run
+        """
+        queue = multiprocessing.Queue()
+        process = multiprocessing.Process(target=lambda: queue.put(self._run(location)))
+        process.start()
+        results = queue.get()
+        process.join()
+        return results
+
+    def _run(self, location):
+        """
+        Reads the alarm IASIOs of a CDB twice, the first time with an empty cache,
+        and then reads them from the compiled CDB
+
+        Args:
+            location (string): the path of the CDB folder
+
+        Returns:
+            dict: the number of alarms, the 'cold', 'repeated' and 'compiled' read times in seconds,
+            and the 'initial_rss' and 'peak_rss' of the process in MB, measured before compiling the CDB
+        """
+        initial_rss = _get_peak_rss()
+
+        class SyntheticCdbReader(CdbReader):
+            cache = CdbFileCache()
+
+            @classmethod
+            def get_cdb_location(self):
+                return location
+
+        start = time.time()
+        iasios = SyntheticCdbReader.read_alarm_iasios()
+        cold = time.time() - start
+        start = time.time()
+        SyntheticCdbReader.read_alarm_iasios()
+        repeated = time.time() - start
+        peak_rss = _get_peak_rss()
+        compiled_path = os.path.join(location, 'compiled.msgpack')
+        SyntheticCdbReader.compile_alarm_iasios(compiled_path)
+        start = time.time()
+        SyntheticCdbReader.load_compiled_alarm_iasios(compiled_path)
+        compiled = time.time() - start
+        return {
+            'alarms': len(iasios), 'cold': cold, 'repeated': repeated, 'compiled': compiled,
+            'initial_rss': initial_rss, 'peak_rss': peak_rss,
+        }
+
+
+def _get_peak_rss():
+    """ Returns the peak resident set size of the current process in MB """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
@@ -0,0 +1,31 @@
+"""
+Management utility to compile the alarms of the CDB into a binary file used for fast cold starts.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from cdb.readers import CdbReader
+from ias_webserver.settings import CDB_COMPILED_FILE
+
+
+class Command(BaseCommand):
+    """ Command used to compile the resolved alarm IASIOs of the CDB into the compiled CDB file """
+
+    help = 'Compiles the alarm IASIOs of the CDB into a binary file read on startup instead of the json files'
+
+    def add_arguments(self, parser):
+        """ Command arguments setup """
+        parser.add_argument(
+            '--output', default=CDB_COMPILED_FILE,
+            help='Path of the compiled CDB file')
+
+    def handle(self, *args, **options):
+        """ Compile the CDB and print a summary """
+        filepath = options['output']
+        if not filepath:
+            raise CommandError('The path of the compiled CDB file is not defined')
+        cdb_hash = CdbReader.get_cdb_hash()
+        try:
+            iasios = CdbReader.compile_alarm_iasios(filepath, cdb_hash)
+        except IOError as e:
+            raise CommandError('{} could not be written: {}'.format(filepath, e))
+        self.stdout.write('{} alarm IASIOs compiled to {} (CDB hash {})'.format(
+            len(iasios or []), filepath, cdb_hash))
@@ -1,6 +1,10 @@
+import hashlib
 import json
 import os
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import msgpack
 from ias_webserver.settings import (
     CDB_LOCATION,
     TEST_CDB_LOCATION,
@@ -9,15 +13,284 @@ from ias_webserver.settings import (
     SUPERVISORS_FOLDER,
     DASUS_FOLDER,
     TEMPLATES_FILE,
+    CDB_COMPILED_FILE,
+    CDB_READER_THREADS,
     BROADCAST_RATE,
     BROADCAST_THRESHOLD
 )
 
 logger = logging.getLogger(__name__)
 
+STREAM_CHUNK_SIZE = 64 * 1024
+""" Number of characters read at a time when streaming a json file """
+
+ALARM_IASIO_FIELDS = ('id', 'shortDesc', 'iasType', 'docUrl', 'sound', 'canShelve', 'templateId')
+""" Fields of the IASIOs kept for the alarms, the other fields are discarded while parsing """
+
+COMPILED_FORMAT_VERSION = 2
+""" Version of the format of the compiled CDB file, compiled files of other versions are ignored """
+
+
+class CdbFileCache:
+    """
+    Cache of the parsed content of the CDB files.
+    Each file is parsed only once, and it is parsed again only if its modification time or size change.
+    It can be used from different threads, the files are parsed outside of the lock
+    """
+
+    def __init__(self):
+        self.entries = {}
+        """ Dictionary of tuples (signature, data) indexed by file path and parse function """
+
+        self.version = 0
+        """ Counter increased every time an entry is added, updated or removed """
+
+        self.lock = threading.Lock()
+        """ Lock used to access the entries and the version from different threads """
+
+    def get(self, filepath, parse, *args):
+        """
+        Returns the parsed content of a file, parsing it again only if it changed since the last read,
+        or if the additional arguments of the parse function changed
+
+        Args:
+            filepath (string): the path of the file
+            parse (function): function that receives the path of the file and returns its parsed content
+            *args: additional arguments passed to the parse function
+
+        Returns:
+            The parsed content of the file
+
+        Raises:
+            IOError: if the file cannot be read
+        """
+        signature = self._get_signature(filepath) + args
+        with self.lock:
+            entry = self.entries.get((filepath, parse))
+        if entry is not None and entry[0] == signature:
+            return entry[1]
+        data = parse(filepath, *args)
+        self._store((filepath, parse), signature, data)
+        return data
+
+    def get_folder(self, dir, parse):
+        """
+        Returns the parsed content of all the json files of a folder.
+        Only the files that changed since the last read are parsed again, concurrently in a bounded pool of threads.
+        The files that cannot be read or parsed are skipped,
+        and the entries of the files that were removed are discarded
+
+        Args:
+            dir (string): the path of the folder, ending with a separator
+            parse (function): function that receives the path of a file and returns its parsed content
+
+        Returns:
+            dict: the parsed content of each file, indexed by file path
+
+        Raises:
+            IOError: if the folder cannot be read
+        """
+        filepaths = [dir + f for f in os.listdir(dir) if f.endswith('.json')]
+        data = {}
+        signatures = {}
+        with self.lock:
+            entries = dict(self.entries)
+        for filepath in filepaths:
+            try:
+                signature = self._get_signature(filepath)
+            except IOError:
+                logger.warning('%s could not be read. File skipped', filepath)
+                continue
+            entry = entries.get((filepath, parse))
+            if entry is not None and entry[0] == signature:
+                data[filepath] = entry[1]
+            else:
+                signatures[filepath] = signature
+
+        pending = list(signatures.keys())
+        chunk_size = max(1, -(-len(pending) // (CDB_READER_THREADS * 4)))
+        chunks = [pending[i:i + chunk_size] for i in range(0, len(pending), chunk_size)]
+        results = []
+        if len(chunks) > 1:
+            with ThreadPoolExecutor(max_workers=CDB_READER_THREADS) as executor:
+                for chunk_results in executor.map(lambda chunk: _parse_files(chunk, parse), chunks):
+                    results += chunk_results
+        elif chunks:
+            results = _parse_files(chunks[0], parse)
+        for (filepath, file_data, error) in results:
+            if error is not None:
+                logger.warning('%s could not be parsed. File skipped: %s', filepath, error)
+                continue
+            data[filepath] = file_data
+            self._store((filepath, parse), signatures[filepath], file_data)
+
+        with self.lock:
+            removed = [
+                (f, p) for (f, p) in list(self.entries) if p is parse and f.startswith(dir) and f not in data
+            ]
+            for key in removed:
+                del self.entries[key]
+                self.version += 1
+        return data
+
+    def _get_signature(self, filepath):
+        """ Returns a tuple with the modification time and the size of a file """
+        stat = os.stat(filepath)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _store(self, key, signature, data):
+        """ Stores the parsed content of a file with its signature, indexed by file path and parse function """
+        with self.lock:
+            self.entries[key] = (signature, data)
+            self.version += 1
+        logger.debug('%s parsed and cached', key[0])
+
+    def clear(self):
+        """ Discards all the cached entries """
+        with self.lock:
+            self.entries = {}
+            self.version += 1
+
+
+def _parse_files(filepaths, parse):
+    """
+    Parses a list of files, capturing the errors of each file
+
+    Args:
+        filepaths (list): the paths of the files
+        parse (function): function that receives the path of a file and returns its parsed content
+
+    Returns:
+        list: A list of tuples (filepath, data, error), where error is None if the file was parsed
+    """
+    results = []
+    for filepath in filepaths:
+        try:
+            results.append((filepath, parse(filepath), None))
+        except (IOError, ValueError, KeyError, TypeError) as e:
+            results.append((filepath, None, e))
+    return results
+
+
+def _parse_json(filepath):
+    """ Returns the content of a json file """
+    with open(filepath) as file:
+        return json.load(file)
+
+
+def _parse_iasios(filepath):
+    """ Returns the IASIOs of the IASIOs file as a dictionary indexed by id """
+    return {iasio['id']: iasio for iasio in _parse_json(filepath)}
+
+
+def _iter_json_array(file, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Yields the elements of a json array from a file, reading and decoding it incrementally,
+    so that only one element is kept in memory at a time
+
+    Args:
+        file (file): the file, opened in text mode
+        chunk_size (int): the number of characters read from the file each time
+
+    Raises:
+        ValueError: if the content of the file is not a valid json array
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    index = 0
+    eof = False
+    opened = False
+    while True:
+        # Skip the whitespaces and separators between elements, reading more data if needed
+        while True:
+            while index < len(buffer) and buffer[index] in ' \t\r\n,':
+                index += 1
+            if index < len(buffer) or eof:
+                break
+            buffer = file.read(chunk_size)
+            index = 0
+            eof = not buffer
+        if index >= len(buffer):
+            raise ValueError('Unexpected end of the json array')
+        if not opened:
+            if buffer[index] != '[':
+                raise ValueError('Expecting a json array')
+            opened = True
+            index += 1
+            continue
+        if buffer[index] == ']':
+            return
+        # Decode the next element, reading more data while it is incomplete
+        while True:
+            try:
+                element, end = decoder.raw_decode(buffer, index)
+                if end < len(buffer) or eof:
+                    break
+            except ValueError:
+                if eof:
+                    raise
+            data = file.read(chunk_size)
+            eof = not data
+            buffer = buffer[index:] + data
+            index = 0
+        yield element
+        index = end
+
+
+def _parse_alarm_iasios(filepath, outputs):
+    """
+    Returns the alarm IASIOs of the IASIOs file that are outputs of the DASUs, as a dictionary indexed by id.
+    The file is streamed and only the fields used by the webserver are kept
+
+    Args:
+        filepath (string): the path of the IASIOs file
+        outputs (frozenset): the ids of the outputs of the DASUs
+
+    Returns:
+        dict: A dictionary of trimmed IASIOs data indexed by id
+    """
+    iasios = {}
+    with open(filepath) as file:
+        for iasio in _iter_json_array(file):
+            if iasio['id'] not in outputs or iasio['iasType'] != 'ALARM':
+                continue
+            iasios[iasio['id']] = {field: iasio[field] for field in ALARM_IASIO_FIELDS if field in iasio}
+    return iasios
+
+
+def _parse_templates(filepath):
+    """ Returns the templates of the templates file as a dictionary indexed by id """
+    return {template['id']: template for template in _parse_json(filepath)}
+
+
+def _parse_supervisor(filepath):
+    """ Returns the list of the ids of the DASUs deployed by a Supervisor file """
+    supervisor = _parse_json(filepath)
+    if "dasusToDeploy" not in supervisor:
+        return []
+    return [dasu["dasuId"] for dasu in supervisor["dasusToDeploy"]]
+
+
+def _parse_dasu(filepath):
+    """ Returns a tuple with the id and the output id of a DASU file, or None if they are not defined """
+    dasu = _parse_json(filepath)
+    if "outputId" not in dasu or "id" not in dasu:
+        return None
+    return (dasu["id"], dasu["outputId"])
+
 
 class CdbReader:
-    """ Defines a reader for the CDB """
+    """ Defines a reader for the CDB.
+    The content of the files is cached and only read again when the files change """
+
+    cache = CdbFileCache()
+    """ Cache of the parsed CDB files """
+
+    alarm_iasios = (None, None, None)
+    """
+    Tuple with the last list of alarm IASIOs read, with the templated IASIOs as ranges and expanded,
+    and the version of the cache used to read them
+    """
 
     @classmethod
     def get_cdb_location(self):
@@ -27,6 +300,14 @@ class CdbReader:
         else:
             return CDB_LOCATION
 
+    @classmethod
+    def get_compiled_location(self):
+        """ Returns the path of the compiled CDB file, or None if the compiled CDB is not used """
+        testing = os.environ.get('TESTING', False)
+        if testing or not CDB_COMPILED_FILE:
+            return None
+        return CDB_COMPILED_FILE
+
     @classmethod
     def read_ias(self):
         """
@@ -37,8 +318,7 @@ class CdbReader:
         """
         filepath = self.get_cdb_location() + IAS_FILE
         try:
-            with open(filepath) as file:
-                ias_data = json.load(file)
+            ias_data = dict(self.cache.get(filepath, _parse_json))
         except IOError:
             logger.warning('%s not found. IAS config not read', filepath)
             ias_data = []
@@ -47,84 +327,139 @@ class CdbReader:
         return ias_data
 
     @classmethod
-    def read_alarm_iasios(self):
+    def read_alarm_iasios(self, expand=True):
         """
-        Reads the IASIOs form the CDB that will become alarms
+        Reads the IASIOs form the CDB that will become alarms.
+        The templated IASIOs are expanded in one IASIO for each instance of their templates, unless expand is False.
+        In that case each templated IASIO is returned only once, with the range of instances of its template
+        as a list [min, max] in its 'templateRange' field.
+        The returned IASIOs are shared with the cache of the reader, they must not be modified
+
+        Args:
+            expand (boolean): True to expand the instances of the templated IASIOs, False to return them as ranges
 
         Returns:
             dict: A list of IASIOs data
         """
-        iasios = self.read_iasios_file()
-        templates = self.read_templates()
-        valid_iasios = []
         dasus_to_deploy = self.read_supervisors_dasus()
         dasu_outputs = self.read_dasus_outputs(dasus_to_deploy)
-        if not dasu_outputs or dasu_outputs == []:
+        if not dasu_outputs:
             return None
-        for iasio in iasios:
-            if iasio["id"] not in dasu_outputs or iasio["iasType"] != "ALARM":
-                continue
-            if "templateId" not in iasio:
-                valid_iasios.append(iasio)
-            else:
+        iasios = self.read_alarm_iasios_index(dasu_outputs)
+        templates = self.read_templates_index()
+        (compact_iasios, expanded_iasios, cached_version) = self.alarm_iasios
+        if cached_version != self.cache.version:
+            compact_iasios = []
+            for iasio in iasios.values():
+                if "templateId" not in iasio:
+                    compact_iasios.append(iasio)
+                    continue
                 template_range = CdbReader.find_template_range(
                     iasio['templateId'], templates
                 )
-                for i in template_range:
-                    aux_iasio = iasio.copy()
-                    aux_iasio['id'] = aux_iasio['id'] + ' instance ' + str(i)
-                    valid_iasios.append(aux_iasio)
+                if template_range is None:
+                    logger.warning('template %s of IASIO %s not found', iasio['templateId'], iasio['id'])
+                    continue
+                templated_iasio = iasio.copy()
+                templated_iasio['templateRange'] = [template_range.start, template_range.stop - 1]
+                compact_iasios.append(templated_iasio)
+            expanded_iasios = None
+        if expand and expanded_iasios is None:
+            expanded_iasios = self.expand_template_instances(compact_iasios)
+        self.alarm_iasios = (compact_iasios, expanded_iasios, self.cache.version)
+        return expanded_iasios if expand else compact_iasios
 
-        return valid_iasios
+    @classmethod
+    def expand_template_instances(self, iasios):
+        """
+        Expands the templated IASIOs of a list in one IASIO for each instance of their templates
+
+        Args:
+            iasios (list): list of IASIOs, where the templated IASIOs have a 'templateRange' field
+
+        Returns:
+            list: A list of IASIOs data, where the instances are identified as '<id> instance <number>'
+        """
+        expanded_iasios = []
+        for iasio in iasios:
+            if 'templateRange' not in iasio:
+                expanded_iasios.append(iasio)
+                continue
+            (minimum, maximum) = iasio['templateRange']
+            for i in range(minimum, maximum + 1):
+                aux_iasio = {key: value for key, value in iasio.items() if key != 'templateRange'}
+                aux_iasio['id'] = aux_iasio['id'] + ' instance ' + str(i)
+                expanded_iasios.append(aux_iasio)
+        return expanded_iasios
 
     @classmethod
-    def read_iasios_file(self):
+    def read_iasios(self):
         """
         Reads the ioasios.json file with all the IASIOs
 
         Returns:
-            dict: A list of IASIOs data
+            dict: A dictionary of IASIOs data indexed by id
         """
         filepath = self.get_cdb_location() + IASIOS_FILE
         try:
-            with open(filepath) as file:
-                iasios = json.load(file)
+            return self.cache.get(filepath, _parse_iasios)
         except IOError:
             logger.warning('%s not found. IASIOS not initialized', filepath)
-            return []
-        return iasios
+            return {}
+
+    @classmethod
+    def read_alarm_iasios_index(self, dasu_outputs):
+        """
+        Reads the alarm IASIOs of the ioasios.json file that are outputs of the given DASUs.
+        The file is streamed, so that the IASIOs that are not alarms are never kept in memory,
+        and only the fields used by the webserver are kept for the alarms
+
+        Args:
+            dasu_outputs (set): the ids of the outputs of the DASUs
+
+        Returns:
+            dict: A dictionary of IASIOs data indexed by id
+        """
+        filepath = self.get_cdb_location() + IASIOS_FILE
+        try:
+            return self.cache.get(filepath, _parse_alarm_iasios, frozenset(dasu_outputs))
+        except IOError:
+            logger.warning('%s not found. IASIOS not initialized', filepath)
+            return {}
+
+    @classmethod
+    def read_iasios_file(self):
+        """
+        Reads the ioasios.json file with all the IASIOs
+
+        Returns:
+            dict: A list of IASIOs data
+        """
+        return list(self.read_iasios().values())
 
     @classmethod
     def read_dasus_outputs(self, dasus_to_read=[]):
         """
-        Reads the DASU json files and returns a list with all their outputs
+        Reads the DASU json files and returns a set with all their outputs
 
         Returns:
-            dict: A list of IASIOs ids
+            set: A set of IASIOs ids
         """
         dir = self.get_cdb_location() + DASUS_FOLDER
         try:
-            filepaths = [
-                dir + f for f in os.listdir(dir) if f.endswith('.json')
-            ]
+            dasus = self.cache.get_folder(dir, _parse_dasu)
         except IOError:
             logger.warning('%s folder not found. DASUs not read', dir)
-            return []
-        iasios = []
-        for filepath in filepaths:
-            try:
-                with open(filepath) as file:
-                    dasu = json.load(file)
-            except IOError:
-                logger.warning('%s not found. DASUs not read', filepath)
-                return []
-
-            if "outputId" not in dasu or "id" not in dasu:
+            return set()
+        dasus_to_read = set(dasus_to_read)
+        iasios = set()
+        for dasu in dasus.values():
+            if dasu is None:
                 continue
-            if dasus_to_read != [] and dasu["id"] not in dasus_to_read:
+            (dasu_id, output) = dasu
+            if dasus_to_read and dasu_id not in dasus_to_read:
                 continue
-            output = dasu["outputId"]
-            iasios.append(output)
+            iasios.add(output)
         return iasios
 
     @classmethod
@@ -137,26 +472,13 @@ class CdbReader:
         """
         dir = self.get_cdb_location() + SUPERVISORS_FOLDER
         try:
-            filepaths = [
-                dir + f for f in os.listdir(dir) if f.endswith('.json')
-            ]
+            supervisors = self.cache.get_folder(dir, _parse_supervisor)
         except IOError:
             logger.warning('%s folder not found. Supervisors not read', dir)
             return []
         dasus = []
-        for filepath in filepaths:
-            try:
-                with open(filepath) as file:
-                    supervisor = json.load(file)
-            except IOError:
-                logger.warning('%s not found. Supervisors not read', filepath)
-                return []
-
-            if "dasusToDeploy" not in supervisor:
-                continue
-            output = supervisor["dasusToDeploy"]
-            for dasu in output:
-                dasus.append(dasu["dasuId"])
+        for supervisor_dasus in supervisors.values():
+            dasus += supervisor_dasus
         return dasus
 
     @classmethod
@@ -167,14 +489,22 @@ class CdbReader:
         Returns:
             dict: A list of templates data
         """
+        return list(self.read_templates_index().values())
+
+    @classmethod
+    def read_templates_index(self):
+        """
+        Reads the templates.json file from the CDB and returns its content indexed by template id
+
+        Returns:
+            dict: A dictionary of templates data indexed by id
+        """
         filepath = self.get_cdb_location() + TEMPLATES_FILE
         try:
-            with open(filepath) as file:
-                templates = json.load(file)
+            return self.cache.get(filepath, _parse_templates)
         except IOError:
             logger.warning('%s not found. template not read', filepath)
-            return []
-        return templates
+            return {}
 
     @classmethod
     def find_template_range(self, template_id, templates):
@@ -183,13 +513,132 @@ class CdbReader:
 
         Args:
             template_id (string): the themplate of the ID
-            templates (list): list of dictionaries with the templates
+            templates (dict or list): dictionary of templates indexed by id, or list of dictionaries with the templates
 
         Returns:
             dict: A range with the numbers of the template
             (including max and min)
         """
+        if isinstance(templates, dict):
+            template = templates.get(template_id)
+            if template is not None:
+                return range(int(template['min']), int(template['max']) + 1)
+            return None
         for template in templates:
             if template['id'] == template_id:
                 return range(int(template['min']), int(template['max']) + 1)
         return None
+
+    @classmethod
+    def get_cdb_hash(self):
+        """
+        Returns a hash of the content of the CDB files that define the alarms:
+        the IASIOs and templates files, and the Supervisor and DASU folders
+
+        Returns:
+            string: the hexadecimal sha1 digest of the files
+        """
+        location = self.get_cdb_location()
+        filepaths = [IASIOS_FILE, TEMPLATES_FILE]
+        for folder in [SUPERVISORS_FOLDER, DASUS_FOLDER]:
+            try:
+                filepaths += sorted([folder + f for f in os.listdir(location + folder) if f.endswith('.json')])
+            except IOError:
+                continue
+        sha1 = hashlib.sha1()
+        for filepath in filepaths:
+            try:
+                with open(location + filepath, 'rb') as file:
+                    content = file.read()
+            except IOError:
+                continue
+            sha1.update('{}\0{}\0'.format(filepath, len(content)).encode())
+            sha1.update(content)
+        return sha1.hexdigest()
+
+    @classmethod
+    def compile_alarm_iasios(self, filepath, cdb_hash=None):
+        """
+        Reads the alarm IASIOs from the CDB and writes them, already resolved, to a compiled CDB file.
+        The file is written in msgpack format along with the hash of the CDB files it was compiled from.
+        The templated IASIOs are written with their ranges of instances, see read_alarm_iasios
+
+        Args:
+            filepath (string): the path of the compiled CDB file
+            cdb_hash (string): the hash of the CDB files, calculated if it is not given
+
+        Returns:
+            list: A list of IASIOs data, with the templated IASIOs as ranges
+        """
+        if cdb_hash is None:
+            cdb_hash = self.get_cdb_hash()
+        iasios = self.read_alarm_iasios(expand=False)
+        content = msgpack.packb({
+            'format': COMPILED_FORMAT_VERSION,
+            'hash': cdb_hash,
+            'iasios': iasios if iasios is not None else [],
+        }, use_bin_type=True)
+        tmp_filepath = filepath + '.tmp'
+        with open(tmp_filepath, 'wb') as file:
+            file.write(content)
+        os.replace(tmp_filepath, filepath)
+        logger.info('%d alarm IASIOs compiled to %s', len(iasios or []), filepath)
+        return iasios
+
+    @classmethod
+    def load_compiled_alarm_iasios(self, filepath, cdb_hash=None):
+        """
+        Reads the alarm IASIOs from a compiled CDB file, only if it was compiled from the current CDB files
+
+        Args:
+            filepath (string): the path of the compiled CDB file
+            cdb_hash (string): the hash of the CDB files, calculated if it is not given
+
+        Returns:
+            list: A list of IASIOs data, with the templated IASIOs as ranges,
+            or None if the file cannot be read or it is outdated
+        """
+        if cdb_hash is None:
+            cdb_hash = self.get_cdb_hash()
+        try:
+            with open(filepath, 'rb') as file:
+                compiled = msgpack.unpackb(file.read(), raw=False)
+        except IOError:
+            return None
+        except Exception as e:
+            logger.warning('%s could not be read. Compiled CDB ignored: %s', filepath, e)
+            return None
+        if not isinstance(compiled, dict) or compiled.get('format') != COMPILED_FORMAT_VERSION \
+                or compiled.get('hash') != cdb_hash:
+            logger.info('%s is outdated. Compiled CDB ignored', filepath)
+            return None
+        return compiled['iasios']
+
+    @classmethod
+    def read_compiled_alarm_iasios(self, expand=True):
+        """
+        Reads the alarm IASIOs from the compiled CDB file if it matches the current CDB files.
+        Otherwise reads them from the CDB and compiles them again, to be used in the next start
+
+        Args:
+            expand (boolean): True to expand the instances of the templated IASIOs, False to return them as ranges
+
+        Returns:
+            list: A list of IASIOs data
+        """
+        filepath = self.get_compiled_location()
+        if filepath is None:
+            return self.read_alarm_iasios(expand)
+        cdb_hash = self.get_cdb_hash()
+        iasios = self.load_compiled_alarm_iasios(filepath, cdb_hash)
+        if iasios is not None:
+            logger.info('%d alarm IASIOs read from the compiled CDB %s', len(iasios), filepath)
+        else:
+            try:
+                iasios = self.compile_alarm_iasios(filepath, cdb_hash)
+            except IOError as e:
+                logger.warning('%s could not be written. CDB not compiled: %s', filepath, e)
+                return self.read_alarm_iasios(expand)
+        if expand and iasios is not None:
+            return self.expand_template_instances(iasios)
+        return iasios
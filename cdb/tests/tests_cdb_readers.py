@@ -1,5 +1,13 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import mock
+from concurrent.futures import ThreadPoolExecutor
 from django.test import TestCase
-from cdb.readers import CdbReader
+from cdb import readers
+from cdb.readers import CdbReader, CdbFileCache
 from ias_webserver.settings import BROADCAST_RATE, BROADCAST_THRESHOLD
 
 
@@ -155,3 +163,240 @@ class CdbReaderTestCase(TestCase):
             iasios_data, expected_data,
             'The data obtained is not the expected'
         )
+
+    def test_read_alarm_iasios_with_template_ranges(self):
+        """ Test if we can read the validated IASIOS with the templated IASIOS as ranges,
+        and expand them later in one IASIO for each instance """
+        # Act:
+        iasios_data = CdbReader.read_alarm_iasios(expand=False)
+        expanded_data = CdbReader.expand_template_instances(iasios_data)
+        # Asserts:
+        expected_data = [
+            {
+                "id": "IASIO_DUMMY_ALARM_1",
+                "shortDesc": "Dummy Iasio of tyoe ALARM",
+                "iasType": "ALARM",
+                "docUrl": "http://www.alma.cl"
+            },
+            {
+                "id": "IASIO_DUMMY_ALARM_8",
+                "shortDesc": "Dummy Iasio of tyoe ALARM",
+                "iasType": "ALARM",
+                "docUrl": "http://www.alma.cl"
+            },
+            {
+                "id": "IASIO_DUMMY_TEMPLATED_1",
+                "shortDesc": "Dummy teplated Iasio 1",
+                "iasType": "ALARM",
+                "templateId": "template-ID1",
+                "templateRange": [3, 8]
+            },
+        ]
+        self.assertEqual(
+            iasios_data, expected_data,
+            'The data obtained is not the expected'
+        )
+        self.assertEqual(
+            expanded_data, CdbReader.read_alarm_iasios(),
+            'The expanded data is not the expected'
+        )
+
+    def test_find_template_range(self):
+        """ Test if we can find the range of a template from the list
+        or from the index of templates """
+        # Act:
+        range_from_list = CdbReader.find_template_range('template-ID2', CdbReader.read_templates())
+        range_from_index = CdbReader.find_template_range('template-ID2', CdbReader.read_templates_index())
+        missing_range = CdbReader.find_template_range('template-ID3', CdbReader.read_templates_index())
+        # Asserts:
+        self.assertEqual(range_from_list, range(20, 31), 'The range obtained is not the expected')
+        self.assertEqual(range_from_index, range(20, 31), 'The range obtained is not the expected')
+        self.assertEqual(missing_range, None, 'The range of a missing template should be None')
+
+
+class CdbReaderCacheTestCase(TestCase):
+
+    def setUp(self):
+        """ Copy the test CDB to a temporary folder that can be modified """
+        self.tmp_dir = tempfile.mkdtemp()
+        location = os.path.join(self.tmp_dir, 'CDB') + os.sep
+        shutil.copytree(CdbReader.get_cdb_location(), location)
+
+        class TmpCdbReader(CdbReader):
+            cache = CdbFileCache()
+
+            @classmethod
+            def get_cdb_location(self):
+                return location
+
+        self.reader = TmpCdbReader
+        self.location = location
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_repeated_reads_are_not_parsed_again(self):
+        """ Test that the files of the CDB are parsed only once if they do not change """
+        # Arrange:
+        expected_data = self.reader.read_alarm_iasios()
+        self.reader.read_ias()
+        cache_version = self.reader.cache.version
+        # Act:
+        iasios_data = self.reader.read_alarm_iasios()
+        ias_data = self.reader.read_ias()
+        # Asserts:
+        self.assertEqual(self.reader.cache.version, cache_version, 'The files should not be parsed again')
+        self.assertEqual(iasios_data, expected_data, 'The data obtained is not the expected')
+        self.assertEqual(ias_data['refreshRate'], '3', 'The data obtained is not the expected')
+
+    def test_only_modified_files_are_parsed_again(self):
+        """ Test that only the files that change are parsed again """
+        # Arrange:
+        self.reader.read_alarm_iasios()
+        dasu_path = self.location + 'DASU/DASU_IASIO_DUMMY_ALARM_1.json'
+        with open(dasu_path, 'w') as file:
+            json.dump({"id": "DASU_IASIO_DUMMY_ALARM_1", "outputId": "IASIO_DUMMY_ALARM_2"}, file)
+        # Act:
+        with mock.patch('cdb.readers._parse_json', wraps=readers._parse_json) as parse_json:
+            iasios_data = self.reader.read_alarm_iasios()
+        # Asserts:
+        parse_json.assert_called_once_with(dasu_path)
+        self.assertEqual(
+            sorted([iasio['id'] for iasio in iasios_data if 'templateId' not in iasio]),
+            ['IASIO_DUMMY_ALARM_2', 'IASIO_DUMMY_ALARM_8'],
+            'The changes of the modified files should be considered'
+        )
+
+    def test_removed_files_are_discarded(self):
+        """ Test that the entries of the removed files are discarded """
+        # Arrange:
+        self.reader.read_alarm_iasios()
+        os.remove(self.location + 'DASU/DASU_IASIO_DUMMY_ALARM_8.json')
+        # Act:
+        dasu_outputs = self.reader.read_dasus_outputs()
+        # Asserts:
+        self.assertEqual(
+            sorted(dasu_outputs),
+            ["IASIO_DUMMY_ALARM_1", "IASIO_DUMMY_ALARM_2", "IASIO_DUMMY_TEMPLATED_1"],
+            'The outputs of the removed files should be discarded'
+        )
+
+    def test_concurrent_reads(self):
+        """ Test that the folders can be read from different threads while the cache is cleared """
+        # Arrange:
+        def read():
+            for i in range(20):
+                self.reader.read_dasus_outputs()
+                self.reader.cache.clear()
+            return self.reader.read_dasus_outputs()
+        # Act:
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(lambda i: read(), range(4)))
+        # Asserts:
+        for dasu_outputs in results:
+            self.assertEqual(
+                sorted(dasu_outputs),
+                ["IASIO_DUMMY_ALARM_1", "IASIO_DUMMY_ALARM_2", "IASIO_DUMMY_ALARM_8", "IASIO_DUMMY_TEMPLATED_1"],
+                'The folders should be read by each thread'
+            )
+
+    def test_bad_files_are_skipped(self):
+        """ Test that the files that cannot be parsed are skipped without discarding the other files """
+        # Arrange:
+        with open(self.location + 'DASU/DASU_IASIO_DUMMY_ALARM_8.json', 'w') as file:
+            file.write('{"id": "DASU_IASIO_DUMMY_ALARM_8", ')
+        with open(self.location + 'Supervisor/SUPERVISOR_BAD.json', 'w') as file:
+            file.write('{"dasusToDeploy": [{}]}')
+        # Act:
+        dasus_to_deploy = self.reader.read_supervisors_dasus()
+        dasu_outputs = self.reader.read_dasus_outputs()
+        # Asserts:
+        self.assertEqual(
+            sorted(dasus_to_deploy),
+            ["DASU_IASIO_DUMMY_ALARM_1", "DASU_IASIO_DUMMY_ALARM_8", "DASU_IASIO_DUMMY_TEMPLATED_1"],
+            'The Supervisors of the valid files should be read'
+        )
+        self.assertEqual(
+            sorted(dasu_outputs),
+            ["IASIO_DUMMY_ALARM_1", "IASIO_DUMMY_ALARM_2", "IASIO_DUMMY_TEMPLATED_1"],
+            'The DASUs of the valid files should be read'
+        )
+
+    def test_alarm_iasios_keep_only_the_used_fields(self):
+        """ Test that only the fields used by the webserver are kept for the alarm IASIOs """
+        # Arrange:
+        iasios_path = self.location + 'IASIO/iasios.json'
+        with open(iasios_path) as file:
+            iasios = json.load(file)
+        for iasio in iasios:
+            iasio['unusedField'] = 'unused'
+        with open(iasios_path, 'w') as file:
+            json.dump(iasios, file)
+        # Act:
+        iasios_data = self.reader.read_alarm_iasios()
+        # Asserts:
+        self.assertTrue(len(iasios_data) > 0, 'The alarm IASIOs should be read')
+        for iasio in iasios_data:
+            self.assertFalse('unusedField' in iasio, 'The fields not used by the webserver should be discarded')
+
+    def test_compiled_alarm_iasios_are_read_while_the_cdb_does_not_change(self):
+        """ Test that the compiled alarm IASIOs are read without parsing the CDB if it did not change """
+        # Arrange:
+        compiled_path = os.path.join(self.tmp_dir, 'compiled.msgpack')
+        expected_data = self.reader.compile_alarm_iasios(compiled_path)
+        self.reader.cache.clear()
+        # Act:
+        with mock.patch('cdb.readers._parse_alarm_iasios') as parse_alarm_iasios:
+            iasios_data = self.reader.load_compiled_alarm_iasios(compiled_path)
+        # Asserts:
+        self.assertFalse(parse_alarm_iasios.called, 'The CDB should not be parsed')
+        self.assertEqual(iasios_data, expected_data, 'The data obtained is not the expected')
+
+    def test_compiled_alarm_iasios_are_ignored_if_the_cdb_changes(self):
+        """ Test that the compiled alarm IASIOs are ignored and compiled again when the CDB changes """
+        # Arrange:
+        compiled_path = os.path.join(self.tmp_dir, 'compiled.msgpack')
+        self.reader.compile_alarm_iasios(compiled_path)
+        os.remove(self.location + 'DASU/DASU_IASIO_DUMMY_ALARM_8.json')
+        # Act:
+        outdated_data = self.reader.load_compiled_alarm_iasios(compiled_path)
+        with mock.patch.object(self.reader, 'get_compiled_location', return_value=compiled_path):
+            iasios_data = self.reader.read_compiled_alarm_iasios(expand=False)
+        compiled_data = self.reader.load_compiled_alarm_iasios(compiled_path)
+        # Asserts:
+        self.assertEqual(outdated_data, None, 'The outdated compiled CDB should be ignored')
+        self.assertEqual(
+            sorted([iasio['id'] for iasio in iasios_data if 'templateId' not in iasio]),
+            ['IASIO_DUMMY_ALARM_1'],
+            'The changes of the CDB should be considered'
+        )
+        self.assertEqual(compiled_data, iasios_data, 'The CDB should be compiled again')
+
+
+class StreamingParserTestCase(TestCase):
+
+    def test_iter_json_array(self):
+        """ Test that the elements of a json array are decoded incrementally, even across the read chunks """
+        # Arrange:
+        elements = [
+            {'id': 'IASIO_{}'.format(i), 'shortDesc': 'Description, with [brackets] {}'.format(i)}
+            for i in range(20)
+        ]
+        content = '\n[\n ' + ',\n '.join(json.dumps(e) for e in elements) + '\n]\n'
+        # Act:
+        results = {
+            chunk_size: list(readers._iter_json_array(io.StringIO(content), chunk_size))
+            for chunk_size in [1, 7, 64, len(content)]
+        }
+        # Asserts:
+        for chunk_size, result in results.items():
+            self.assertEqual(
+                result, elements,
+                'The elements decoded with chunks of size {} are not the expected'.format(chunk_size)
+            )
+
+    def test_iter_json_array_with_invalid_content(self):
+        """ Test that an error is raised if the content is not a complete json array """
+        for content in ['{"id": "IASIO"}', '[{"id": "IASIO"}, ', '[{"id": ']:
+            with self.assertRaises(ValueError):
+                list(readers._iter_json_array(io.StringIO(content), 4))
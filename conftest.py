@@ -0,0 +1,15 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def invalidate_ticket_index():
+    """ Discards the in-memory index of the tickets before each test, so it is loaded from the test database """
+    from alarms.index import TicketIndex
+    TicketIndex.invalidate()
+
+
+@pytest.fixture(autouse=True)
+def invalidate_alarm_config_registry():
+    """ Discards the registry of the AlarmConfigs before each test, so it is not shared with mocked configurations """
+    from panels.models import AlarmConfig
+    AlarmConfig.objects.invalidate()
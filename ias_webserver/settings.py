@@ -47,7 +47,7 @@ INSTALLED_APPS = [
     'alarms.apps.AlarmConfig',
     'cdb',
     'panels',
-    'tickets',
+    'tickets.apps.TicketsConfig',
     'timers',
     'users'
 ]
@@ -264,6 +264,7 @@ BROADCAST_THRESHOLD = 11
 UNSHELVE_CHECKING_RATE = 60
 FILES_LOCATION = "private_files"
 TEST_FILES_LOCATION = "panels/tests/private_files/"
+FILES_POLLING_INTERVAL = float(os.getenv('FILES_POLLING_INTERVAL', 5))
 CDB_LOCATION = "CDB/"
 TEST_CDB_LOCATION = "cdb/tests/CDB/"
 IAS_FILE = "ias.json"
@@ -271,3 +272,19 @@ IASIOS_FILE = "IASIO/iasios.json"
 SUPERVISORS_FOLDER = "Supervisor/"
 DASUS_FOLDER = "DASU/"
 TEMPLATES_FILE = "TEMPLATE/templates.json"
+CDB_COMPILED_FILE = os.getenv('CDB_COMPILED_FILE', 'cdb_compiled.msgpack')
+DB_EXECUTOR_THREADS = int(os.getenv('DB_EXECUTOR_THREADS', 1))
+CDB_READER_THREADS = int(os.getenv('CDB_READER_THREADS', min(32, (os.cpu_count() or 1) + 4)))
+TICKET_JOURNAL_FILE = os.getenv('TICKET_JOURNAL_FILE', 'tickets_journal.ndjson')
+TICKET_JOURNAL_BATCH_SIZE = int(os.getenv('TICKET_JOURNAL_BATCH_SIZE', 500))
+TICKET_JOURNAL_FLUSH_INTERVAL = float(os.getenv('TICKET_JOURNAL_FLUSH_INTERVAL', 1))
+TICKET_JOURNAL_MAX_PENDING = int(os.getenv('TICKET_JOURNAL_MAX_PENDING', 10000))
+TICKET_INDEX_MAX_AGE = float(os.getenv('TICKET_INDEX_MAX_AGE', 10))
+TICKETS_RETENTION_DAYS = int(os.getenv('TICKETS_RETENTION_DAYS', 90))
+SHELVE_REGISTRIES_RETENTION_DAYS = int(os.getenv('SHELVE_REGISTRIES_RETENTION_DAYS', 90))
+ARCHIVE_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', 1000))
+ARCHIVE_BATCH_PAUSE = float(os.getenv('ARCHIVE_BATCH_PAUSE', 0.5))
+TICKET_STATISTICS_BUCKET_SIZE = int(os.getenv('TICKET_STATISTICS_BUCKET_SIZE', 300))
+TICKET_STATISTICS_WINDOW = int(os.getenv('TICKET_STATISTICS_WINDOW', 86400))
+TICKET_STATISTICS_ROLLUP_INTERVAL = float(os.getenv('TICKET_STATISTICS_ROLLUP_INTERVAL', 60))
+TICKET_STATISTICS_BUSIEST_ALARMS = int(os.getenv('TICKET_STATISTICS_BUSIEST_ALARMS', 10))
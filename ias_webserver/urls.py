@@ -18,12 +18,15 @@ Including another URLconf
 """
 from django.conf.urls import url, include
 from django.contrib import admin
-from alarms.views import test_core
+from alarms.views import test_core, readiness, reload_cdb, ticket_index
 
 urlpatterns = [
     url(r'^admin/doc/', include('django.contrib.admindocs.urls')),
     url(r'^admin/', admin.site.urls),
     url(r'^core/', test_core),
+    url(r'^readiness/$', readiness, name='readiness'),
+    url(r'^reload-cdb/$', reload_cdb, name='reload-cdb'),
+    url(r'^ticket-index/$', ticket_index, name='ticket-index'),
     url(r'^cdb-api/', include('cdb.urls')),
     url(r'^tickets-api/', include('tickets.urls')),
     url(r'^panels-api/', include('panels.urls')),
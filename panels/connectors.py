@@ -7,23 +7,32 @@ class ValueConnector:
     for the displays with data from the alarm collection
     """
 
+    antennas_to_pads = (None, {})
+    """ Last value of the antennas to pads IASValue and the dictionary parsed from it """
+
     @classmethod
     def get_antennas_to_pad_values(self):
         """
         Return a dictionary with the antennas to pad associations
-        from the related IASValue in the values_collection
+        from the related IASValue in the values_collection.
+        The value is parsed again only when it changes, otherwise a copy of the last parsed dictionary is returned
         """
 
         ANTENNAS_TO_PADS_VALUE_ID = "Array-AntennasToPads"
 
         selected_ias_value = IAlarms.get_value(ANTENNAS_TO_PADS_VALUE_ID)
 
+        antennas_pads_association = selected_ias_value.value if selected_ias_value is not None else None
+        (last_association, values) = self.antennas_to_pads
+        if antennas_pads_association == last_association:
+            return dict(values)
+
         values = {}
 
-        if selected_ias_value is not None:
-            antennas_pads_association = selected_ias_value.value
+        if antennas_pads_association is not None:
             for item in antennas_pads_association.split(','):
                 antenna_id, pad_placemark_id = item.split(':')
                 values[antenna_id] = pad_placemark_id
 
-        return values
+        ValueConnector.antennas_to_pads = (antennas_pads_association, values)
+        return dict(values)
@@ -16,10 +16,7 @@ class IPanels:
         Returns:
             (list): the list of alarm ids
         """
-        configs = AlarmConfig.objects.all()
-        ids = [config.alarm_id for config in configs]
-        ids = list(set(ids))
-        return ids
+        return AlarmConfig.objects.get_alarm_ids()
 
     @classmethod
     def get_alarms_views_dict_of_alarm_configs(self):
@@ -29,14 +26,4 @@ class IPanels:
         Returns:
             (dict): dictionary of views names with alarm_ids as keys
         """
-        q = AlarmConfig.objects.all()
-        alarm_id_to_views = {}
-        for config in q:
-            if config.has_view():
-                alarm_id = config.alarm_id
-                if alarm_id not in alarm_id_to_views:
-                    alarm_id_to_views[alarm_id] = [config.view]
-                else:
-                    if config.view not in alarm_id_to_views[alarm_id]:
-                        alarm_id_to_views[alarm_id] += [config.view]
-        return alarm_id_to_views
+        return AlarmConfig.objects.get_alarms_views_dict()
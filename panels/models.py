@@ -1,8 +1,14 @@
 import os
+import copy
 import glob
 import json
+import logging
+import threading
+import time
 from django.db import models
-from ias_webserver.settings import FILES_LOCATION, TEST_FILES_LOCATION
+from ias_webserver.settings import FILES_LOCATION, TEST_FILES_LOCATION, FILES_POLLING_INTERVAL
+
+logger = logging.getLogger(__name__)
 
 
 PERMISSIONS = ('add', 'change', 'delete', 'view')
@@ -10,7 +16,17 @@ PERMISSIONS = ('add', 'change', 'delete', 'view')
 
 
 class FileManager:
-    """ Manager to handle files """
+    """ Manager to handle files.
+
+    The files of each folder are scanned once and their parsed content is kept in memory. The folder is polled for
+    changes in the modification times of the files at most once every FILES_POLLING_INTERVAL seconds, and only the
+    files that changed are read again """
+
+    folders = {}
+    """ Dictionary with the scanned files and the time of the last scan, indexed by the path of the folder """
+
+    lock = threading.Lock()
+    """ Lock used to scan the folders from different threads """
 
     def _get_files_absolute_location(self):
         """ Return the path for the folder with the configuration files """
@@ -22,8 +38,72 @@ class FileManager:
 
     def basenames(self):
         """ Return a list with the basename of the files without the .json extension """
+        return list(self._get_folder()['files'].keys())
+
+    def get_content(self, file_basename):
+        """
+        Return the cached content of a file
+
+        Args:
+            file_basename (string): basename of the file without the .json extension
+
+        Returns:
+            dict: the 'json' string of the file and its parsed 'data', both None if the content is not valid json,
+            or None if the file does not exist. The data is shared by all the callers and must not be modified
+        """
+        return self._get_folder()['files'].get(file_basename, None)
+
+    def get_version(self):
+        """ Return a number that changes each time a file of the folder is added, modified or removed """
+        return self._get_folder()['version']
+
+    def invalidate(self):
+        """ Discard the cached files, the folders are scanned again when they are used """
+        with self.lock:
+            FileManager.folders = {}
+
+    def _get_folder(self):
+        """ Return the cached folder, scanning it again if the polling interval has passed """
         abs_path = self._get_files_absolute_location()
-        return [os.path.splitext(f)[0] for f in glob.glob1(abs_path, '*.json')]
+        folder = self.folders.get(abs_path, None)
+        if folder is None or time.monotonic() - folder['scanned_at'] >= FILES_POLLING_INTERVAL:
+            with self.lock:
+                folder = self._scan(abs_path, folder)
+                self.folders[abs_path] = folder
+        return folder
+
+    def _scan(self, abs_path, previous):
+        """ Scan a folder reading again only the files whose modification time or size changed """
+        previous_files = previous['files'] if previous else {}
+        files = {}
+        for filename in sorted(glob.glob1(abs_path, '*.json')):
+            basename = os.path.splitext(filename)[0]
+            try:
+                stat = os.stat(os.path.join(abs_path, filename))
+            except OSError:
+                continue
+            cached = previous_files.get(basename, None)
+            if cached is not None and (cached['mtime'], cached['size']) == (stat.st_mtime_ns, stat.st_size):
+                files[basename] = cached
+            else:
+                files[basename] = self._read(os.path.join(abs_path, filename), stat)
+        version = previous['version'] if previous else 0
+        changed = [key for key in files.keys() | previous_files.keys() if files.get(key) is not previous_files.get(key)]
+        if previous is None or changed:
+            version += 1
+            logger.debug('the files of %s were loaded (version %d)', abs_path, version)
+        return {'files': files, 'version': version, 'scanned_at': time.monotonic()}
+
+    def _read(self, path, stat):
+        """ Read and parse a file """
+        with open(path) as f:
+            content = f.read()
+        try:
+            data = json.loads(content)
+        except ValueError:
+            logger.warning('the file %s does not have a valid json content', path)
+            (content, data) = (None, None)
+        return {'mtime': stat.st_mtime_ns, 'size': stat.st_size, 'json': content, 'data': data}
 
     def all(self):
         """ Return a list with instances for each available file
@@ -42,8 +122,7 @@ class FileManager:
             only if the file exists in the folder
         """
         key = file_basename
-        available_files = self.basenames()
-        if key in available_files:
+        if self.get_content(key) is not None:
             return File(key=key, url='{}.json'.format(key))
 
 
@@ -75,22 +154,16 @@ class File:
         return os.path.join(self._get_absolute_location(), self.url)
 
     def get_json(self):
-        if self.key in self.objects.basenames():
-            url = self.get_full_url()
-            with open(url) as f:
-                content = f.read()
-            try:
-                json.loads(content)
-            except ValueError:
-                return None
-            return content
+        """ Returns the json content of the file, or None if it is not valid """
+        content = self.objects.get_content(self.key)
+        if content is not None:
+            return content['json']
 
     def get_content_data(self):
-        """ Returns a Python object with data from the json content of the file """
-        json_content = self.get_json()
-        if json_content is not None:
-            data = json.loads(json_content)
-            return data
+        """ Returns a Python object with data from the json content of the file, shared by all the callers """
+        content = self.objects.get_content(self.key)
+        if content is not None:
+            return content['data']
 
     def _collect_configurations_from_list(self, configurations, full_list):
         if isinstance(configurations, list):
@@ -157,7 +230,7 @@ class File:
             if len(update_placemark_values) == 0:
                 return self.get_content_data()
             else:
-                data = self.get_content_data()
+                data = copy.deepcopy(self.get_content_data())
                 if data is not None:
                     if isinstance(data, dict):
                         self._locate_and_update_configurations_from_dict(
@@ -226,17 +299,169 @@ class Placemark(models.Model):
         return False
 
 
+class ConfigurationRendering:
+    """ Result of a rendering of a ConfigurationTemplate with some values for the placemarks. It is not modified
+    by the next renderings, so it can be used by the callers outside of the lock of the templates """
+
+    def __init__(self, values, data, json, alarm_configs):
+        self.values = values
+        """ Values of the placemarks of the rendering """
+
+        self.data = data
+        """ Data of the file with the placemarks substituted """
+
+        self.json = json
+        """ Json content of the rendering, encoded as bytes """
+
+        self.alarm_configs = alarm_configs
+        """ List of instances for the configurations of the rendering """
+
+
+class ConfigurationTemplate:
+    """ Data of a configuration file compiled with direct references to the configurations of each placemark, used
+    to substitute the placemarks without traversing the data again """
+
+    def __init__(self, data):
+        self.source = data
+        """ Parsed content of the file used to compile the template """
+
+        self.data = copy.deepcopy(data)
+        """ Working copy of the data of the file, where the placemarks are substituted. Only used by render """
+
+        self.configurations = []
+        """ List of the dictionaries of the configurations in the data, in the order of the file """
+
+        self.slots = {}
+        """ Dictionary with the lists of dictionaries of the configurations, indexed by their original placemark """
+
+        self.rendering = None
+        """ Last :class:`ConfigurationRendering` of the template """
+
+        if isinstance(self.data, dict):
+            self._compile_dict(self.data)
+        if isinstance(self.data, list):
+            self._compile_list(self.data)
+
+    def _compile_list(self, configurations):
+        for config in configurations:
+            self.configurations.append(config)
+            if 'placemark' in config:
+                self.slots.setdefault(config['placemark'], []).append(config)
+            if len(config['children']) > 0:
+                self._compile_list(config['children'])
+
+    def _compile_dict(self, data):
+        for value in data.values():
+            if isinstance(value, dict):
+                self._compile_dict(value)
+            elif isinstance(value, list):
+                self._compile_list(value)
+
+    def render(self, update_placemark_values):
+        """ Returns a rendering with the placemarks substituted by their new values.
+            The last rendering is returned if the values did not change since then.
+            It must not be called from different threads at the same time
+
+            Args:
+                update_placemark_values (dict): dictionary with new values
+                for the placemarks
+
+            Returns:
+                ConfigurationRendering: the rendering of the template
+        """
+        if self.rendering is not None and update_placemark_values == self.rendering.values:
+            return self.rendering
+        for (placemark, configs) in self.slots.items():
+            new_placemark = update_placemark_values.get(placemark, placemark)
+            for config in configs:
+                config['placemark'] = new_placemark
+        rendered_json = json.dumps(self.data).encode()
+        # The data of the rendering is parsed from the json, so it is not modified by the next renderings
+        self.rendering = ConfigurationRendering(
+            dict(update_placemark_values),
+            json.loads(rendered_json.decode()),
+            rendered_json,
+            [AlarmConfig(config) for config in self.configurations]
+        )
+        return self.rendering
+
+
+class AlarmConfigRegistry:
+    """ Indexes of the AlarmConfigs of the configuration files, built in a single pass over the configurations """
+
+    def __init__(self, configurations):
+        self.configurations = configurations
+        """ List of all the configurations """
+
+        self.by_alarm_id = {}
+        """ Dictionary with the lists of configurations indexed by alarm_id """
+
+        self.views_by_alarm_id = {}
+        """ Dictionary with the lists of names of the views, without duplicates, indexed by alarm_id """
+
+        for config in configurations:
+            self.by_alarm_id.setdefault(config.alarm_id, []).append(config)
+            if config.has_view():
+                # Dictionaries are used as ordered sets to remove the duplicates
+                self.views_by_alarm_id.setdefault(config.alarm_id, {})[config.view] = None
+        self.views_by_alarm_id = {key: list(views) for (key, views) in self.views_by_alarm_id.items()}
+
+
 class AlarmConfigManager:
-    """ Manager to handle AlarmConfigs """
+    """ Manager to handle AlarmConfigs.
+
+    The configurations of all the configuration files are kept in an :class:`AlarmConfigRegistry`, that is built
+    again only when the configuration files change """
+
+    registry = None
+    """ Registry with the configurations of the configuration files """
+
+    registry_key = None
+    """ Folder, version and keys of the configuration files used to build the registry """
+
+    templates = {}
+    """ Dictionary with the compiled templates of the configuration files, indexed by file key """
+
+    lock = threading.Lock()
+    """ Lock used to build the registry and to compile and render the templates from different threads """
+
+    def get_registry(self):
+        """ Returns the registry of the configurations, shared by all the callers """
+        files = File.objects.all_config_files()
+        key = (File.objects._get_files_absolute_location(), File.objects.get_version(), [f.key for f in files])
+        with self.lock:
+            if self.registry is None or self.registry_key != key:
+                AlarmConfigManager.registry = AlarmConfigRegistry(self._read_configurations(files))
+                AlarmConfigManager.registry_key = key
+            return self.registry
+
+    def invalidate(self):
+        """ Discards the registry and the templates, they are built again when they are used """
+        with self.lock:
+            AlarmConfigManager.registry = None
+            AlarmConfigManager.registry_key = None
+            AlarmConfigManager.templates = {}
+
+    def _read_configurations(self, files):
+        """ Returns a list with instances for the configurations of a list of configuration files """
+        full_config_list = []
+        for file in files:
+            full_config_list += file.get_configurations()
+        return full_config_list
 
     def all(self):
         """ Returns a list with instances for the configurations
             with the original data provided in the configuration files
         """
-        full_config_list = []
-        for file in File.objects.all_config_files():
-            full_config_list += file.get_configurations()
-        return full_config_list
+        return list(self.get_registry().configurations)
+
+    def get_alarm_ids(self):
+        """ Returns a list with the alarm_ids of all the configurations, without duplicates """
+        return list(self.get_registry().by_alarm_id.keys())
+
+    def get_alarms_views_dict(self):
+        """ Returns a dictionary with the lists of names of the views of the configurations, indexed by alarm_id """
+        return dict(self.get_registry().views_by_alarm_id)
 
     def get_file_configurations(self, key, update_placemark_values={}):
         """ Returns a list with instances for the configurations
@@ -248,6 +473,9 @@ class AlarmConfigManager:
                 update_placemark_values (dict): dictionary with new values
                 for the placemarks
         """
+        if len(update_placemark_values) > 0:
+            rendering = self.get_file_template(key, update_placemark_values)
+            return list(rendering.alarm_configs) if rendering is not None else None
         file = File.objects.get_instance_for_localfile(key)
         if file is not None:
             if file.is_config_file():
@@ -266,6 +494,9 @@ class AlarmConfigManager:
                 update_placemark_values (dict): dictionary with new values
                 for the placemarks
         """
+        if len(update_placemark_values) > 0:
+            rendering = self.get_file_template(key, update_placemark_values)
+            return rendering.data if rendering is not None else None
         file = File.objects.get_instance_for_localfile(key)
         if file is not None:
             if file.is_config_file():
@@ -274,6 +505,44 @@ class AlarmConfigManager:
                 )
                 return config_data
 
+    def get_file_configuration_json(self, key, update_placemark_values={}):
+        """ Returns the json content of a configuration file, encoded as bytes,
+            with the placemarks updated with new values
+
+            Args:
+                key (string): file key
+                update_placemark_values (dict): dictionary with new values
+                for the placemarks
+        """
+        rendering = self.get_file_template(key, update_placemark_values)
+        if rendering is not None:
+            return rendering.json
+
+    def get_file_template(self, key, update_placemark_values):
+        """ Returns the rendering of the compiled template of a configuration file with new values for the placemarks.
+            The template is compiled again only when the file changes, and rendered again only when the values change
+
+            Args:
+                key (string): file key
+                update_placemark_values (dict): dictionary with new values
+                for the placemarks
+
+            Returns:
+                ConfigurationRendering: the rendering, or None if the file is not a configuration file
+        """
+        file = File.objects.get_instance_for_localfile(key)
+        if file is None or not file.is_config_file():
+            return None
+        data = file.get_content_data()
+        if data is None:
+            return None
+        with self.lock:
+            template = self.templates.get(key, None)
+            if template is None or template.source is not data:
+                template = ConfigurationTemplate(data)
+                self.templates[key] = template
+            return template.render(update_placemark_values)
+
 
 class AlarmConfig:
     """ Class that defines an AlarmConfig """
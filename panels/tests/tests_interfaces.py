@@ -85,7 +85,7 @@ class TestIPanels(TestCase):
         ]
 
     @mock.patch(
-        'panels.models.AlarmConfig.objects.all')
+        'panels.models.AlarmConfigManager._read_configurations')
     def test_get_alarm_ids_of_alarm_configs(
         self, mock_all_alarm_configs
     ):
@@ -111,7 +111,7 @@ class TestIPanels(TestCase):
         )
 
     @mock.patch(
-        'panels.models.AlarmConfig.objects.all')
+        'panels.models.AlarmConfigManager._read_configurations')
     def test_get_alarms_views_dict_of_alarm_configs(
         self, mock_all_alarm_configs
     ):
@@ -1,6 +1,7 @@
 import os
 import json
 import mock
+import tempfile
 from django.test import TestCase
 from panels.models import AlarmConfig
 from panels.models import (
@@ -303,6 +304,140 @@ class AlarmConfigGetUpdatedDataFromFileTestCase(TestCase, AlarmConfigTestBase):
             config_data, self.expected_configuration_data, 'Unexpected data')
 
 
+class FileManagerCacheTestCase(TestCase):
+    """ This class defines the test suite for the cache of the files of the FileManager """
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.write_file('first_config', {'value': 1})
+        self.write_file('second', {'value': 2})
+        File.objects.invalidate()
+
+    def tearDown(self):
+        self.folder.cleanup()
+        File.objects.invalidate()
+
+    def write_file(self, key, data):
+        with open(os.path.join(self.folder.name, '{}.json'.format(key)), 'w') as f:
+            f.write(json.dumps(data))
+
+    def test_files_are_read_once(self):
+        """ Test that the files are not read again while the polling interval has not passed """
+        with mock.patch('panels.models.FileManager._get_files_absolute_location', return_value=self.folder.name):
+            # Arrange:
+            File.objects.get_instance_for_localfile('first_config').get_content_data()
+            # Act:
+            with mock.patch('panels.models.glob.glob1') as glob1, mock.patch('panels.models.open') as open_file:
+                data = File.objects.get_instance_for_localfile('first_config').get_content_data()
+                basenames = File.objects.basenames()
+        # Assert:
+        self.assertEqual(data, {'value': 1}, 'The cached content should be returned')
+        self.assertEqual(sorted(basenames), ['first_config', 'second'], 'The cached basenames should be returned')
+        self.assertFalse(glob1.called or open_file.called, 'The folder and the files should not be read again')
+
+    @mock.patch('panels.models.FILES_POLLING_INTERVAL', 0)
+    def test_changes_of_the_files_are_detected(self):
+        """ Test that only the added and modified files are read again when the folder is polled """
+        with mock.patch('panels.models.FileManager._get_files_absolute_location', return_value=self.folder.name):
+            # Arrange:
+            version = File.objects.get_version()
+            second_content = File.objects.get_content('second')
+            # Act:
+            self.write_file('first_config', {'value': 'modified'})
+            self.write_file('third', {'value': 3})
+            new_version = File.objects.get_version()
+            first_data = File('first_config', 'first_config.json').get_content_data()
+            third_data = File('third', 'third.json').get_content_data()
+            new_second_content = File.objects.get_content('second')
+        # Assert:
+        self.assertEqual(new_version, version + 1, 'The version should change when the files change')
+        self.assertEqual(first_data, {'value': 'modified'}, 'The modified file should be read again')
+        self.assertEqual(third_data, {'value': 3}, 'The added file should be read')
+        self.assertIs(new_second_content, second_content, 'The unmodified file should not be read again')
+
+
+class AlarmConfigRegistryTestCase(TestCase, AlarmConfigTestBase):
+    """ This class defines the test suite for the registry of the configurations of the AlarmConfigManager """
+
+    @mock.patch('panels.models.FileManager.all_config_files')
+    @mock.patch('panels.models.FileManager._get_files_absolute_location')
+    def test_registry_indexes_the_configurations(self, mock_location, mock_all_config_files):
+        """ Test that the registry indexes the configurations and it is built again only if the files change """
+        # Arrange:
+        mock_location.return_value = MOCK_FILES_PATH
+        mock_all_config_files.return_value = self.get_mock_list_config_files()
+        registry = AlarmConfig.objects.get_registry()
+        # Act:
+        with mock.patch('panels.models.AlarmConfigRegistry') as registry_class:
+            cached_registry = AlarmConfig.objects.get_registry()
+        mock_all_config_files.return_value = self.get_mock_all_files()
+        new_registry = AlarmConfig.objects.get_registry()
+        # Assert:
+        self.assertFalse(registry_class.called, 'The registry should not be built again if the files do not change')
+        self.assertIs(cached_registry, registry, 'The same registry should be returned')
+        self.assertIsNot(new_registry, registry, 'The registry should be built again if the files change')
+        self.assertEqual(
+            [config.alarm_id for config in registry.by_alarm_id['alarm_id_1']], ['alarm_id_1'],
+            'The configurations should be indexed by alarm_id'
+        )
+        self.assertEqual(
+            registry.views_by_alarm_id['alarm_id_2'], ['alarm_id_2_view'],
+            'The views should be indexed by alarm_id'
+        )
+
+
+class AlarmConfigTemplateTestCase(TestCase):
+    """ This class defines the test suite for the compiled templates of the configuration files """
+
+    @mock.patch('panels.models.FileManager._get_files_absolute_location')
+    def test_template_is_rendered_only_when_the_values_change(self, mock_location):
+        """ Test that the placemarks are substituted only when the values change, keeping the rendered json """
+        # Arrange:
+        mock_location.return_value = MOCK_FILES_PATH
+        first_json = AlarmConfig.objects.get_file_configuration_json('mock_config', {'a_placemark': 'PAD1'})
+        # Act:
+        with mock.patch('panels.models.json.dumps') as dumps:
+            cached_json = AlarmConfig.objects.get_file_configuration_json('mock_config', {'a_placemark': 'PAD1'})
+        configurations = AlarmConfig.objects.get_file_configurations('mock_config', {'b_placemark': 'PAD2'})
+        # Assert:
+        self.assertFalse(dumps.called, 'The template should not be rendered again if the values do not change')
+        self.assertIs(cached_json, first_json, 'The rendered json should be served until the values change')
+        self.assertEqual(
+            json.loads(first_json.decode())['key1a']['key2a']['key3a'][0]['placemark'], 'PAD1',
+            'The placemark should be substituted'
+        )
+        self.assertEqual(
+            {config.alarm_id: config.placemark for config in configurations if config.alarm_id in ['a', 'b']},
+            {'a': 'a_placemark', 'b': 'PAD2'},
+            'The placemarks should be substituted with the new values only'
+        )
+
+    @mock.patch('panels.models.FileManager._get_files_absolute_location')
+    def test_renderings_are_not_modified_by_the_next_renderings(self, mock_location):
+        """ Test that the data returned for some values is kept when the template is rendered with other values """
+        # Arrange:
+        mock_location.return_value = MOCK_FILES_PATH
+        values = {'a_placemark': 'PAD1'}
+        first_data = AlarmConfig.objects.get_file_configuration_data('mock_config', values)
+        first_configurations = AlarmConfig.objects.get_file_configurations('mock_config', values)
+        # Act:
+        values['a_placemark'] = 'PAD2'
+        second_data = AlarmConfig.objects.get_file_configuration_data('mock_config', values)
+        # Assert:
+        self.assertEqual(
+            first_data['key1a']['key2a']['key3a'][0]['placemark'], 'PAD1',
+            'The data of the first rendering should not be modified'
+        )
+        self.assertEqual(
+            [config.placemark for config in first_configurations if config.alarm_id == 'a'], ['PAD1'],
+            'The configurations of the first rendering should not be modified'
+        )
+        self.assertEqual(
+            second_data['key1a']['key2a']['key3a'][0]['placemark'], 'PAD2',
+            'The data should be rendered again with the values modified by the caller'
+        )
+
+
 class PlacemarkTypeModelsTestCase(TestCase):
     """ This class defines the test suite for the Placemark Type model tests"""
 
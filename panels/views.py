@@ -1,4 +1,5 @@
 import logging
+from django.http import HttpResponse
 from rest_framework import viewsets, status
 from rest_framework import authentication, permissions
 from rest_framework.decorators import action
@@ -64,9 +65,13 @@ class AlarmConfigViewSet(viewsets.ViewSet):
     def get_json(self, request):
         key = request.GET.get('key', None)
         if key == ANTENNAS_CONFIG_FILE_KEY:
+            # The rendered json is cached until the file or the antennas to pads value change
             values = ValueConnector.get_antennas_to_pad_values()
-            data = AlarmConfig.objects.get_file_configuration_data(
+            content = AlarmConfig.objects.get_file_configuration_json(
                 key, update_placemark_values=values)
+            if content is not None:
+                return HttpResponse(content, content_type='application/json')
+            data = None
         else:
             data = AlarmConfig.objects.get_file_configuration_data(key)
         if data is not None:
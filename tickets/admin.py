@@ -1,6 +1,8 @@
 from django.contrib import admin
-from tickets.models import Ticket, ShelveRegistry
+from tickets.models import Ticket, ShelveRegistry, ArchivedTicket, ArchivedShelveRegistry
 
 # Register your models here.
 admin.site.register(Ticket)
 admin.site.register(ShelveRegistry)
+admin.site.register(ArchivedTicket)
+admin.site.register(ArchivedShelveRegistry)
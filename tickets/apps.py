@@ -2,4 +2,11 @@ from django.apps import AppConfig
 
 
 class TicketsConfig(AppConfig):
+    """ Configuration of the application Tickets """
+
     name = 'tickets'
+    """ Name of the application """
+
+    def ready(self):
+        """ Connects the ticket statistics to the signals of the changes of the tickets """
+        import tickets.statistics  # noqa: F401
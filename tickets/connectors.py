@@ -38,6 +38,27 @@ class AlarmConnector:
         """
         return IAlarms.unshelve_alarms(alarm_ids)
 
+    @classmethod
+    def schedule_unshelve(self, alarm_id, expires_at):
+        """
+        Schedule the unshelving of an Alarm when its shelve timeout is reached
+
+        Args:
+            alarm_id (string): ID of the shelved Alarm
+            expires_at (datetime): time when the shelve expires
+        """
+        return IAlarms.schedule_unshelve(alarm_id, expires_at)
+
+    @classmethod
+    def get_alarms_views_dict(self):
+        """
+        Get the names of the views of each alarm
+
+        Returns:
+            dict: the lists of names of the views, indexed by alarm id
+        """
+        return IAlarms.get_alarms_views_dict()
+
     @classmethod
     def get_alarm_dependencies(self, alarm_id):
         """
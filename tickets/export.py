@@ -0,0 +1,98 @@
+import csv
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+
+EXPORT_CHUNK_SIZE = 2000
+""" Number of records fetched from the database by each query of the export """
+
+NDJSON = 'ndjson'
+""" Output of the exports with a JSON object by line """
+
+CSV = 'csv'
+""" Output of the exports with a header line and a comma separated line by record """
+
+CONTENT_TYPES = {
+    NDJSON: 'application/x-ndjson',
+    CSV: 'text/csv',
+}
+""" Content types of the outputs of the exports """
+
+
+class Echo:
+    """ File-like object that returns the written value, used to stream the lines of a csv writer """
+
+    def write(self, value):
+        """ Returns the value instead of storing it """
+        return value
+
+
+def filter_export_queryset(queryset, request, timestamp_field):
+    """
+    Filters the records to export by the query parameters of the request: 'since' and 'until' for the time range
+    of the timestamp field, 'alarm_id' and 'status'. Raises ValidationError if the time range is not valid
+
+    Args:
+        queryset (QuerySet): the records to export
+        request (Request): the request, with the optional query parameters
+        timestamp_field (string): name of the timestamp field used to filter and order the records
+
+    Returns:
+        QuerySet: the filtered records, ordered from the oldest to the newest
+    """
+    for (param, lookup) in [('since', '__gte'), ('until', '__lt')]:
+        value = request.query_params.get(param, None)
+        if value:
+            timestamp = parse_datetime(value)
+            if timestamp is None:
+                raise ValidationError({param: 'The value must be an ISO 8601 datetime'})
+            queryset = queryset.filter(**{timestamp_field + lookup: timestamp})
+    alarm_id = request.query_params.get('alarm_id', None)
+    if alarm_id:
+        queryset = queryset.filter(alarm_id=alarm_id)
+    status = request.query_params.get('status', None)
+    if status:
+        queryset = queryset.filter(status=status)
+    return queryset.order_by(timestamp_field, 'id')
+
+
+def export_response(queryset, fields, output, filename):
+    """
+    Returns a response that streams the records of a queryset, reading them in chunks of EXPORT_CHUNK_SIZE records
+    as tuples of values, so the memory used does not depend on the number of records
+
+    Args:
+        queryset (QuerySet): the records to export
+        fields (list): names of the fields to export
+        output (string): the output of the export, NDJSON or CSV. Raises ValidationError if it is not valid
+        filename (string): name of the exported file, without extension
+
+    Returns:
+        StreamingHttpResponse: the response with the exported records
+    """
+    if output not in CONTENT_TYPES:
+        raise ValidationError({'output': 'The output must be one of {}'.format(', '.join(CONTENT_TYPES))})
+    rows = queryset.values_list(*fields).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    if output == CSV:
+        lines = _csv_lines(rows, fields)
+    else:
+        lines = _ndjson_lines(rows, fields)
+    response = StreamingHttpResponse(lines, content_type=CONTENT_TYPES[output])
+    response['Content-Disposition'] = 'attachment; filename="{}.{}"'.format(filename, output)
+    return response
+
+
+def _ndjson_lines(rows, fields):
+    """ Generates a JSON object by line for each row """
+    encoder = DjangoJSONEncoder()
+    for row in rows:
+        yield encoder.encode(dict(zip(fields, row))) + '\n'
+
+
+def _csv_lines(rows, fields):
+    """ Generates the header line and a comma separated line for each row """
+    writer = csv.writer(Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow([value.isoformat() if hasattr(value, 'isoformat') else value for value in row])
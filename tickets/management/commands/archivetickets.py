@@ -0,0 +1,68 @@
+"""
+Management utility to apply the retention policies of the tickets and shelve registries.
+"""
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from ias_webserver.settings import (
+    TICKETS_RETENTION_DAYS,
+    SHELVE_REGISTRIES_RETENTION_DAYS,
+    ARCHIVE_BATCH_SIZE,
+    ARCHIVE_BATCH_PAUSE,
+)
+from tickets.models import Ticket, ShelveRegistry
+
+
+class Command(BaseCommand):
+    """ Command used to move the closed tickets and the unshelved registries older than the retention periods to the
+    archive tables, in batches with a pause between them to avoid holding the tables for a long time """
+
+    help = 'Moves the closed tickets and unshelved registries older than the retention periods to the archive'
+
+    def add_arguments(self, parser):
+        """ Command arguments setup """
+        parser.add_argument(
+            '--tickets-days', type=int, default=TICKETS_RETENTION_DAYS,
+            help='Days that the closed tickets are kept before they are archived')
+        parser.add_argument(
+            '--registries-days', type=int, default=SHELVE_REGISTRIES_RETENTION_DAYS,
+            help='Days that the unshelved registries are kept before they are archived')
+        parser.add_argument(
+            '--batch-size', type=int, default=ARCHIVE_BATCH_SIZE,
+            help='Number of records moved by each transaction')
+        parser.add_argument(
+            '--pause', type=float, default=ARCHIVE_BATCH_PAUSE,
+            help='Time in seconds between batches')
+
+    def handle(self, *args, **options):
+        """ Archive the tickets and the shelve registries and print the number of archived records """
+        now = timezone.now()
+        policies = [
+            ('tickets', Ticket.objects, now - timedelta(days=options['tickets_days'])),
+            ('shelve registries', ShelveRegistry.objects, now - timedelta(days=options['registries_days'])),
+        ]
+        for (name, manager, older_than) in policies:
+            total = self._archive(manager, older_than, options['batch_size'], options['pause'])
+            self.stdout.write('{} {} older than {} were archived'.format(total, name, older_than))
+
+    def _archive(self, manager, older_than, batch_size, pause):
+        """
+        Archives the records of a manager in batches until there are no more records to archive
+
+        Args:
+            manager (Manager): the manager of the records, with an archive method
+            older_than (datetime): the records closed before this time are archived
+            batch_size (int): maximum number of records of each batch
+            pause (float): time in seconds between batches
+
+        Returns:
+            int: the number of archived records
+        """
+        total = 0
+        while True:
+            count = manager.archive(older_than, batch_size)
+            total += count
+            if count < batch_size:
+                return total
+            time.sleep(pause)
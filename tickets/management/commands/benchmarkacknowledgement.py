@@ -0,0 +1,85 @@
+"""
+Management utility to benchmark the acknowledgement of the tickets of many alarms through the API.
+"""
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from alarms.collections import AlarmCollection
+from tickets.models import Ticket, TicketStatus
+
+DEFAULT_SIZE = 1000
+""" Default number of open tickets """
+
+
+class Command(BaseCommand):
+    """ Command used to measure the time and the number of queries taken by the acknowledgement of open tickets.
+    All the database records created by the command are rolled back at the end of each run """
+
+    help = 'Measures the acknowledgement of the open tickets of many alarms through the API'
+
+    def add_arguments(self, parser):
+        """ Command arguments setup """
+        parser.add_argument(
+            '--size', type=int, default=DEFAULT_SIZE,
+            help='Number of open tickets to acknowledge')
+
+    def handle(self, *args, **options):
+        """ Run the benchmark acknowledging the tickets one by one and through the API """
+        size = options['size']
+        alarm_ids = ['BENCHMARK_ALARM_{}'.format(i) for i in range(size)]
+        AlarmCollection.reset([
+            {'id': alarm_id, 'shortDesc': alarm_id, 'iasType': 'ALARM', 'docUrl': ''} for alarm_id in alarm_ids
+        ])
+        runs = [
+            ('one update per ticket', self._acknowledge_each_ticket),
+            ('API request', self._acknowledge_with_the_api),
+        ]
+        for (name, acknowledge) in runs:
+            (elapsed, queries) = self._run(acknowledge, alarm_ids)
+            self.stdout.write('{:>8d} tickets, {:<22}: {:8.3f} s, {:>6d} queries'.format(
+                size, name, elapsed, queries))
+        AlarmCollection.reset([])
+
+    def _run(self, acknowledge, alarm_ids):
+        """
+        Acknowledges an open ticket for each alarm inside a transaction that is rolled back
+
+        Args:
+            acknowledge (function): function that acknowledges the tickets of a list of alarm ids
+            alarm_ids (list): the ids of the alarms
+
+        Returns:
+            tuple: the time in seconds and the number of queries of the acknowledgement
+        """
+        with transaction.atomic():
+            Ticket.objects.bulk_create([Ticket(alarm_id=alarm_id) for alarm_id in alarm_ids])
+            client = APIClient()
+            client.force_authenticate(user=User.objects.create_superuser('benchmark', 'benchmark@alma.cl', '123'))
+            with CaptureQueriesContext(connection) as context:
+                start = time.time()
+                acknowledge(client, alarm_ids)
+                elapsed = time.time() - start
+            unack_statuses = [int(TicketStatus.get_choices_by_name()[name]) for name in ('UNACK', 'CLEARED_UNACK')]
+            if Ticket.objects.filter(status__in=unack_statuses).exists():
+                self.stderr.write('Some tickets were not acknowledged')
+            transaction.set_rollback(True)
+        return (elapsed, len(context.captured_queries))
+
+    def _acknowledge_each_ticket(self, client, alarm_ids):
+        """ Acknowledges the tickets one by one, as a reference """
+        for ticket in Ticket.objects.filter(alarm_id__in=alarm_ids):
+            ticket.acknowledge(message='benchmark', user='benchmark')
+
+    def _acknowledge_with_the_api(self, client, alarm_ids):
+        """ Acknowledges the tickets with a request to the acknowledge action of the tickets API """
+        response = client.put(
+            reverse('ticket-acknowledge'),
+            {'message': 'benchmark', 'user': 'benchmark', 'alarms_ids': alarm_ids},
+            format='json'
+        )
+        if response.status_code != 200:
+            self.stderr.write('Unexpected response {}'.format(response.status_code))
@@ -0,0 +1,124 @@
+"""
+Management utility to benchmark the retrieval of the old open tickets of the dependency tree of an alarm.
+"""
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from alarms.collections import AlarmCollection
+from alarms.models import Alarm
+from tickets.models import Ticket, TicketStatus
+
+DEFAULT_DEPTHS = [2, 4, 6]
+""" Default depths of the synthetic dependency trees """
+
+DEFAULT_FANOUT = 3
+""" Default number of dependencies of each alarm of the trees """
+
+ALARM_PREFIX = 'BENCHMARK_ALARM'
+""" Prefix of the ids of the alarms of the trees """
+
+
+class Command(BaseCommand):
+    """ Command used to measure the time and the number of queries of the old_open_info action of the tickets API
+    for dependency trees of different depths. All the database records created by the command are rolled back """
+
+    help = 'Measures the retrieval of the old open tickets of the dependency trees of alarms'
+
+    def add_arguments(self, parser):
+        """ Command arguments setup """
+        parser.add_argument(
+            '--depths', type=int, nargs='+', default=DEFAULT_DEPTHS,
+            help='Depths of the dependency trees')
+        parser.add_argument(
+            '--fanout', type=int, default=DEFAULT_FANOUT,
+            help='Number of dependencies of each alarm')
+
+    def handle(self, *args, **options):
+        """ Run the benchmark for each depth and print the results """
+        for depth in options['depths']:
+            alarm_ids = self._create_tree(depth, options['fanout'])
+            runs = [
+                ('one query per alarm', self._get_info_by_alarm),
+                ('API request', self._get_info_with_the_api),
+            ]
+            for (name, get_info) in runs:
+                (elapsed, queries) = self._run(get_info, alarm_ids)
+                self.stdout.write('depth {:>2d}, {:>6d} alarms, {:<20}: {:8.3f} s, {:>6d} queries'.format(
+                    depth, len(alarm_ids), name, elapsed, queries))
+        AlarmCollection.reset([])
+
+    def _create_tree(self, depth, fanout):
+        """
+        Initializes the AlarmCollection with a complete tree of alarms, where each alarm depends on fanout alarms
+
+        Args:
+            depth (int): number of levels of the tree
+            fanout (int): number of dependencies of each alarm
+
+        Returns:
+            list: the ids of the alarms of the tree, starting with the root
+        """
+        AlarmCollection.reset([])
+        timestamp = int(round(time.time() * 1000))
+        levels = [[ALARM_PREFIX]]
+        for level in range(depth - 1):
+            levels.append([
+                '{}_{}'.format(parent_id, i) for parent_id in levels[-1] for i in range(fanout)
+            ])
+        for (level, alarm_ids) in enumerate(levels):
+            for alarm_id in alarm_ids:
+                dependencies = ['{}_{}'.format(alarm_id, i) for i in range(fanout)] if level < depth - 1 else []
+                alarm = Alarm(
+                    value=0, mode=7, validity=1, core_timestamp=timestamp, core_id=alarm_id,
+                    running_id='({}:IASIO)'.format(alarm_id), dependencies=dependencies
+                )
+                AlarmCollection.add(alarm, ack=True, shelved=False)
+        return [alarm_id for alarm_ids in levels for alarm_id in alarm_ids]
+
+    def _run(self, get_info, alarm_ids):
+        """
+        Creates a cleared and unacknowledged ticket for each alarm and retrieves the information of the tree,
+        inside a transaction that is rolled back
+
+        Args:
+            get_info (function): function that retrieves the information of the tree
+            alarm_ids (list): the ids of the alarms of the tree, starting with the root
+
+        Returns:
+            tuple: the time in seconds and the number of queries of the retrieval
+        """
+        with transaction.atomic():
+            Ticket.objects.bulk_create([
+                Ticket(alarm_id=alarm_id, status=int(TicketStatus.get_choices_by_name()['CLEARED_UNACK']))
+                for alarm_id in alarm_ids
+            ])
+            client = APIClient()
+            client.force_authenticate(user=User.objects.create_superuser('benchmark', 'benchmark@alma.cl', '123'))
+            with CaptureQueriesContext(connection) as context:
+                start = time.time()
+                data = get_info(client, alarm_ids[0])
+                elapsed = time.time() - start
+            if sum([len(pks) for pks in data.values()]) != len(alarm_ids):
+                self.stderr.write('Some tickets were not retrieved')
+            transaction.set_rollback(True)
+        return (elapsed, len(context.captured_queries))
+
+    def _get_info_by_alarm(self, client, alarm_id):
+        """ Retrieves the tickets of each alarm of the tree with a query per alarm, as a reference """
+        data = {}
+        for dependency_id in AlarmCollection.get_dependencies_recursively(alarm_id):
+            queryset = Ticket.objects.filter(
+                alarm_id=dependency_id,
+                status=TicketStatus.get_choices_by_name()['CLEARED_UNACK']
+            )
+            data[dependency_id] = [ticket.pk for ticket in queryset]
+        return data
+
+    def _get_info_with_the_api(self, client, alarm_id):
+        """ Retrieves the tickets of the tree with a request to the old_open_info action of the tickets API """
+        response = client.get(reverse('ticket-old-open-info'), {'alarm_id': alarm_id}, format='json')
+        return response.data
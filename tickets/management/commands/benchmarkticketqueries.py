@@ -0,0 +1,140 @@
+"""
+Management utility to benchmark the latency and the plans of the hot queries of the tickets and shelve registries.
+It runs against the database configured with DB_ENGINE (sqlite, mysql or oracle).
+"""
+import random
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from tickets.models import Ticket, TicketStatus, ShelveRegistry, ShelveRegistryStatus
+
+DEFAULT_TICKETS = 1000000
+""" Default number of synthetic tickets """
+
+DEFAULT_ALARMS = 10000
+""" Default number of alarms of the synthetic tickets """
+
+DEFAULT_REPEAT = 200
+""" Default number of times that each query is executed """
+
+OPEN_RATIO = 0.01
+""" Ratio of the synthetic tickets and shelve registries in open states """
+
+BATCH_SIZE = 10000
+""" Number of records inserted by each bulk insert """
+
+ALARM_PREFIX = 'BENCHMARK_ALARM_'
+""" Prefix of the ids of the alarms of the synthetic tickets """
+
+
+class Command(BaseCommand):
+    """ Command used to measure the latency and print the plans of the queries that filter on alarm_id and status.
+    All the database records created by the command are rolled back at the end """
+
+    help = 'Measures the latency and prints the plans of the hot ticket and shelve registry queries'
+
+    def add_arguments(self, parser):
+        """ Command arguments setup """
+        parser.add_argument(
+            '--tickets', type=int, default=DEFAULT_TICKETS,
+            help='Number of synthetic tickets, with a shelve registry for every 10 tickets')
+        parser.add_argument(
+            '--alarms', type=int, default=DEFAULT_ALARMS,
+            help='Number of alarms of the synthetic tickets')
+        parser.add_argument(
+            '--repeat', type=int, default=DEFAULT_REPEAT,
+            help='Number of times that each query is executed')
+        parser.add_argument(
+            '--plans', action='store_true',
+            help='Print the plan of each query')
+
+    def handle(self, *args, **options):
+        """ Run the benchmark inside a transaction that is rolled back """
+        alarm_ids = [ALARM_PREFIX + str(i) for i in range(options['alarms'])]
+        self.stdout.write('Database vendor: {}'.format(connection.vendor))
+        with transaction.atomic():
+            start = time.time()
+            self._populate(alarm_ids, options['tickets'])
+            self.stdout.write('{} tickets inserted in {:.3f} s'.format(options['tickets'], time.time() - start))
+            for (name, get_queryset) in self._get_queries():
+                self._run(name, get_queryset, alarm_ids, options['repeat'], options['plans'])
+            transaction.set_rollback(True)
+
+    def _populate(self, alarm_ids, size):
+        """
+        Inserts the synthetic tickets, mostly cleared and acknowledged, and the synthetic shelve registries,
+        mostly unshelved. An OPEN_RATIO of them are in open states
+
+        Args:
+            alarm_ids (list): the ids of the alarms of the records
+            size (int): number of tickets
+        """
+        choices = TicketStatus.get_choices_by_name()
+        open_statuses = [int(choices['UNACK']), int(choices['CLEARED_UNACK'])]
+        closed_status = int(choices['CLEARED_ACK'])
+        shelved = int(ShelveRegistryStatus.get_choices_by_name()['SHELVED'])
+        unshelved = int(ShelveRegistryStatus.get_choices_by_name()['UNSHELVED'])
+        for start in range(0, size, BATCH_SIZE):
+            count = min(BATCH_SIZE, size - start)
+            Ticket.objects.bulk_create([
+                Ticket(
+                    alarm_id=random.choice(alarm_ids),
+                    status=random.choice(open_statuses) if random.random() < OPEN_RATIO else closed_status
+                )
+                for i in range(count)
+            ])
+            ShelveRegistry.objects.bulk_create([
+                ShelveRegistry(
+                    alarm_id=random.choice(alarm_ids), message='benchmark', user='benchmark',
+                    status=shelved if random.random() < OPEN_RATIO else unshelved
+                )
+                for i in range(count // 10)
+            ])
+
+    def _get_queries(self):
+        """
+        Returns the hot queries, as functions that return their queryset for a random list of alarm ids
+
+        Returns:
+            list: list of tuples with the name of the query and the function
+        """
+        choices = TicketStatus.get_choices_by_name()
+        unack = int(choices['UNACK'])
+        cleared_unack = int(choices['CLEARED_UNACK'])
+        shelved = int(ShelveRegistryStatus.get_choices_by_name()['SHELVED'])
+        return [
+            ('check_acknowledgement', lambda ids: Ticket.objects.filter(
+                alarm_id=ids[0], status__in=[unack, cleared_unack]).order_by('pk')[:1]),
+            ('check_shelve', lambda ids: ShelveRegistry.objects.filter(
+                alarm_id=ids[0], status=shelved).order_by('pk')[:1]),
+            ('clear_tickets (100 alarms)', lambda ids: Ticket.objects.filter(
+                alarm_id__in=ids, status=unack)),
+            ('old_open_info', lambda ids: Ticket.objects.filter(
+                alarm_id=ids[0], status=cleared_unack)),
+            ('tickets filters', lambda ids: Ticket.objects.filter(
+                alarm_id=ids[0], status=unack)),
+            ('shelve registries filters', lambda ids: ShelveRegistry.objects.filter(
+                alarm_id=ids[0], status=shelved)),
+            ('get_unack_alarm_ids', lambda ids: Ticket.objects.filter(
+                status__in=[unack, cleared_unack]).values_list('alarm_id', flat=True).distinct()),
+        ]
+
+    def _run(self, name, get_queryset, alarm_ids, repeat, plans):
+        """
+        Executes a query for random alarms and prints its average latency and, optionally, its plan
+
+        Args:
+            name (string): the name of the query
+            get_queryset (function): function that returns the queryset for a list of alarm ids
+            alarm_ids (list): the ids of the alarms
+            repeat (int): number of times that the query is executed
+            plans (boolean): True if the plan of the query must be printed
+        """
+        querysets = [get_queryset(random.sample(alarm_ids, 100)) for i in range(repeat)]
+        start = time.time()
+        for queryset in querysets:
+            list(queryset)
+        elapsed = (time.time() - start) / repeat
+        self.stdout.write('{:<28}: {:8.3f} ms'.format(name, elapsed * 1000))
+        if plans:
+            self.stdout.write(querysets[0].explain())
@@ -0,0 +1,31 @@
+# Generated by Django 2.1.7 on 2026-10-19 00:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0016_auto_20261019_0033'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='shelveregistry',
+            index=models.Index(fields=['alarm_id', 'status'], name='shelve_alarm_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['alarm_id', 'status'], name='ticket_alarm_status_idx'),
+        ),
+        migrations.AlterField(
+            model_name='shelveregistry',
+            name='alarm_id',
+            field=models.CharField(max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='ticket',
+            name='alarm_id',
+            field=models.CharField(max_length=64),
+        ),
+    ]
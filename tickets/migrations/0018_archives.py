@@ -0,0 +1,50 @@
+# Generated by Django 2.1.7 on 2026-10-19 00:58
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0017_alarm_status_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedShelveRegistry',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('shelved_at', models.DateTimeField()),
+                ('unshelved_at', models.DateTimeField(null=True)),
+                ('alarm_id', models.CharField(db_index=True, max_length=64)),
+                ('message', models.CharField(max_length=256)),
+                ('timeout', models.DurationField()),
+                ('user', models.CharField(max_length=150)),
+                ('status', models.IntegerField(choices=[('1', 'SHELVED'), ('0', 'UNSHELVED')])),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'default_permissions': ('view',),
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedTicket',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField()),
+                ('acknowledged_at', models.DateTimeField(null=True)),
+                ('cleared_at', models.DateTimeField(null=True)),
+                ('alarm_id', models.CharField(db_index=True, max_length=64)),
+                ('message', models.CharField(max_length=256, null=True)),
+                ('user', models.CharField(max_length=150, null=True)),
+                ('status', models.IntegerField(
+                    choices=[('1', 'ACK'), ('3', 'CLEARED_ACK'), ('2', 'CLEARED_UNACK'), ('0', 'UNACK')]
+                )),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'default_permissions': ('view',),
+            },
+        ),
+    ]
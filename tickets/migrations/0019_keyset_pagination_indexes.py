@@ -0,0 +1,21 @@
+# Generated by Django 2.1.7 on 2026-10-19 01:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0018_archives'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='shelveregistry',
+            index=models.Index(fields=['shelved_at', 'id'], name='shelve_shelved_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['created_at', 'id'], name='ticket_created_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 2.1.7 on 2026-10-19 01:06
+
+from django.db import migrations, models
+from django.db.models import ExpressionWrapper, F
+import django.utils.timezone
+
+SHELVED = 1
+""" Status of the active shelve registries, the only ones whose expiration time is queried """
+
+
+def set_expiration_times(apps, schema_editor):
+    """ Sets the expiration time of the SHELVED registries with a set-based update for each distinct timeout """
+    ShelveRegistry = apps.get_model('tickets', 'ShelveRegistry')
+    queryset = ShelveRegistry.objects.filter(status=SHELVED)
+    for timeout in queryset.order_by().values_list('timeout', flat=True).distinct():
+        queryset.filter(timeout=timeout).update(
+            expires_at=ExpressionWrapper(F('shelved_at') + timeout, output_field=models.DateTimeField())
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0019_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shelveregistry',
+            name='expires_at',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AlterField(
+            model_name='shelveregistry',
+            name='shelved_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.RunPython(set_expiration_times, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='shelveregistry',
+            index=models.Index(fields=['status', 'expires_at'], name='shelve_expiry_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 2.1.7 on 2026-10-19 01:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0020_shelve_expires_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketStatisticsRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period_start', models.DateTimeField(unique=True)),
+                ('created', models.IntegerField(default=0)),
+                ('created_by_alarm', models.TextField(default='{}')),
+                ('acknowledged', models.IntegerField(default=0)),
+                ('acknowledge_seconds', models.FloatField(default=0)),
+                ('tickets_by_status', models.TextField(default='{}')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'default_permissions': ('view',),
+            },
+        ),
+    ]
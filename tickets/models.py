@@ -1,7 +1,15 @@
 import logging
 from datetime import timedelta
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, Value, When
 from django.utils import timezone
+from tickets.signals import (
+    tickets_acknowledged,
+    ticket_status_changed,
+    tickets_archived,
+    registries_unshelved,
+    tickets_write_failed,
+)
 from utils.choice_enum import ChoiceEnum
 
 logger = logging.getLogger(__name__)
@@ -38,11 +46,103 @@ class TicketStatus(ChoiceEnum):
         return cls.get_choices()
 
 
+def archive_batch(queryset, archive_model, batch_size):
+    """
+    Moves a batch of the records of a queryset to an archive table in a single transaction.
+    The archive model must have an 'archived_at' field, the rest of its fields are copied from the records
+
+    Args:
+        queryset (QuerySet): the records to archive
+        archive_model (Model): the model of the archive table
+        batch_size (int): maximum number of records to move
+
+    Returns:
+        int: the number of archived records
+    """
+    archived_at = timezone.now()
+    with transaction.atomic():
+        records = list(queryset.order_by('pk')[:batch_size])
+        if len(records) == 0:
+            return 0
+        fields = [field.attname for field in archive_model._meta.concrete_fields if field.attname != 'archived_at']
+        archive_model.objects.bulk_create([
+            archive_model(archived_at=archived_at, **{field: getattr(record, field) for field in fields})
+            for record in records
+        ])
+        queryset.model.objects.filter(pk__in=[record.pk for record in records]).delete()
+    logger.debug('%d records were moved to %s', len(records), archive_model._meta.db_table)
+    return len(records)
+
+
+class TicketManager(models.Manager):
+    """ Manager of the Tickets, with the operations applied to many tickets at once """
+
+    def acknowledge(self, alarm_ids, message, user):
+        """
+        Acknowledges all the UNACK and CLEARED_UNACK tickets of a list of alarms with the same message, user and
+        timestamp, with a single set-based update in a transaction
+
+        Args:
+            alarm_ids (list): the IDs of the alarms whose tickets must be acknowledged
+            message (string): the acknowledgement message
+            user (string): the user that acknowledges the tickets
+
+        Returns:
+            set: the IDs of the alarms that had tickets acknowledged
+        """
+        choices = TicketStatus.get_choices_by_name()
+        unack = int(choices['UNACK'])
+        cleared_unack = int(choices['CLEARED_UNACK'])
+        acknowledged_at = timezone.now()
+        try:
+            with transaction.atomic():
+                queryset = self.get_queryset().filter(alarm_id__in=alarm_ids, status__in=[unack, cleared_unack])
+                tickets = list(queryset.values_list('alarm_id', 'status', 'created_at'))
+                ack_alarm_ids = set([alarm_id for (alarm_id, status, created_at) in tickets])
+                count = queryset.update(
+                    status=Case(
+                        When(status=unack, then=Value(int(choices['ACK']))),
+                        default=Value(int(choices['CLEARED_ACK'])),
+                        output_field=models.IntegerField(),
+                    ),
+                    acknowledged_at=acknowledged_at,
+                    message=message,
+                    user=user,
+                )
+                tickets_acknowledged.send(sender=Ticket, tickets=tickets, acknowledged_at=acknowledged_at)
+        except Exception:
+            tickets_write_failed.send(sender=Ticket)
+            raise
+        logger.debug('%d tickets of %d alarms were acknowledged', count, len(ack_alarm_ids))
+        return ack_alarm_ids
+
+    def archive(self, older_than, batch_size):
+        """
+        Moves a batch of the CLEARED_ACK tickets cleared and acknowledged before a given time
+        to the ArchivedTicket table
+
+        Args:
+            older_than (datetime): the tickets cleared and acknowledged before this time are archived
+            batch_size (int): maximum number of tickets to archive
+
+        Returns:
+            int: the number of archived tickets
+        """
+        queryset = self.get_queryset().filter(
+            status=int(TicketStatus.get_choices_by_name()['CLEARED_ACK']),
+            cleared_at__lt=older_than,
+            acknowledged_at__lt=older_than,
+        )
+        count = archive_batch(queryset, ArchivedTicket, batch_size)
+        tickets_archived.send(sender=Ticket, count=count)
+        return count
+
+
 class Ticket(models.Model):
     """ Ticket associated to an alarm that needs to be acknowledged """
 
-    created_at = models.DateTimeField(auto_now_add=True)
-    """ Time when the ticket is created """
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+    """ Time when the ticket is created, it can be set to an earlier time when the ticket is written behind """
 
     acknowledged_at = models.DateTimeField(null=True)
     """ Time when the ticket is updated """
@@ -50,8 +150,8 @@ class Ticket(models.Model):
     cleared_at = models.DateTimeField(null=True)
     """ Time when the associated alarm is cleared """
 
-    alarm_id = models.CharField(max_length=64, db_index=True)
-    """ Reference to the related alarm """
+    alarm_id = models.CharField(max_length=64)
+    """ Reference to the related alarm, indexed with the status """
 
     message = models.CharField(max_length=256, null=True)
     """ Message posted when the ticket is closed """
@@ -65,8 +165,14 @@ class Ticket(models.Model):
     )
     """ State of the ticket, default is open """
 
+    objects = TicketManager()
+
     class Meta:
         default_permissions = ACK_TICKET_PERMISSIONS
+        indexes = [
+            models.Index(fields=['alarm_id', 'status'], name='ticket_alarm_status_idx'),
+            models.Index(fields=['created_at', 'id'], name='ticket_created_idx'),
+        ]
     """ Additional options for the model """
 
     def __str__(self):
@@ -103,6 +209,7 @@ class Ticket(models.Model):
                 self.id)
             return "ignored-wrong-message"
 
+        previous_status = self.status
         if self.status == int(unack):
             self.status = int(ack)
         elif self.status == int(cleared_unack):
@@ -111,6 +218,10 @@ class Ticket(models.Model):
         self.message = message
         self.user = user
         self.save()
+        tickets_acknowledged.send(
+            sender=Ticket, tickets=[(self.alarm_id, previous_status, self.created_at)],
+            acknowledged_at=self.acknowledged_at
+        )
         logger.debug("the ticket %d was acknowledged", self.id)
         return "solved"
 
@@ -123,12 +234,16 @@ class Ticket(models.Model):
         cleared_unack = TicketStatus.get_choices_by_name()['CLEARED_UNACK']
 
         self.cleared_at = timezone.now()
+        previous_status = self.status
         if self.status == int(ack):
             self.status = int(cleared_ack)
         elif self.status == int(unack):
             self.status = int(cleared_unack)
         logger.debug("the ticket %d was cleared", self.id)
         self.save()
+        ticket_status_changed.send(
+            sender=Ticket, alarm_id=self.alarm_id, previous_status=previous_status, status=self.status
+        )
 
     @staticmethod
     def has_read_permission(request):
@@ -161,17 +276,66 @@ class ShelveRegistryStatus(ChoiceEnum):
         return cls.get_choices()
 
 
+class ShelveRegistryManager(models.Manager):
+    """ Manager of the ShelveRegistries, with the operations applied to many registries at once """
+
+    def archive(self, older_than, batch_size):
+        """
+        Moves a batch of the registries unshelved before a given time to the ArchivedShelveRegistry table
+
+        Args:
+            older_than (datetime): the registries unshelved before this time are archived
+            batch_size (int): maximum number of registries to archive
+
+        Returns:
+            int: the number of archived registries
+        """
+        queryset = self.get_queryset().filter(
+            status=int(ShelveRegistryStatus.get_choices_by_name()['UNSHELVED']),
+            unshelved_at__lt=older_than,
+        )
+        return archive_batch(queryset, ArchivedShelveRegistry, batch_size)
+
+    def unshelve_expired(self):
+        """
+        Unshelves the SHELVED registries whose timeout was reached, with a single update in a transaction.
+        Only the expired registries are read, using the index of their expiration time
+
+        Returns:
+            list: the IDs of the alarms of the unshelved registries
+        """
+        now = timezone.now()
+        try:
+            with transaction.atomic():
+                expired = list(self.get_queryset().filter(
+                    status=int(ShelveRegistryStatus.get_choices_by_name()['SHELVED']),
+                    expires_at__lte=now,
+                ).order_by('pk').values_list('pk', 'alarm_id'))
+                self.get_queryset().filter(pk__in=[pk for (pk, alarm_id) in expired]).update(
+                    status=int(ShelveRegistryStatus.get_choices_by_name()['UNSHELVED']),
+                    unshelved_at=now,
+                )
+                registries_unshelved.send(
+                    sender=ShelveRegistry, registries=[(alarm_id, pk) for (pk, alarm_id) in expired]
+                )
+        except Exception:
+            tickets_write_failed.send(sender=ShelveRegistry)
+            raise
+        logger.debug('%d expired registries were unshelved', len(expired))
+        return [alarm_id for (pk, alarm_id) in expired]
+
+
 class ShelveRegistry(models.Model):
     """ Registry of when an alarm is shelved """
 
-    shelved_at = models.DateTimeField(auto_now_add=True)
+    shelved_at = models.DateTimeField(default=timezone.now, editable=False)
     """ Time when the alarm is shelved """
 
     unshelved_at = models.DateTimeField(null=True)
     """ Time when the alarm is unshelved """
 
-    alarm_id = models.CharField(max_length=64, db_index=True)
-    """ Reference to the related alarm """
+    alarm_id = models.CharField(max_length=64)
+    """ Reference to the related alarm, indexed with the status """
 
     message = models.CharField(max_length=256, null=False, blank=False)
     """ Message posted when the ticket is closed """
@@ -179,6 +343,9 @@ class ShelveRegistry(models.Model):
     timeout = models.DurationField(default=timedelta(hours=12))
     """ Timeout after which a shelved Alarm must be unshelved """
 
+    expires_at = models.DateTimeField(null=True, editable=False)
+    """ Time when the timeout is reached, stored to look for the expired registries in the database """
+
     user = models.CharField(max_length=150, null=False, blank=False)
     """ User that shelve the alarm (create) """
 
@@ -188,8 +355,15 @@ class ShelveRegistry(models.Model):
     )
     """ State of the shelve_registry, default is shelved """
 
+    objects = ShelveRegistryManager()
+
     class Meta:
         default_permissions = SHELVE_REGISTRY_PERMISSIONS
+        indexes = [
+            models.Index(fields=['alarm_id', 'status'], name='shelve_alarm_status_idx'),
+            models.Index(fields=['shelved_at', 'id'], name='shelve_shelved_idx'),
+            models.Index(fields=['status', 'expires_at'], name='shelve_expiry_idx'),
+        ]
     """ Additional options for the model """
 
     def __str__(self):
@@ -197,9 +371,10 @@ class ShelveRegistry(models.Model):
         return str(self.shelved_at) + ' - ' + self.alarm_id
 
     def save(self, *args, **kwargs):
-        """ Check if the message is not empty before saving """
+        """ Check if the message is not empty and update the expiration time before saving """
         if not self.message or self.message == '':
             raise ValueError("Registry message cannot be empty")
+        self.expires_at = self.shelved_at + self.timeout
         super().save(*args, **kwargs)
 
     def to_dict(self):
@@ -260,3 +435,128 @@ class ShelveRegistry(models.Model):
     @staticmethod
     def has_check_timeouts_permission(request):
         return True
+
+
+class ArchivedTicket(models.Model):
+    """ Closed ticket moved out of the Ticket table by the retention policy """
+
+    id = models.IntegerField(primary_key=True)
+    """ ID of the ticket in the Ticket table """
+
+    created_at = models.DateTimeField()
+    """ Time when the ticket was created """
+
+    acknowledged_at = models.DateTimeField(null=True)
+    """ Time when the ticket was acknowledged """
+
+    cleared_at = models.DateTimeField(null=True)
+    """ Time when the associated alarm was cleared """
+
+    alarm_id = models.CharField(max_length=64, db_index=True)
+    """ Reference to the related alarm """
+
+    message = models.CharField(max_length=256, null=True)
+    """ Message posted when the ticket was closed """
+
+    user = models.CharField(max_length=150, null=True)
+    """ User that closed the ticket """
+
+    status = models.IntegerField(choices=TicketStatus.options())
+    """ State of the ticket when it was archived """
+
+    archived_at = models.DateTimeField(default=timezone.now)
+    """ Time when the ticket was archived """
+
+    class Meta:
+        default_permissions = ('view',)
+    """ Additional options for the model """
+
+    def __str__(self):
+        """ Return a string representation of the archived ticket """
+        return str(self.created_at) + ' - ' + self.alarm_id
+
+    @staticmethod
+    def has_read_permission(request):
+        return request.user.has_perm('tickets.view_archivedticket')
+
+    def has_object_read_permission(self, request):
+        return request.user.has_perm('tickets.view_archivedticket')
+
+
+class ArchivedShelveRegistry(models.Model):
+    """ Unshelved registry moved out of the ShelveRegistry table by the retention policy """
+
+    id = models.IntegerField(primary_key=True)
+    """ ID of the registry in the ShelveRegistry table """
+
+    shelved_at = models.DateTimeField()
+    """ Time when the alarm was shelved """
+
+    unshelved_at = models.DateTimeField(null=True)
+    """ Time when the alarm was unshelved """
+
+    alarm_id = models.CharField(max_length=64, db_index=True)
+    """ Reference to the related alarm """
+
+    message = models.CharField(max_length=256)
+    """ Message posted when the alarm was shelved """
+
+    timeout = models.DurationField()
+    """ Timeout after which the shelved Alarm had to be unshelved """
+
+    user = models.CharField(max_length=150)
+    """ User that shelved the alarm """
+
+    status = models.IntegerField(choices=ShelveRegistryStatus.options())
+    """ State of the registry when it was archived """
+
+    archived_at = models.DateTimeField(default=timezone.now)
+    """ Time when the registry was archived """
+
+    class Meta:
+        default_permissions = ('view',)
+    """ Additional options for the model """
+
+    def __str__(self):
+        """ Return a string representation of the archived shelve_registry """
+        return str(self.shelved_at) + ' - ' + self.alarm_id
+
+    @staticmethod
+    def has_read_permission(request):
+        return request.user.has_perm('tickets.view_archivedshelveregistry')
+
+    def has_object_read_permission(self, request):
+        return request.user.has_perm('tickets.view_archivedshelveregistry')
+
+
+class TicketStatisticsRollup(models.Model):
+    """ Statistics of the tickets aggregated over a period of time, persisted periodically """
+
+    period_start = models.DateTimeField(unique=True)
+    """ Start of the period of the rollup, the periods last TICKET_STATISTICS_BUCKET_SIZE seconds """
+
+    created = models.IntegerField(default=0)
+    """ Number of tickets created in the period """
+
+    created_by_alarm = models.TextField(default='{}')
+    """ JSON object with the number of tickets created in the period by alarm """
+
+    acknowledged = models.IntegerField(default=0)
+    """ Number of tickets acknowledged in the period """
+
+    acknowledge_seconds = models.FloatField(default=0)
+    """ Sum of the times in seconds from the creation to the acknowledgement of the tickets acknowledged """
+
+    tickets_by_status = models.TextField(default='{}')
+    """ JSON object with the number of tickets by status at the last update of the rollup """
+
+    updated_at = models.DateTimeField(auto_now=True)
+    """ Time of the last update of the rollup """
+
+    class Meta:
+        default_permissions = ('view',)
+    """ Additional options for the model """
+
+    def __str__(self):
+        """ Return a string representation of the rollup """
+        return str(self.period_start) + ' - ' + str(self.created)
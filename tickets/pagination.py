@@ -0,0 +1,154 @@
+import base64
+import json
+from collections import OrderedDict
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+DEFAULT_PAGE_SIZE = 1000
+""" Number of records of each page if the PAGE_SIZE of the REST_FRAMEWORK settings is not defined """
+
+
+class KeysetPagination(BasePagination):
+    """
+    Pagination of the records from the newest to the oldest, using as cursor the values of the (timestamp, id)
+    fields of the last record of the previous page. Each page is retrieved filtering by the cursor on the index of
+    those fields, so its cost does not depend on its depth, and the total number of records is not counted.
+
+    The clients can request a count with the 'count=approximate' query parameter, it is exact up to
+    approximate_count_limit records and it is only a lower bound above that limit.
+    An empty cursor requests the first page, for the views that only paginate when it is requested
+    """
+
+    timestamp_field = None
+    """ Name of the timestamp field used to order the records, the id is used to break the ties """
+
+    page_size = api_settings.PAGE_SIZE or DEFAULT_PAGE_SIZE
+    """ Number of records of each page """
+
+    cursor_query_param = 'cursor'
+    """ Name of the query parameter with the cursor of the page """
+
+    count_query_param = 'count'
+    """ Name of the query parameter used to request the approximate count """
+
+    approximate_count_limit = 10000
+    """ Maximum number of records counted for the approximate count """
+
+    invalid_cursor_message = 'Invalid cursor'
+
+    def is_requested(self, request):
+        """
+        Returns True if the request asks for a page, with a cursor, even empty, or with the count query parameter
+
+        Args:
+            request (Request): the request
+
+        Returns:
+            boolean: True if a page is requested, False if not
+        """
+        return self.cursor_query_param in request.query_params or self.count_query_param in request.query_params
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """
+        Returns the records of the page of the cursor requested, or the first page if there is no cursor
+
+        Args:
+            queryset (QuerySet): the records to paginate
+            request (Request): the request, with the optional cursor and count query parameters
+            view (APIView): the view that paginates the records
+
+        Returns:
+            list: the records of the page
+        """
+        self.base_url = request.build_absolute_uri()
+        queryset = queryset.order_by('-' + self.timestamp_field, '-id')
+        self.count = None
+        if request.query_params.get(self.count_query_param) == 'approximate':
+            self.count = queryset[:self.approximate_count_limit].count()
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            (timestamp, id) = cursor
+            queryset = queryset.filter(
+                Q(**{self.timestamp_field + '__lt': timestamp}) |
+                Q(**{self.timestamp_field: timestamp, 'id__lt': id})
+            )
+        records = list(queryset[:self.page_size + 1])
+        self.has_next = len(records) > self.page_size
+        self.page = records[:self.page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        """ Returns the response with the link to the next page, the optional count and the records of the page """
+        content = [('next', self.get_next_link())]
+        if self.count is not None:
+            content += [
+                ('count', self.count),
+                ('count_is_exact', self.count < self.approximate_count_limit),
+            ]
+        content.append(('results', data))
+        return Response(OrderedDict(content))
+
+    def get_next_link(self):
+        """ Returns the url of the next page, or None if it is the last page """
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        return replace_query_param(
+            self.base_url, self.cursor_query_param,
+            self.encode_cursor(getattr(last, self.timestamp_field), last.id)
+        )
+
+    def encode_cursor(self, timestamp, id):
+        """
+        Encodes the cursor of a position in the records
+
+        Args:
+            timestamp (datetime): the timestamp of the last record of the page
+            id (int): the id of the last record of the page
+
+        Returns:
+            string: the cursor
+        """
+        content = json.dumps([timestamp.isoformat(), id])
+        return base64.urlsafe_b64encode(content.encode('ascii')).decode('ascii')
+
+    def decode_cursor(self, request):
+        """
+        Returns the position of the cursor requested, or None if there is no cursor or it is empty.
+        Raises NotFound if the cursor is not valid
+
+        Args:
+            request (Request): the request, with the optional cursor query parameter
+
+        Returns:
+            tuple: the timestamp and the id of the last record of the previous page
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            (timestamp, id) = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('ascii'))
+            timestamp = parse_datetime(timestamp)
+            id = int(id)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if timestamp is None:
+            raise NotFound(self.invalid_cursor_message)
+        return (timestamp, id)
+
+
+class TicketPagination(KeysetPagination):
+    """ Keyset pagination of the Tickets on (created_at, id) """
+
+    timestamp_field = 'created_at'
+
+
+class ShelveRegistryPagination(KeysetPagination):
+    """ Keyset pagination of the ShelveRegistries on (shelved_at, id) """
+
+    timestamp_field = 'shelved_at'
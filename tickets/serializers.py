@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from tickets.models import Ticket, ShelveRegistry
+from tickets.models import Ticket, ShelveRegistry, ArchivedTicket, ArchivedShelveRegistry
 
 
 class TicketSerializer(serializers.ModelSerializer):
@@ -18,3 +18,21 @@ class ShelveRegistrySerializer(serializers.ModelSerializer):
         """Meta class to map serializer's fields with the model fields."""
         model = ShelveRegistry
         fields = '__all__'
+
+
+class ArchivedTicketSerializer(serializers.ModelSerializer):
+    """Serializer to map the Model instance into JSON format."""
+
+    class Meta:
+        """Meta class to map serializer's fields with the model fields."""
+        model = ArchivedTicket
+        fields = '__all__'
+
+
+class ArchivedShelveRegistrySerializer(serializers.ModelSerializer):
+    """Serializer to map the Model instance into JSON format."""
+
+    class Meta:
+        """Meta class to map serializer's fields with the model fields."""
+        model = ArchivedShelveRegistry
+        fields = '__all__'
@@ -0,0 +1,22 @@
+from django.dispatch import Signal
+
+tickets_created = Signal(providing_args=['tickets'])
+""" Sent when tickets are created, with a list of tuples of (alarm_id, status, created_at) """
+
+tickets_cleared = Signal(providing_args=['alarm_ids'])
+""" Sent when all the UNACK tickets of a list of alarms are changed to CLEARED_UNACK """
+
+tickets_acknowledged = Signal(providing_args=['tickets', 'acknowledged_at'])
+""" Sent when tickets are acknowledged, with a list of tuples of (alarm_id, previous status, created_at) """
+
+ticket_status_changed = Signal(providing_args=['alarm_id', 'previous_status', 'status'])
+""" Sent when the status of a single ticket is changed by other operations """
+
+registries_unshelved = Signal(providing_args=['registries'])
+""" Sent when SHELVED registries are unshelved in bulk, with a list of tuples of (alarm_id, pk) """
+
+tickets_write_failed = Signal(providing_args=[])
+""" Sent when a write of tickets or shelve registries in bulk fails, to discard the states kept in memory """
+
+tickets_archived = Signal(providing_args=['count'])
+""" Sent when CLEARED_ACK tickets are moved to the archive """
@@ -0,0 +1,340 @@
+import json
+import logging
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from django.db import transaction
+from django.db.models import Count
+from django.dispatch import receiver
+from django.utils import timezone
+from ias_webserver.settings import (
+    TICKET_STATISTICS_BUCKET_SIZE,
+    TICKET_STATISTICS_WINDOW,
+    TICKET_STATISTICS_ROLLUP_INTERVAL,
+    TICKET_STATISTICS_BUSIEST_ALARMS,
+)
+from tickets.models import Ticket, TicketStatus, TicketStatisticsRollup
+from tickets.signals import (
+    tickets_created,
+    tickets_cleared,
+    tickets_acknowledged,
+    ticket_status_changed,
+    tickets_archived,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class TicketStatistics:
+    """
+    This class defines the statistics of the tickets, maintained incrementally in memory.
+
+    The aggregates are loaded from the database once and then updated by the signals sent when the tickets are
+    created, cleared, acknowledged and archived, after the transactions are committed. The counts of the tickets
+    created and acknowledged are kept in buckets of TICKET_STATISTICS_BUCKET_SIZE seconds, in order to compute the
+    statistics of the last TICKET_STATISTICS_WINDOW seconds, and the buckets are persisted as TicketStatisticsRollups.
+    A snapshot of the statistics is computed at most every TICKET_STATISTICS_ROLLUP_INTERVAL seconds and served as is
+    """
+
+    lock = threading.RLock()
+    """ Lock used to update the aggregates from different threads """
+
+    loaded = False
+    """ Defines if the aggregates were loaded from the database """
+
+    tickets_by_status = {}
+    """ Dictionary with the number of tickets, indexed by status """
+
+    tickets_by_alarm = {}
+    """ Dictionary with the number of tickets not closed (not CLEARED_ACK) by status, indexed by alarm id """
+
+    buckets = {}
+    """ Dictionary with the 'created' Counter by alarm, the number of 'acknowledged' tickets and the
+    'acknowledge_seconds' of each bucket, indexed by the POSIX timestamp of the start of the bucket """
+
+    dirty_buckets = set()
+    """ Set of the buckets modified since they were persisted """
+
+    snapshot = None
+    """ Dictionary with the statistics computed by the last rollup """
+
+    status_names = TicketStatus.get_choices_by_value()
+    """ Dictionary with the names of the statuses, indexed by value as string """
+
+    closed_status = int(TicketStatus.get_choices_by_name()['CLEARED_ACK'])
+    """ Status of the closed tickets, they are only counted in total """
+
+    @classmethod
+    def reset(self):
+        """ Discards the aggregates, they are loaded again from the database when they are used """
+        with self.lock:
+            self.loaded = False
+            self.tickets_by_status = {}
+            self.tickets_by_alarm = {}
+            self.buckets = {}
+            self.dirty_buckets = set()
+            self.snapshot = None
+
+    @classmethod
+    def load(self):
+        """
+        Loads the number of tickets by status and by alarm with grouped queries,
+        and the buckets of the window from the persisted rollups
+        """
+        with self.lock:
+            self.tickets_by_status = {}
+            self.tickets_by_alarm = {}
+            for row in Ticket.objects.values('status').annotate(count=Count('id')).order_by():
+                self.tickets_by_status[row['status']] = row['count']
+            queryset = Ticket.objects.exclude(status=self.closed_status).values('alarm_id', 'status').annotate(
+                count=Count('id')
+            ).order_by()
+            for row in queryset:
+                self.tickets_by_alarm.setdefault(row['alarm_id'], {})[row['status']] = row['count']
+            self.buckets = {}
+            self.dirty_buckets = set()
+            window_start = timezone.now() - timedelta(seconds=TICKET_STATISTICS_WINDOW)
+            for rollup in TicketStatisticsRollup.objects.filter(period_start__gte=window_start):
+                self.buckets[int(rollup.period_start.timestamp())] = {
+                    'created': Counter(json.loads(rollup.created_by_alarm)),
+                    'acknowledged': rollup.acknowledged,
+                    'acknowledge_seconds': rollup.acknowledge_seconds,
+                }
+            self.loaded = True
+            logger.info('The ticket statistics of %d alarms were loaded', len(self.tickets_by_alarm))
+
+    @classmethod
+    def apply(self, function, *args):
+        """
+        Applies a change to the aggregates. If they were not loaded yet they are loaded from the database,
+        which already contains the change
+
+        Args:
+            function (function): the method that applies the change
+            *args: the arguments of the method
+        """
+        with self.lock:
+            if not self.loaded:
+                self.load()
+                return
+            function(*args)
+
+    @classmethod
+    def apply_on_commit(self, function, *args):
+        """ Applies a change to the aggregates when the current transaction is committed """
+        transaction.on_commit(lambda: self.apply(function, *args))
+
+    @classmethod
+    def record_created(self, tickets):
+        """
+        Counts the tickets created
+
+        Args:
+            tickets (list): list of tuples of (alarm_id, status, created_at) of the tickets
+        """
+        for (alarm_id, status, created_at) in tickets:
+            self._add(alarm_id, status, 1)
+            self._get_bucket(created_at)['created'][alarm_id] += 1
+
+    @classmethod
+    def record_cleared(self, alarm_ids):
+        """
+        Moves the UNACK tickets of a list of alarms to CLEARED_UNACK
+
+        Args:
+            alarm_ids (list): the IDs of the alarms whose UNACK tickets were cleared
+        """
+        unack = int(TicketStatus.get_choices_by_name()['UNACK'])
+        cleared_unack = int(TicketStatus.get_choices_by_name()['CLEARED_UNACK'])
+        for alarm_id in alarm_ids:
+            count = self.tickets_by_alarm.get(alarm_id, {}).get(unack, 0)
+            if count > 0:
+                self._add(alarm_id, unack, -count)
+                self._add(alarm_id, cleared_unack, count)
+
+    @classmethod
+    def record_acknowledged(self, tickets, acknowledged_at):
+        """
+        Moves the tickets acknowledged to ACK or CLEARED_ACK and accumulates the times to acknowledge them
+
+        Args:
+            tickets (list): list of tuples of (alarm_id, previous status, created_at) of the tickets
+            acknowledged_at (datetime): time of the acknowledgement
+        """
+        choices = TicketStatus.get_choices_by_name()
+        bucket = self._get_bucket(acknowledged_at)
+        for (alarm_id, previous_status, created_at) in tickets:
+            status = int(choices['ACK']) if previous_status == int(choices['UNACK']) else int(choices['CLEARED_ACK'])
+            self._add(alarm_id, previous_status, -1)
+            self._add(alarm_id, status, 1)
+            bucket['acknowledged'] += 1
+            bucket['acknowledge_seconds'] += (acknowledged_at - created_at).total_seconds()
+
+    @classmethod
+    def record_status_changed(self, alarm_id, previous_status, status):
+        """ Moves a ticket of an alarm from a status to another """
+        if previous_status != status:
+            self._add(alarm_id, previous_status, -1)
+            self._add(alarm_id, status, 1)
+
+    @classmethod
+    def record_archived(self, count):
+        """ Discounts the closed tickets moved to the archive """
+        self.tickets_by_status[self.closed_status] = self.tickets_by_status.get(self.closed_status, 0) - count
+
+    @classmethod
+    def get_snapshot(self, alarms_views_dict):
+        """
+        Returns the statistics computed by the last rollup, performing a new rollup if they are older than
+        TICKET_STATISTICS_ROLLUP_INTERVAL seconds
+
+        Args:
+            alarms_views_dict (dict): the lists of names of the views, indexed by alarm id, used if a rollup is needed
+
+        Returns:
+            dict: the statistics of the tickets
+        """
+        snapshot = self.snapshot
+        if snapshot is None or \
+                timezone.now() - snapshot['generated_at'] > timedelta(seconds=TICKET_STATISTICS_ROLLUP_INTERVAL):
+            snapshot = self.rollup(alarms_views_dict)
+        return snapshot
+
+    @classmethod
+    def rollup(self, alarms_views_dict):
+        """
+        Computes the snapshot of the statistics from the aggregates and persists the buckets modified since the
+        previous rollup, discarding the buckets out of the window
+
+        Args:
+            alarms_views_dict (dict): the lists of names of the views, indexed by alarm id
+
+        Returns:
+            dict: the statistics of the tickets
+        """
+        now = timezone.now()
+        window_start = int(now.timestamp()) - TICKET_STATISTICS_WINDOW
+        with self.lock:
+            if not self.loaded:
+                self.load()
+            self.buckets = {start: bucket for (start, bucket) in self.buckets.items() if start >= window_start}
+            # The current bucket is always persisted, with the number of tickets by status
+            self._get_bucket(now)
+            tickets_by_status = self._by_status_names(self.tickets_by_status)
+            rollups = [
+                (start, {
+                    'created': sum(self.buckets[start]['created'].values()),
+                    'created_by_alarm': json.dumps(self.buckets[start]['created']),
+                    'acknowledged': self.buckets[start]['acknowledged'],
+                    'acknowledge_seconds': self.buckets[start]['acknowledge_seconds'],
+                })
+                for start in sorted(self.dirty_buckets) if start in self.buckets
+            ]
+            self.dirty_buckets = set()
+            snapshot = self._compute_snapshot(now, alarms_views_dict)
+        with transaction.atomic():
+            for (start, defaults) in rollups:
+                defaults['tickets_by_status'] = json.dumps(tickets_by_status)
+                TicketStatisticsRollup.objects.update_or_create(
+                    period_start=datetime.fromtimestamp(start, tz=timezone.utc), defaults=defaults
+                )
+        self.snapshot = snapshot
+        logger.debug('The ticket statistics were rolled up, %d buckets were persisted', len(rollups))
+        return snapshot
+
+    @classmethod
+    def _compute_snapshot(self, now, alarms_views_dict):
+        """ Computes the statistics from the aggregates, it must be called holding the lock """
+        created = Counter()
+        acknowledged = 0
+        acknowledge_seconds = 0
+        for bucket in self.buckets.values():
+            created.update(bucket['created'])
+            acknowledged += bucket['acknowledged']
+            acknowledge_seconds += bucket['acknowledge_seconds']
+        tickets_by_view = {}
+        for (alarm_id, by_status) in self.tickets_by_alarm.items():
+            for view in alarms_views_dict.get(alarm_id, []):
+                view_counter = tickets_by_view.setdefault(view, Counter())
+                view_counter.update(by_status)
+        return {
+            'generated_at': now,
+            'window_start': now - timedelta(seconds=TICKET_STATISTICS_WINDOW),
+            'tickets_by_status': self._by_status_names(self.tickets_by_status),
+            'tickets_by_alarm': {
+                alarm_id: self._by_status_names(by_status) for (alarm_id, by_status) in self.tickets_by_alarm.items()
+            },
+            'tickets_by_view': {
+                view: self._by_status_names(by_status) for (view, by_status) in tickets_by_view.items()
+            },
+            'tickets_created': sum(created.values()),
+            'tickets_acknowledged': acknowledged,
+            'mean_time_to_acknowledge': acknowledge_seconds / acknowledged if acknowledged > 0 else None,
+            'busiest_alarms': [
+                {'alarm_id': alarm_id, 'tickets': count}
+                for (alarm_id, count) in created.most_common(TICKET_STATISTICS_BUSIEST_ALARMS)
+            ],
+        }
+
+    @classmethod
+    def _by_status_names(self, by_status):
+        """ Returns a dictionary with the counts indexed by the names of the statuses instead of their values """
+        return {self.status_names[str(status)]: count for (status, count) in by_status.items() if count != 0}
+
+    @classmethod
+    def _add(self, alarm_id, status, count):
+        """ Adds a count to the number of tickets of a status and, if they are not closed, to those of the alarm """
+        self.tickets_by_status[status] = self.tickets_by_status.get(status, 0) + count
+        if status == self.closed_status:
+            return
+        by_status = self.tickets_by_alarm.setdefault(alarm_id, {})
+        by_status[status] = by_status.get(status, 0) + count
+        if by_status[status] == 0:
+            del by_status[status]
+            if not by_status:
+                del self.tickets_by_alarm[alarm_id]
+
+    @classmethod
+    def _get_bucket_start(self, timestamp):
+        """ Returns the POSIX timestamp of the start of the bucket of a datetime """
+        seconds = int(timestamp.timestamp())
+        return seconds - seconds % TICKET_STATISTICS_BUCKET_SIZE
+
+    @classmethod
+    def _get_bucket(self, timestamp):
+        """ Returns the bucket of a datetime, creating it if it does not exist, and marks it as modified """
+        start = self._get_bucket_start(timestamp)
+        self.dirty_buckets.add(start)
+        if start not in self.buckets:
+            self.buckets[start] = {'created': Counter(), 'acknowledged': 0, 'acknowledge_seconds': 0}
+        return self.buckets[start]
+
+
+@receiver(tickets_created, sender=Ticket)
+def _count_created_tickets(sender, tickets, **kwargs):
+    """ Counts the tickets created when the transaction is committed """
+    TicketStatistics.apply_on_commit(TicketStatistics.record_created, tickets)
+
+
+@receiver(tickets_cleared, sender=Ticket)
+def _count_cleared_tickets(sender, alarm_ids, **kwargs):
+    """ Counts the tickets cleared when the transaction is committed """
+    TicketStatistics.apply_on_commit(TicketStatistics.record_cleared, alarm_ids)
+
+
+@receiver(tickets_acknowledged, sender=Ticket)
+def _count_acknowledged_tickets(sender, tickets, acknowledged_at, **kwargs):
+    """ Counts the tickets acknowledged when the transaction is committed """
+    TicketStatistics.apply_on_commit(TicketStatistics.record_acknowledged, tickets, acknowledged_at)
+
+
+@receiver(ticket_status_changed, sender=Ticket)
+def _count_ticket_status_change(sender, alarm_id, previous_status, status, **kwargs):
+    """ Counts the change of status of a ticket when the transaction is committed """
+    TicketStatistics.apply_on_commit(TicketStatistics.record_status_changed, alarm_id, previous_status, status)
+
+
+@receiver(tickets_archived, sender=Ticket)
+def _count_archived_tickets(sender, count, **kwargs):
+    """ Discounts the archived tickets when the transaction is committed """
+    TicketStatistics.apply_on_commit(TicketStatistics.record_archived, count)
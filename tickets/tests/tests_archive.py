@@ -0,0 +1,118 @@
+import datetime
+from io import StringIO
+from django.contrib.auth.models import User, Permission
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from freezegun import freeze_time
+from rest_framework import status
+from rest_framework.test import APIClient
+from tickets.models import (
+    Ticket, TicketStatus, ShelveRegistry, ShelveRegistryStatus, ArchivedTicket, ArchivedShelveRegistry
+)
+
+
+class ArchiveTestCase(TestCase):
+    """This class defines the test suite for the archival of the tickets and shelve registries"""
+
+    def setUp(self):
+        """TestCase setup, executed before each test of the TestCase"""
+        self.old_time = timezone.now() - datetime.timedelta(days=100)
+        with freeze_time(self.old_time):
+            self.old_closed_ticket = Ticket.objects.create(alarm_id='alarm_1')
+            self.old_closed_ticket.acknowledge(message='Solved', user='testuser')
+            self.old_closed_ticket.clear()
+            self.old_cleared_unack_ticket = Ticket.objects.create(alarm_id='alarm_1')
+            self.old_cleared_unack_ticket.clear()
+            self.old_unshelved_registry = ShelveRegistry.objects.create(
+                alarm_id='alarm_1', message='Shelved', user='testuser'
+            )
+            self.old_unshelved_registry.unshelve()
+            self.old_shelved_registry = ShelveRegistry.objects.create(
+                alarm_id='alarm_2', message='Shelved', user='testuser'
+            )
+        self.new_closed_ticket = Ticket.objects.create(alarm_id='alarm_2')
+        self.new_closed_ticket.acknowledge(message='Solved', user='testuser')
+        self.new_closed_ticket.clear()
+
+    def test_archive_tickets(self):
+        """ Test that only the closed tickets older than the given time are moved to the archive """
+        # Act:
+        count = Ticket.objects.archive(timezone.now() - datetime.timedelta(days=90), 10)
+        # Assert:
+        self.assertEqual(count, 1, 'Only the old closed ticket should be archived')
+        self.assertFalse(
+            Ticket.objects.filter(pk=self.old_closed_ticket.pk).exists(),
+            'The archived ticket should be removed from the tickets table'
+        )
+        archived_ticket = ArchivedTicket.objects.get(pk=self.old_closed_ticket.pk)
+        self.assertEqual(
+            (archived_ticket.alarm_id, archived_ticket.message, archived_ticket.status, archived_ticket.created_at),
+            ('alarm_1', 'Solved', int(TicketStatus.get_choices_by_name()['CLEARED_ACK']), self.old_time),
+            'The archived ticket should keep the data of the ticket'
+        )
+        self.assertEqual(
+            set(Ticket.objects.values_list('pk', flat=True)),
+            {self.old_cleared_unack_ticket.pk, self.new_closed_ticket.pk},
+            'The tickets not closed or closed recently should not be archived'
+        )
+
+    def test_archive_shelve_registries(self):
+        """ Test that only the registries unshelved before the given time are moved to the archive """
+        # Act:
+        count = ShelveRegistry.objects.archive(timezone.now() - datetime.timedelta(days=90), 10)
+        # Assert:
+        self.assertEqual(count, 1, 'Only the old unshelved registry should be archived')
+        archived_registry = ArchivedShelveRegistry.objects.get(pk=self.old_unshelved_registry.pk)
+        self.assertEqual(
+            archived_registry.status, int(ShelveRegistryStatus.get_choices_by_name()['UNSHELVED']),
+            'The archived registry should keep the data of the registry'
+        )
+        self.assertEqual(
+            list(ShelveRegistry.objects.values_list('pk', flat=True)), [self.old_shelved_registry.pk],
+            'The shelved registries should not be archived'
+        )
+
+    def test_archive_command_in_batches(self):
+        """ Test that the command archives all the records older than the retention periods in batches """
+        # Arrange:
+        with freeze_time(self.old_time):
+            for i in range(4):
+                ticket = Ticket.objects.create(alarm_id='alarm_3')
+                ticket.acknowledge(message='Solved', user='testuser')
+                ticket.clear()
+        out = StringIO()
+        # Act:
+        call_command(
+            'archivetickets', '--tickets-days', '90', '--registries-days', '90', '--batch-size', '2',
+            '--pause', '0', stdout=out
+        )
+        # Assert:
+        self.assertEqual(ArchivedTicket.objects.count(), 5, 'All the old closed tickets should be archived')
+        self.assertEqual(ArchivedShelveRegistry.objects.count(), 1, 'The old unshelved registry should be archived')
+        self.assertIn('5 tickets', out.getvalue(), 'The number of archived tickets should be printed')
+
+    def test_api_can_list_archived_tickets(self):
+        """ Test that the archived tickets can be retrieved by the users with permission to view them """
+        # Arrange:
+        Ticket.objects.archive(timezone.now() - datetime.timedelta(days=90), 10)
+        user = User.objects.create_user('user', password='123', email='user@user.cl')
+        client = APIClient()
+        client.force_authenticate(user=user)
+        url = reverse('archivedticket-filters')
+        # Act:
+        forbidden_response = client.get(url, {'alarm_id': 'alarm_1'}, format='json')
+        user.user_permissions.add(Permission.objects.get(codename='view_archivedticket'))
+        client.force_authenticate(user=User.objects.get(pk=user.pk))
+        response = client.get(url, {'alarm_id': 'alarm_1'}, format='json')
+        # Assert:
+        self.assertEqual(
+            forbidden_response.status_code, status.HTTP_403_FORBIDDEN,
+            'The request should not be allowed without permission'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK, 'The request should be allowed with permission')
+        self.assertEqual(
+            [ticket['id'] for ticket in response.data], [self.old_closed_ticket.pk],
+            'The archived tickets of the alarm should be retrieved'
+        )
@@ -0,0 +1,90 @@
+import csv
+import datetime
+import io
+import json
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from freezegun import freeze_time
+from rest_framework import status
+from rest_framework.test import APIClient
+from tickets.models import Ticket, TicketStatus, ShelveRegistry
+
+
+class ExportTestCase(TestCase):
+    """This class defines the test suite for the streaming export of the tickets and shelve registries"""
+
+    def setUp(self):
+        """TestCase setup, executed before each test of the TestCase"""
+        self.client = APIClient()
+        self.client.force_authenticate(user=User.objects.create_superuser('admin', 'admin@alma.cl', '123'))
+        self.now = timezone.now()
+        with freeze_time(self.now - datetime.timedelta(days=2)):
+            self.old_ticket = Ticket.objects.create(alarm_id='alarm_1')
+        self.tickets = [Ticket.objects.create(alarm_id='alarm_{}'.format(i % 2)) for i in range(3)]
+        self.tickets[0].acknowledge(message='Solved', user='testuser')
+
+    def _get_content(self, response):
+        """ Returns the content of a streaming response as a string """
+        self.assertTrue(response.streaming, 'The response should be streamed')
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def test_export_tickets_as_ndjson(self):
+        """ Test that the tickets are exported as a JSON object by line, filtered and ordered by creation time """
+        # Act:
+        response = self.client.get(
+            reverse('ticket-export'), {'since': (self.now - datetime.timedelta(days=1)).isoformat()}
+        )
+        # Assert:
+        self.assertEqual(response.status_code, status.HTTP_200_OK, 'The tickets should be exported')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson', 'The content type should be NDJSON')
+        records = [json.loads(line) for line in self._get_content(response).splitlines()]
+        self.assertEqual(
+            [record['id'] for record in records], [ticket.pk for ticket in self.tickets],
+            'Only the tickets created in the time range should be exported, in order of creation'
+        )
+        self.assertEqual(
+            (records[0]['message'], records[0]['status']), ('Solved', int(TicketStatus.get_choices_by_name()['ACK'])),
+            'The values of the tickets should be exported'
+        )
+
+    def test_export_tickets_as_csv(self):
+        """ Test that the tickets are exported as csv, filtered by alarm and status """
+        # Act:
+        response = self.client.get(reverse('ticket-export'), {
+            'output': 'csv', 'alarm_id': 'alarm_1', 'status': int(TicketStatus.get_choices_by_name()['UNACK'])
+        })
+        # Assert:
+        self.assertEqual(response['Content-Type'], 'text/csv', 'The content type should be csv')
+        rows = list(csv.DictReader(io.StringIO(self._get_content(response))))
+        self.assertEqual(
+            [int(row['id']) for row in rows], [self.old_ticket.pk, self.tickets[1].pk],
+            'Only the tickets of the alarm with the status should be exported'
+        )
+
+    def test_export_shelve_registries(self):
+        """ Test that the shelve registries are exported """
+        # Arrange:
+        registry = ShelveRegistry.objects.create(alarm_id='alarm_1', message='Shelved', user='testuser')
+        # Act:
+        response = self.client.get(reverse('shelveregistry-export'), {'output': 'csv'})
+        # Assert:
+        rows = list(csv.DictReader(io.StringIO(self._get_content(response))))
+        self.assertEqual(
+            [(int(row['id']), row['timeout']) for row in rows], [(registry.pk, '12:00:00')],
+            'The registries should be exported'
+        )
+
+    def test_invalid_parameters(self):
+        """ Test that the export is rejected if the output or the time range are not valid """
+        # Act:
+        invalid_output_response = self.client.get(reverse('ticket-export'), {'output': 'xml'})
+        invalid_since_response = self.client.get(reverse('ticket-export'), {'since': 'yesterday'})
+        # Assert:
+        self.assertEqual(
+            invalid_output_response.status_code, status.HTTP_400_BAD_REQUEST, 'The invalid output should be rejected'
+        )
+        self.assertEqual(
+            invalid_since_response.status_code, status.HTTP_400_BAD_REQUEST, 'The invalid time should be rejected'
+        )
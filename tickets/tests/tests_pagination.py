@@ -0,0 +1,131 @@
+import datetime
+import mock
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+from tickets.models import Ticket, ShelveRegistry
+from tickets.pagination import TicketPagination, ShelveRegistryPagination
+from tickets.views import TicketViewSet, ShelveRegistryViewSet
+
+
+@mock.patch.object(TicketViewSet, 'pagination_class', TicketPagination)
+@mock.patch.object(ShelveRegistryViewSet, 'pagination_class', ShelveRegistryPagination)
+@mock.patch.object(TicketPagination, 'page_size', 2)
+@mock.patch.object(ShelveRegistryPagination, 'page_size', 2)
+class KeysetPaginationTestCase(TestCase):
+    """This class defines the test suite for the keyset pagination of the tickets and shelve registries"""
+
+    def setUp(self):
+        """TestCase setup, executed before each test of the TestCase"""
+        self.client = APIClient()
+        self.client.force_authenticate(user=User.objects.create_superuser('admin', 'admin@alma.cl', '123'))
+        created_at = timezone.now()
+        # Some tickets share the same creation time, as the tickets written in the same batch
+        Ticket.objects.bulk_create([
+            Ticket(alarm_id='alarm_{}'.format(i % 2), created_at=created_at - datetime.timedelta(seconds=i // 2))
+            for i in range(5)
+        ])
+        self.expected_ids = list(Ticket.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+
+    def _get_all_pages(self, url, params):
+        """ Retrieves all the pages following the next links and returns the ids of the records and the responses """
+        ids = []
+        responses = []
+        while url is not None:
+            response = self.client.get(url, params, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK, 'The page should be retrieved')
+            responses.append(response)
+            ids += [record['id'] for record in response.data['results']]
+            url = response.data['next']
+            params = {}
+        return (ids, responses)
+
+    def test_list_tickets_by_pages(self):
+        """ Test that all the tickets are listed once, from the newest to the oldest, following the next links """
+        # Act:
+        (ids, responses) = self._get_all_pages(reverse('ticket-list'), {})
+        # Assert:
+        self.assertEqual(ids, self.expected_ids, 'All the tickets should be listed once, in order')
+        self.assertEqual(len(responses), 3, 'The tickets should be listed in pages of 2 tickets')
+        self.assertNotIn('count', responses[0].data, 'The tickets should not be counted if it is not requested')
+
+    def test_filter_tickets_by_pages(self):
+        """ Test that the tickets retrieved by the filters action are paginated when the first page is requested """
+        # Act:
+        (ids, responses) = self._get_all_pages(reverse('ticket-filters'), {'alarm_id': 'alarm_0', 'cursor': ''})
+        # Assert:
+        self.assertEqual(
+            ids, [id for id in self.expected_ids if Ticket.objects.get(pk=id).alarm_id == 'alarm_0'],
+            'All the filtered tickets should be listed once, in order'
+        )
+        self.assertEqual(len(responses), 2, 'The filtered tickets should be listed in pages of 2 tickets')
+        self.assertEqual(
+            list(responses[0].data.keys()), ['next', 'results'], 'The page should have the next link and the results'
+        )
+
+    def test_filter_tickets_without_pages(self):
+        """ Test that the filters action retrieves the list of tickets if a page is not requested """
+        # Act:
+        response = self.client.get(reverse('ticket-filters'), {'alarm_id': 'alarm_0'}, format='json')
+        # Assert:
+        self.assertEqual(response.status_code, status.HTTP_200_OK, 'The tickets should be retrieved')
+        self.assertEqual(
+            sorted([record['id'] for record in response.data]),
+            sorted(Ticket.objects.filter(alarm_id='alarm_0').values_list('id', flat=True)),
+            'The filtered tickets should be retrieved in a list'
+        )
+
+    def test_approximate_count(self):
+        """ Test that the tickets are counted up to a limit when the count is requested """
+        # Act:
+        response = self.client.get(reverse('ticket-list'), {'count': 'approximate'}, format='json')
+        with mock.patch.object(TicketPagination, 'approximate_count_limit', 3):
+            limited_response = self.client.get(reverse('ticket-list'), {'count': 'approximate'}, format='json')
+        # Assert:
+        self.assertEqual(
+            (response.data['count'], response.data['count_is_exact']), (5, True),
+            'The count should be exact under the limit'
+        )
+        self.assertEqual(
+            (limited_response.data['count'], limited_response.data['count_is_exact']), (3, False),
+            'The count should be the limit if there are more records'
+        )
+
+    def test_invalid_cursor(self):
+        """ Test that an invalid cursor is rejected """
+        # Act:
+        response = self.client.get(reverse('ticket-list'), {'cursor': 'invalid'}, format='json')
+        # Assert:
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND, 'The invalid cursor should be rejected')
+
+    def test_list_shelve_registries_by_pages(self):
+        """ Test that all the shelve registries are listed once, from the newest to the oldest """
+        # Arrange:
+        for i in range(3):
+            ShelveRegistry.objects.create(alarm_id='alarm_{}'.format(i), message='Shelved', user='testuser')
+        expected_ids = list(ShelveRegistry.objects.order_by('-shelved_at', '-id').values_list('id', flat=True))
+        # Act:
+        (ids, responses) = self._get_all_pages(reverse('shelveregistry-list'), {})
+        # Assert:
+        self.assertEqual(ids, expected_ids, 'All the registries should be listed once, in order')
+        self.assertEqual(len(responses), 2, 'The registries should be listed in pages of 2 registries')
+
+    def test_filter_shelve_registries_by_pages(self):
+        """ Test that the shelve registries retrieved by the filters action are paginated when a count is requested """
+        # Arrange:
+        for i in range(3):
+            ShelveRegistry.objects.create(alarm_id='alarm_{}'.format(i), message='Shelved', user='testuser')
+        expected_ids = list(ShelveRegistry.objects.order_by('-shelved_at', '-id').values_list('id', flat=True))
+        # Act:
+        response = self.client.get(reverse('shelveregistry-filters'), {'count': 'approximate'}, format='json')
+        (ids, responses) = self._get_all_pages(reverse('shelveregistry-filters'), {'cursor': ''})
+        # Assert:
+        self.assertEqual(
+            list(response.data.keys()), ['next', 'count', 'count_is_exact', 'results'],
+            'The page should have the next link, the count and the results'
+        )
+        self.assertEqual(response.data['count'], 3, 'The registries should be counted')
+        self.assertEqual(ids, expected_ids, 'All the registries should be listed once, in order')
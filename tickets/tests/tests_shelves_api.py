@@ -831,9 +831,10 @@ class CreateRegistry(APITestBase, ShelveRegistryTestSetup, TestCase):
         data = self.new_reg_data
         return client.post(url, data, format='json')
 
+    @mock.patch('tickets.connectors.AlarmConnector.schedule_unshelve')
     @mock.patch('tickets.connectors.AlarmConnector.shelve_alarm')
-    def test_api_can_create_registry(self, AlarmConnector_shelve_alarm):
-        """ Test that the api can create a registry """
+    def test_api_can_create_registry(self, AlarmConnector_shelve_alarm, AlarmConnector_schedule_unshelve):
+        """ Test that the api can create a registry and schedule its unshelving """
         # Arrange
         AlarmConnector_shelve_alarm.return_value = 1
         # Act:
@@ -868,6 +869,9 @@ class CreateRegistry(APITestBase, ShelveRegistryTestSetup, TestCase):
             AlarmConnector_shelve_alarm.called,
             'The alarm connector shelve method should have been called'
         )
+        AlarmConnector_schedule_unshelve.assert_called_with(
+            created_reg.alarm_id, created_reg.shelved_at + created_reg.timeout
+        )
 
     def test_api_cannot_allow_request_for_unauthenticated_user(self):
         """ The request should not be allowed for an unauthenticated user """
@@ -87,3 +87,37 @@ class ShelveRegistryModelsTestCase(TestCase):
             response, 'unshelved',
             'Valid resolution is not unshelved correctly'
         )
+
+    def test_unshelve_expired_registries(self):
+        """ Test that the expired registries are unshelved with a single update and their alarm ids are returned """
+        # Arrange:
+        shelving_time = timezone.now()
+        with freeze_time(shelving_time):
+            expired = ShelveRegistry.objects.create(
+                alarm_id='alarm_1', message=self.message, user=self.user, timeout=timedelta(hours=1)
+            )
+            not_expired = ShelveRegistry.objects.create(
+                alarm_id='alarm_2', message=self.message, user=self.user, timeout=timedelta(hours=3)
+            )
+        checking_time = shelving_time + timedelta(hours=2)
+        # Act:
+        with freeze_time(checking_time):
+            with self.assertNumQueries(4):  # savepoint, select, update and release of the savepoint
+                alarm_ids = ShelveRegistry.objects.unshelve_expired()
+        # Assert:
+        self.assertEqual(alarm_ids, ['alarm_1'], 'Only the expired registry should be unshelved')
+        expired.refresh_from_db()
+        not_expired.refresh_from_db()
+        self.assertEqual(
+            (expired.status, expired.unshelved_at),
+            (int(ShelveRegistryStatus.get_choices_by_name()['UNSHELVED']), checking_time),
+            'The expired registry should be unshelved at the checking time'
+        )
+        self.assertEqual(
+            not_expired.status, int(ShelveRegistryStatus.get_choices_by_name()['SHELVED']),
+            'The registry that has not expired should remain shelved'
+        )
+        self.assertEqual(
+            not_expired.expires_at, shelving_time + timedelta(hours=3),
+            'The expiration time should be stored when the registry is created'
+        )
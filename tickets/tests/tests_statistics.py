@@ -0,0 +1,108 @@
+import datetime
+import mock
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from freezegun import freeze_time
+from rest_framework import status
+from rest_framework.test import APIClient
+from alarms.connectors import TicketConnector
+from tickets.models import Ticket, TicketStatisticsRollup
+from tickets.statistics import TicketStatistics
+
+
+class TicketStatisticsTestCase(TransactionTestCase):
+    """This class defines the test suite for the statistics of the tickets.
+    It uses transactions because the statistics are updated when the transactions are committed"""
+
+    def setUp(self):
+        """TestCase setup, executed before each test of the TestCase"""
+        TicketStatistics.reset()
+        Ticket.objects.create(alarm_id='alarm_1')
+        closed_ticket = Ticket.objects.create(alarm_id='alarm_2')
+        closed_ticket.acknowledge(message='Solved', user='testuser')
+        closed_ticket.clear()
+        TicketStatistics.load()
+
+    def test_statistics_are_maintained_incrementally(self):
+        """ Test that the statistics are updated by the changes of the tickets without querying the database """
+        # Arrange:
+        created_at = timezone.now()
+        acknowledged_at = created_at + datetime.timedelta(minutes=10)
+        # Act:
+        with freeze_time(created_at):
+            TicketConnector.create_tickets(['alarm_1', 'alarm_3'])
+            TicketConnector.clear_tickets(['alarm_1'])
+        with freeze_time(acknowledged_at):
+            Ticket.objects.acknowledge(['alarm_1', 'alarm_3'], 'Acknowledged', 'testuser')
+        with CaptureQueriesContext(connection) as context:
+            snapshot = TicketStatistics.rollup({'alarm_3': ['view_1']})
+        # Assert:
+        self.assertEqual(
+            snapshot['tickets_by_status'], {'CLEARED_ACK': 3, 'ACK': 1},
+            'The number of tickets by status should be updated'
+        )
+        self.assertEqual(
+            snapshot['tickets_by_alarm'], {'alarm_3': {'ACK': 1}},
+            'Only the alarms with tickets that are not closed should be counted'
+        )
+        self.assertEqual(
+            snapshot['tickets_by_view'], {'view_1': {'ACK': 1}}, 'The tickets should be counted by view'
+        )
+        self.assertEqual(snapshot['tickets_acknowledged'], 3, 'The acknowledged tickets should be counted')
+        self.assertAlmostEqual(
+            snapshot['mean_time_to_acknowledge'], 600, delta=1,
+            msg='The mean time to acknowledge should be computed from the tickets acknowledged'
+        )
+        self.assertFalse(
+            [query for query in context.captured_queries if '"tickets_ticket"' in query['sql']],
+            'The tickets should not be queried to compute the statistics'
+        )
+        TicketStatistics.load()
+        self.assertEqual(
+            TicketStatistics.tickets_by_status, {3: 3, 1: 1},
+            'The statistics should be consistent with the database'
+        )
+
+    def test_rollups_are_persisted_and_loaded(self):
+        """ Test that the buckets are persisted by the rollups and restored when the statistics are loaded """
+        # Arrange:
+        TicketConnector.create_tickets(['alarm_1', 'alarm_3', 'alarm_3'])
+        TicketStatistics.rollup({})
+        # Act:
+        TicketStatistics.reset()
+        snapshot = TicketStatistics.rollup({})
+        # Assert:
+        self.assertEqual(TicketStatisticsRollup.objects.count(), 1, 'The rollup of the bucket should be persisted')
+        self.assertEqual(snapshot['tickets_created'], 3, 'The tickets created in the window should be restored')
+        self.assertEqual(
+            snapshot['busiest_alarms'], [{'alarm_id': 'alarm_3', 'tickets': 2}, {'alarm_id': 'alarm_1', 'tickets': 1}],
+            'The alarms should be ordered by the number of tickets created in the window'
+        )
+
+    @mock.patch('tickets.connectors.AlarmConnector.get_alarms_views_dict', return_value={})
+    def test_api_serves_the_last_snapshot(self, get_alarms_views_dict):
+        """ Test that the api serves the snapshot of the last rollup until it is older than the rollup interval """
+        # Arrange:
+        client = APIClient()
+        client.force_authenticate(user=User.objects.create_superuser('admin', 'admin@alma.cl', '123'))
+        url = reverse('ticket-statistics')
+        first_response = client.get(url, format='json')
+        TicketConnector.create_tickets(['alarm_1'])
+        # Act:
+        with self.assertNumQueries(0):
+            cached_response = client.get(url, format='json')
+        with freeze_time(timezone.now() + datetime.timedelta(hours=1)):
+            new_response = client.get(url, format='json')
+        # Assert:
+        self.assertEqual(first_response.status_code, status.HTTP_200_OK, 'The statistics should be retrieved')
+        self.assertEqual(
+            cached_response.data, first_response.data, 'The last snapshot should be served until it is old'
+        )
+        self.assertEqual(
+            new_response.data['tickets_by_status'], {'UNACK': 2, 'CLEARED_ACK': 1},
+            'A new snapshot should be computed when the last one is old'
+        )
@@ -1,5 +1,7 @@
 import mock
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.contrib.auth.models import User, Permission
 from django.contrib.contenttypes.models import ContentType
@@ -496,6 +498,37 @@ class RetrieveOldOpenTickets(
             'The retrieved information did not match with the expected one'
         )
 
+    @mock.patch('tickets.connectors.AlarmConnector.get_alarm_dependencies')
+    def test_api_retrieves_old_open_tickets_information_with_a_single_query(
+        self,
+        AlarmConnector_get_alarm_dependencies
+    ):
+        """Test that the api retrieves the cleared unack tickets of all the
+        dependencies of an alarm with a single query"""
+        # Arrange:
+        dependencies = ['alarm_dependency_{}'.format(i) for i in range(50)]
+        for alarm_id in dependencies:
+            ticket = Ticket.objects.create(alarm_id=alarm_id)
+            ticket.clear()
+        AlarmConnector_get_alarm_dependencies.return_value = ['alarm_1'] + dependencies
+        client = self.authenticated_authorized_client
+        # Act:
+        with CaptureQueriesContext(connection) as context:
+            self.response = self.target_request_from_client(client)
+        # Assert:
+        self.assertEqual(
+            len([q for q in context.captured_queries if 'tickets_ticket' in q['sql']]), 1,
+            'The tickets of all the dependencies should be retrieved with a single query'
+        )
+        self.assertEqual(
+            self.response.data['alarm_1'], [self.ticket_cleared_unack.pk],
+            'The tickets of the alarm should be retrieved'
+        )
+        self.assertEqual(
+            [len(self.response.data[alarm_id]) for alarm_id in dependencies], [1] * len(dependencies),
+            'The tickets of each dependency should be retrieved'
+        )
+
     def test_api_cannot_allow_request_for_unauthenticated_user(self):
         """ The request should not be allowed for an unauthenticated user """
         client = self.unauthenticated_client
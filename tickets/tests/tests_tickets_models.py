@@ -81,3 +81,41 @@ class TicketsModelsTestCase(TestCase):
             retrieved_ticket.user, 'testuser',
             'The user saved is not the expected one'
         )
+
+    def test_acknowledge_tickets_in_bulk(self):
+        """ Test that the tickets of many alarms are acknowledged with a single update """
+        # Arrange:
+        alarm_ids = ['alarm_{}'.format(i) for i in range(100)]
+        Ticket.objects.bulk_create([Ticket(alarm_id=alarm_id) for alarm_id in alarm_ids])
+        cleared_ticket = Ticket.objects.create(alarm_id='alarm_0')
+        cleared_ticket.clear()
+        acknowledged_ticket = Ticket.objects.create(alarm_id='alarm_1')
+        acknowledged_ticket.acknowledge(message='Previous message', user='previoususer')
+        other_ticket = Ticket.objects.create(alarm_id='other_alarm')
+        resolution_dt = timezone.now()
+        # Act:
+        with freeze_time(resolution_dt):
+            with self.assertNumQueries(4):  # savepoint, select of the alarm ids, update and release of the savepoint
+                response = Ticket.objects.acknowledge(alarm_ids + ['alarm_without_tickets'], 'Solved', 'testuser')
+        # Assert:
+        self.assertEqual(response, set(alarm_ids), 'The alarms with acknowledged tickets should be returned')
+        self.assertEqual(
+            Ticket.objects.filter(
+                alarm_id__in=alarm_ids, status=int(TicketStatus.get_choices_by_name()['ACK']),
+                acknowledged_at=resolution_dt, message='Solved', user='testuser'
+            ).count(),
+            len(alarm_ids),
+            'The open tickets should be acknowledged with the same message, user and timestamp'
+        )
+        self.assertEqual(
+            Ticket.objects.get(pk=cleared_ticket.pk).status, int(TicketStatus.get_choices_by_name()['CLEARED_ACK']),
+            'The cleared tickets should be acknowledged as cleared'
+        )
+        self.assertEqual(
+            Ticket.objects.get(pk=acknowledged_ticket.pk).message, 'Previous message',
+            'The acknowledged tickets should not be changed'
+        )
+        self.assertEqual(
+            Ticket.objects.get(pk=other_ticket.pk).status, int(TicketStatus.get_choices_by_name()['UNACK']),
+            'The tickets of other alarms should not be acknowledged'
+        )
@@ -1,8 +1,15 @@
 from rest_framework.routers import DefaultRouter
-from tickets.views import TicketViewSet, ShelveRegistryViewSet
+from tickets.views import (
+    TicketViewSet,
+    ShelveRegistryViewSet,
+    ArchivedTicketViewSet,
+    ArchivedShelveRegistryViewSet,
+)
 
 
 router = DefaultRouter()
 router.register('tickets', TicketViewSet)
 router.register('shelve-registries', ShelveRegistryViewSet)
+router.register('archived-tickets', ArchivedTicketViewSet)
+router.register('archived-shelve-registries', ArchivedShelveRegistryViewSet)
 urlpatterns = router.urls
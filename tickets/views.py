@@ -2,17 +2,24 @@ import logging
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from dry_rest_permissions.generics import DRYPermissions
-from django.utils import timezone
 from tickets.connectors import AlarmConnector
 from tickets.models import (
     Ticket, TicketStatus,
     ShelveRegistry,
-    ShelveRegistryStatus
+    ShelveRegistryStatus,
+    ArchivedTicket,
+    ArchivedShelveRegistry,
 )
+from tickets.export import NDJSON, filter_export_queryset, export_response
+from tickets.pagination import TicketPagination, ShelveRegistryPagination
+from tickets.statistics import TicketStatistics
 from tickets.serializers import (
     TicketSerializer,
     ShelveRegistrySerializer,
+    ArchivedTicketSerializer,
+    ArchivedShelveRegistrySerializer,
 )
 
 logger = logging.getLogger(__name__)
@@ -23,10 +30,13 @@ class TicketViewSet(viewsets.ModelViewSet):
     queryset = Ticket.objects.all()
     serializer_class = TicketSerializer
     permission_classes = (DRYPermissions,)
+    # The keyset pagination replaces the default pagination, if it is enabled
+    pagination_class = TicketPagination if api_settings.DEFAULT_PAGINATION_CLASS else None
+    export_fields = ['id', 'created_at', 'acknowledged_at', 'cleared_at', 'alarm_id', 'message', 'user', 'status']
 
     @action(detail=False)
     def filters(self, request):
-        """ Retrieve the list of tickets filtered by alarm and status """
+        """ Retrieve the list of tickets filtered by alarm and status, or a page if a cursor or count is requested """
         alarm_id = self.request.query_params.get('alarm_id', None)
         status = self.request.query_params.get('status', None)
         queryset = Ticket.objects.all()
@@ -34,9 +44,20 @@ class TicketViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(alarm_id=alarm_id)
         if status:
             queryset = queryset.filter(status=status)
+        # The list is kept for the clients that do not request a page with a cursor or a count
+        if self.paginator is not None and self.paginator.is_requested(request):
+            page = self.paginate_queryset(queryset)
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
+    @action(detail=False)
+    def export(self, request):
+        """ Stream the tickets filtered by creation time range, alarm and status, as NDJSON or CSV """
+        queryset = filter_export_queryset(Ticket.objects.all(), request, 'created_at')
+        output = self.request.query_params.get('output', NDJSON)
+        return export_response(queryset, self.export_fields, output, 'tickets')
+
     @action(detail=False)
     def old_open_info(self, request):
         """ Retrieve a dictionary with information of the open tickets related
@@ -45,15 +66,22 @@ class TicketViewSet(viewsets.ModelViewSet):
         data = {}
         if(alarm_id):
             all_alarms_ids = AlarmConnector.get_alarm_dependencies(alarm_id)
-            for alarm_id in all_alarms_ids:
-                queryset = Ticket.objects.filter(
-                    alarm_id=alarm_id,
-                    status=TicketStatus.get_choices_by_name()['CLEARED_UNACK']
-                )
-                data[alarm_id] = [ticket.pk for ticket in queryset]
+            data = {id: [] for id in all_alarms_ids}
+            # The tickets of all the dependencies are retrieved with a single query and grouped by alarm
+            tickets = Ticket.objects.filter(
+                alarm_id__in=data.keys(),
+                status=int(TicketStatus.get_choices_by_name()['CLEARED_UNACK'])
+            ).order_by('pk').values_list('alarm_id', 'pk')
+            for (ticket_alarm_id, pk) in tickets:
+                data[ticket_alarm_id].append(pk)
 
         return Response(data)
 
+    @action(detail=False)
+    def statistics(self, request):
+        """ Retrieve the statistics of the tickets, maintained incrementally and rolled up periodically """
+        return Response(TicketStatistics.get_snapshot(AlarmConnector.get_alarms_views_dict()))
+
     @action(methods=['put'], detail=False)
     def acknowledge(self, request):
         """ Acknowledge multiple tickets with the same message and timestamp"""
@@ -69,37 +97,8 @@ class TicketViewSet(viewsets.ModelViewSet):
             )
 
         ack_alarms_ids = AlarmConnector.acknowledge_alarms(alarms_ids)
-        queryset = Ticket.objects.filter(alarm_id__in=ack_alarms_ids)
-
-        # possible unack states
-        unack = TicketStatus.get_choices_by_name()['UNACK']
-        cleared_unack = TicketStatus.get_choices_by_name()['CLEARED_UNACK']
-
-        queryset = queryset.filter(
-            status__in=[int(unack), int(cleared_unack)]
-        )
-
-        return self._apply_acknowledgement(message, user, list(queryset))
-
-    def _apply_acknowledgement(self, message, user, tickets):
-        """ Applies the acknowledgement to a single or multiple tickets """
-        # Acknowledge each ticket:
-        ack_alarms = set()
-        for ticket in tickets:
-            response = ticket.acknowledge(message=message, user=user)
-            if response == 'solved':
-                ack_alarms.add(ticket.alarm_id)
-            else:
-                logger.error(
-                    'Unexpected response from a ticket acknowledgement: %s',
-                    response
-                )
-                return Response(
-                    'Unexpected response from a ticket acknowledgement',
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
-                )
-                # TODO: Reset AlarmCollection (?)
-        return Response(list(ack_alarms), status=status.HTTP_200_OK)
+        acknowledged_alarms_ids = Ticket.objects.acknowledge(ack_alarms_ids, message, user)
+        return Response(list(acknowledged_alarms_ids), status=status.HTTP_200_OK)
 
 
 class ShelveRegistryViewSet(viewsets.ModelViewSet):
@@ -107,6 +106,9 @@ class ShelveRegistryViewSet(viewsets.ModelViewSet):
     queryset = ShelveRegistry.objects.all()
     serializer_class = ShelveRegistrySerializer
     permission_classes = (DRYPermissions,)
+    # The keyset pagination replaces the default pagination, if it is enabled
+    pagination_class = ShelveRegistryPagination if api_settings.DEFAULT_PAGINATION_CLASS else None
+    export_fields = ['id', 'shelved_at', 'unshelved_at', 'alarm_id', 'message', 'timeout', 'user', 'status']
 
     def create(self, request, *args, **kwargs):
         """ Redefine create method in order to notify to the alarms app """
@@ -130,6 +132,11 @@ class ShelveRegistryViewSet(viewsets.ModelViewSet):
             AlarmConnector.unshelve_alarms([alarm_id])
         return response
 
+    def perform_create(self, serializer):
+        """ Save the registry and schedule the unshelving of the alarm when its timeout is reached """
+        registry = serializer.save()
+        AlarmConnector.schedule_unshelve(registry.alarm_id, registry.expires_at)
+
     @action(detail=False)
     def filters(self, request):
         """ Retrieve the list of tickets filtered by alarm and status """
@@ -140,9 +147,20 @@ class ShelveRegistryViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(alarm_id=alarm_id)
         if status:
             queryset = queryset.filter(status=status)
+        # The list is kept for the clients that do not request a page with a cursor or a count
+        if self.paginator is not None and self.paginator.is_requested(request):
+            page = self.paginate_queryset(queryset)
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
+    @action(detail=False)
+    def export(self, request):
+        """ Stream the registries filtered by shelving time range, alarm and status, as NDJSON or CSV """
+        queryset = filter_export_queryset(ShelveRegistry.objects.all(), request, 'shelved_at')
+        output = self.request.query_params.get('output', NDJSON)
+        return export_response(queryset, self.export_fields, output, 'shelve-registries')
+
     @action(methods=['put'], detail=False)
     def unshelve(self, request):
         """ Unshelve multiple registries """
@@ -180,14 +198,44 @@ class ShelveRegistryViewSet(viewsets.ModelViewSet):
 
     @action(methods=['put'], detail=False)
     def check_timeouts(self, request):
-        """ Check if the timeouts of the registries are reached """
+        """ Check if the timeouts of the registries are reached.
+        The webserver unshelves the alarms at their deadlines, this action is kept for the optional timers process """
         logger.debug('Checking Shelved Alarms timeouts')
-        # TODO: Move this to a classmethod and here call that method
-        registries_to_unshelve = []
-        registries = ShelveRegistry.objects.filter(
-            status=ShelveRegistryStatus.get_choices_by_name()['SHELVED']
-        )
-        for registry in registries:
-            if(registry.shelved_at + registry.timeout <= timezone.now()):
-                registries_to_unshelve.append(registry)
-        return self._apply_unshelving(registries_to_unshelve)
+        alarms_to_unshelve = ShelveRegistry.objects.unshelve_expired()
+        if len(alarms_to_unshelve) > 0:
+            AlarmConnector.unshelve_alarms(alarms_to_unshelve)
+        return Response(alarms_to_unshelve, status=status.HTTP_200_OK)
+
+
+class ArchivedTicketViewSet(viewsets.ReadOnlyModelViewSet):
+    """`List` and `Retrieve` the Tickets moved to the archive by the retention policy"""
+    queryset = ArchivedTicket.objects.all()
+    serializer_class = ArchivedTicketSerializer
+    permission_classes = (DRYPermissions,)
+
+    @action(detail=False)
+    def filters(self, request):
+        """ Retrieve the list of archived tickets filtered by alarm """
+        alarm_id = self.request.query_params.get('alarm_id', None)
+        queryset = ArchivedTicket.objects.all()
+        if alarm_id:
+            queryset = queryset.filter(alarm_id=alarm_id)
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
+
+
+class ArchivedShelveRegistryViewSet(viewsets.ReadOnlyModelViewSet):
+    """`List` and `Retrieve` the ShelveRegistries moved to the archive by the retention policy"""
+    queryset = ArchivedShelveRegistry.objects.all()
+    serializer_class = ArchivedShelveRegistrySerializer
+    permission_classes = (DRYPermissions,)
+
+    @action(detail=False)
+    def filters(self, request):
+        """ Retrieve the list of archived registries filtered by alarm """
+        alarm_id = self.request.query_params.get('alarm_id', None)
+        queryset = ArchivedShelveRegistry.objects.all()
+        if alarm_id:
+            queryset = queryset.filter(alarm_id=alarm_id)
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
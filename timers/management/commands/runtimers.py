@@ -14,7 +14,10 @@ DEFAULT_PORT = '8000'
 
 class Command(BaseCommand):
     """ Command used to start sending messages via websockets and http requests
-    to trigger determined tasks """
+    to trigger determined tasks.
+
+    The webserver unshelves the alarms at the deadlines of their shelves by itself, therefore this command is
+    optional, it only checks periodically for the timeouts that could have been missed """
 
     help = 'Send messages via websockets or http requests to trigger \
     determined tasks'
@@ -0,0 +1,37 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from django.db import close_old_connections
+from ias_webserver.settings import DB_EXECUTOR_THREADS
+
+
+db_executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_THREADS, thread_name_prefix='db')
+""" Executor dedicated to the database operations requested from the event loop """
+
+
+def _run_with_connections(function, *args, **kwargs):
+    """ Runs a function closing the database connections that are unusable or obsolete before and after it """
+    close_old_connections()
+    try:
+        return function(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_in_db_executor(function, *args, **kwargs):
+    """
+    Runs a synchronous function that accesses the database in the database executor,
+    in order to avoid blocking the event loop, and waits for its result.
+
+    Args:
+        function (function): the function to run
+        *args: positional arguments of the function
+        **kwargs: keyword arguments of the function
+
+    Returns:
+        The value returned by the function
+    """
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(
+        db_executor, functools.partial(_run_with_connections, function, *args, **kwargs)
+    )